@@ -0,0 +1,40 @@
+# coding: utf-8
+"""
+    benchmarks.bench_cache
+    ~~~~~~~~~~~~~~~~~~~~~~
+
+    Compares building a document with and without a warm document cache.
+
+    :copyright: 2013 by Daniel Neuhäuser
+    :license: BSD, see LICENSE.rst for details
+"""
+import os
+import shutil
+import tempfile
+
+from kurrent.builders import SingleDocumentBuilder
+from kurrent.cache import DocumentCache
+from kurrent.writers import HTML5Writer
+
+from common import make_source, measure, report
+
+
+def main():
+    directory = tempfile.mkdtemp()
+    try:
+        source_path = os.path.join(directory, 'document.kr')
+        with open(source_path, 'wb') as file:
+            file.write(make_source(100).encode('utf-8'))
+        cache = DocumentCache(os.path.join(directory, 'cache'))
+        for name, builder_cache in [('uncached', None), ('cached', cache)]:
+            builder = SingleDocumentBuilder(
+                source_path, directory, HTML5Writer, cache=builder_cache
+            )
+            builder.build()
+            report(name, measure(builder.build))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
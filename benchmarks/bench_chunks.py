@@ -0,0 +1,46 @@
+# coding: utf-8
+"""
+    benchmarks.bench_chunks
+    ~~~~~~~~~~~~~~~~~~~~~~~
+
+    Measures writing documents into a stream and iterating over their output
+    in chunks, as well as the time until the first chunk is available.
+
+    :copyright: 2013 by Daniel Neuhäuser
+    :license: BSD, see LICENSE.rst for details
+"""
+from io import StringIO
+
+from kurrent.writers import HTML5Writer, KurrentWriter, ManWriter
+
+from common import make_source, parse, measure, report
+
+
+CHUNK_SIZE = 2 ** 14
+
+
+def main():
+    document = parse(make_source(500, extensions=False))
+    for writer_cls in [HTML5Writer, KurrentWriter, ManWriter]:
+        name = writer_cls.__name__
+        stream = StringIO()
+        writer_cls(stream).write_node(document)
+        size = len(stream.getvalue())
+
+        def write():
+            writer_cls(StringIO()).write_node(document)
+
+        def iterate():
+            for _ in writer_cls().iter_node(document, CHUNK_SIZE):
+                pass
+
+        def first_chunk():
+            next(iter(writer_cls().iter_node(document, CHUNK_SIZE)))
+
+        report('%s write_node' % name, measure(write), size)
+        report('%s iter_node' % name, measure(iterate), size)
+        report('%s first chunk' % name, measure(first_chunk))
+
+
+if __name__ == '__main__':
+    main()
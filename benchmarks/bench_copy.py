@@ -0,0 +1,42 @@
+# coding: utf-8
+"""
+    benchmarks.bench_copy
+    ~~~~~~~~~~~~~~~~~~~~~
+
+    Compares copying a document with reparsing it.
+
+    :copyright: 2013 by Daniel Neuhäuser
+    :license: BSD, see LICENSE.rst for details
+"""
+import copy
+
+from kurrent.transformations import LINK_TRANSFORMATIONS
+
+from common import make_source, parse, measure, report
+
+
+def transform(document):
+    context = {}
+    for transformation_cls in LINK_TRANSFORMATIONS:
+        transformation_cls(document, context).apply()
+
+
+def main():
+    source = make_source(100)
+    document = parse(source)
+
+    report('parse', measure(lambda: parse(source)))
+    report('copy.deepcopy', measure(lambda: copy.deepcopy(document)))
+    report('Document.copy', measure(document.copy))
+    report(
+        'Document.copy, fully traversed',
+        measure(lambda: list(document.copy().traverse()))
+    )
+    report(
+        'Document.copy, link transformations',
+        measure(lambda: transform(document.copy()))
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+# coding: utf-8
+"""
+    benchmarks.bench_escape
+    ~~~~~~~~~~~~~~~~~~~~~~~
+
+    Measures escaping text for the Kurrent writer.
+
+    :copyright: 2013 by Daniel Neuhäuser
+    :license: BSD, see LICENSE.rst for details
+"""
+from io import StringIO
+
+from kurrent.writers.kurrent import escape
+
+from common import measure, report
+
+
+def escape_by_character(string):
+    # The implementation escape() replaced, for comparison.
+    stream = StringIO()
+    for char in string:
+        stream.write({
+            u'*': u'\\*',
+            u'[': u'\\[',
+            u']': u'\\]'
+        }.get(char, char))
+    return stream.getvalue()
+
+
+def main():
+    strings = [
+        ('plain', [u'Some text without anything to escape. '] * 1000),
+        ('markup', [u'Some *text* with [brackets] to escape. '] * 1000)
+    ]
+    for name, texts in strings:
+        size = sum(len(text.encode('utf-8')) for text in texts)
+        for function in [escape, escape_by_character]:
+            report(
+                '%s, %s' % (function.__name__, name),
+                measure(lambda: [function(text) for text in texts]),
+                size
+            )
+
+
+if __name__ == '__main__':
+    main()
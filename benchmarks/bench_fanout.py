@@ -0,0 +1,57 @@
+# coding: utf-8
+"""
+    benchmarks.bench_fanout
+    ~~~~~~~~~~~~~~~~~~~~~~~
+
+    Measures building documents with several writers, with a builder for
+    each writer and with one builder for all of them.
+
+    :copyright: 2013 by Daniel Neuhäuser
+    :license: BSD, see LICENSE.rst for details
+"""
+import os
+import shutil
+import tempfile
+
+from kurrent.builders import SingleDocumentBuilder
+from kurrent.writers import HTML5Writer, KurrentWriter, ManWriter
+
+from common import make_source, measure, report
+
+
+WRITERS = [HTML5Writer, ManWriter, KurrentWriter]
+DOCUMENTS = 20
+
+
+def main():
+    directory = tempfile.mkdtemp()
+    try:
+        sources = []
+        for i in range(DOCUMENTS):
+            sources.append(os.path.join(directory, '%d.kr' % i))
+            with open(sources[-1], 'wb') as file:
+                file.write(make_source(10, extensions=False).encode('utf-8'))
+
+        def build_separately():
+            for source in sources:
+                for writer_cls in WRITERS:
+                    SingleDocumentBuilder(source, directory, writer_cls).build()
+
+        def build_together():
+            for source in sources:
+                SingleDocumentBuilder(source, directory, WRITERS).build()
+
+        report(
+            'builder for each writer, %d documents' % DOCUMENTS,
+            measure(build_separately, repeat=3)
+        )
+        report(
+            'builder for all writers, %d documents' % DOCUMENTS,
+            measure(build_together, repeat=3)
+        )
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
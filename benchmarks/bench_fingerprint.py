@@ -0,0 +1,42 @@
+# coding: utf-8
+"""
+    benchmarks.bench_fingerprint
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Measures the cost of computing and invalidating node fingerprints.
+
+    :copyright: 2013 by Daniel Neuhäuser
+    :license: BSD, see LICENSE.rst for details
+"""
+from kurrent import ast
+
+from common import make_source, parse, measure, report
+
+
+def main():
+    source = make_source(100)
+    document = parse(source)
+    nodes = list(document.traverse())
+
+    def uncached():
+        document.invalidate_fingerprint()
+        for node in nodes:
+            node._fingerprint = None
+        document.fingerprint
+
+    def mutate():
+        paragraph = document.children[1]
+        paragraph.add_child(ast.Text(u'foo'))
+        document.fingerprint
+        paragraph.remove(paragraph.children[-1])
+        document.fingerprint
+
+    document.fingerprint
+    report('parse (%d nodes)' % len(nodes), measure(lambda: parse(source)))
+    report('fingerprint, cold', measure(uncached))
+    report('fingerprint, cached', measure(lambda: document.fingerprint))
+    report('fingerprint, after 2 mutations', measure(mutate))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+# coding: utf-8
+"""
+    benchmarks.bench_html
+    ~~~~~~~~~~~~~~~~~~~~~
+
+    Measures the throughput of the HTML5 writer for documents consisting
+    mostly of paragraphs with inline markup.
+
+    :copyright: 2013 by Daniel Neuhäuser
+    :license: BSD, see LICENSE.rst for details
+"""
+from markupsafe import escape
+
+from kurrent.writers import HTML5Writer
+
+from common import make_source, parse, measure, report
+from bench_writers import transform, render
+
+
+PROSE = u"""\
+A paragraph with *emphasized* and **strong** text, a [link][target%(index)d]
+and characters like <, > and & that need escaping, followed by more text to
+make it a realistic length.
+
+[target%(index)d]: http://example.com/%(index)d
+
+"""
+
+
+class PerNodeHTML5Writer(HTML5Writer):
+    # Overriding write_Text disables rendering paragraphs at once, every
+    # inline node is written on its own, as it used to be.
+    def write_Text(self, node):
+        self.write(escape(node.text))
+
+
+def main():
+    sources = [
+        ('sections', make_source(200, extensions=False)),
+        ('prose', u''.join(PROSE % {'index': i} for i in range(2000)))
+    ]
+    for name, source in sources:
+        document = parse(source)
+        for writer_cls in [HTML5Writer, PerNodeHTML5Writer]:
+            transformed = transform(document.copy(), writer_cls)
+            size = len(render(transformed, writer_cls).encode('utf-8'))
+            report(
+                '%s, %s' % (writer_cls.__name__, name),
+                measure(lambda: render(transformed, writer_cls)),
+                size
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+# coding: utf-8
+"""
+    benchmarks.bench_man
+    ~~~~~~~~~~~~~~~~~~~~
+
+    Measures translating large man pages, with nested lists and quotes, into
+    the man AST and rendering them.
+
+    :copyright: 2013 by Daniel Neuhäuser
+    :license: BSD, see LICENSE.rst for details
+"""
+from io import StringIO
+
+from kurrent.writers import ManWriter
+from kurrent.writers.man import compile
+
+from common import make_source, parse, measure, report
+
+
+NESTED = u"""\
+# Option %(index)d
+
+- > 1. a quoted item in a list
+  >    with *emphasis*
+  >
+  >    - and a nested
+  >    - list
+  > 2. another item
+- term
+    > a description starting with a quote
+
+    - and a list
+
+"""
+
+
+def render(document):
+    stream = StringIO()
+    ManWriter(stream).write_node(document)
+    return stream.getvalue()
+
+
+def main():
+    documents = [
+        ('sample', parse(make_source(200, extensions=False))),
+        ('nested', parse(u''.join(
+            NESTED % {'index': index} for index in range(200)
+        )))
+    ]
+    for name, document in documents:
+        document.metadata['date'] = u'2013-01-01'
+        size = len(render(document).encode('utf-8'))
+        report('%s, translate' % name, measure(lambda: list(compile(document))))
+        report('%s, render' % name, measure(lambda: render(document)), size)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+# coding: utf-8
+"""
+    benchmarks.bench_parallel
+    ~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Measures how building a corpus of documents scales with the number of
+    worker processes.
+
+    :copyright: 2013 by Daniel Neuhäuser
+    :license: BSD, see LICENSE.rst for details
+"""
+import os
+import shutil
+import tempfile
+import timeit
+import multiprocessing
+
+from kurrent.builders import SingleDocumentBuilder, build_sources
+from kurrent.writers import HTML5Writer
+
+from common import make_source, report
+
+
+DOCUMENTS = 200
+
+
+def make_corpus(directory):
+    source = make_source(5).encode('utf-8')
+    rv = []
+    for i in range(DOCUMENTS):
+        rv.append(os.path.join(directory, '%d.kr' % i))
+        with open(rv[-1], 'wb') as file:
+            file.write(source)
+    return rv
+
+
+def main():
+    directory = tempfile.mkdtemp()
+    try:
+        sources = make_corpus(directory)
+        baseline = None
+        jobs = 1
+        while jobs <= max(2, multiprocessing.cpu_count()):
+            start = timeit.default_timer()
+            for source, error in build_sources(
+                SingleDocumentBuilder, HTML5Writer, sources, jobs=jobs
+            ):
+                assert error is None, error
+            seconds = timeit.default_timer() - start
+            if baseline is None:
+                baseline = seconds
+            report('%d documents, %d jobs (%.1fx)' % (
+                DOCUMENTS, jobs, baseline / seconds
+            ), seconds)
+            jobs *= 2
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+# coding: utf-8
+"""
+    benchmarks.bench_project
+    ~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Measures building a project of many small documents, rebuilding it
+    without changes and rebuilding it after changing a single document.
+
+    :copyright: 2013 by Daniel Neuhäuser
+    :license: BSD, see LICENSE.rst for details
+"""
+import os
+import shutil
+import tempfile
+import timeit
+
+from kurrent.builders import ProjectBuilder
+from kurrent.writers import HTML5Writer
+
+from common import report
+
+
+DOCUMENTS = 10000
+
+
+def make_project(directory):
+    for i in range(DOCUMENTS):
+        subdirectory = os.path.join(directory, '%03d' % (i // 100))
+        if not os.path.isdir(subdirectory):
+            os.makedirs(subdirectory)
+        with open(os.path.join(subdirectory, '%d.kr' % i), 'wb') as file:
+            file.write((
+                u'# Document %d\n\nSee [document-%d].\n\n'
+                u'[document-%d]: %d.html\n' % (i, (i + 1) % DOCUMENTS, i, i)
+            ).encode('utf-8'))
+
+
+def build(source_dir, target_dir):
+    ProjectBuilder(source_dir, target_dir, HTML5Writer).build()
+
+
+def main():
+    directory = tempfile.mkdtemp()
+    try:
+        source_dir = os.path.join(directory, 'source')
+        target_dir = os.path.join(directory, 'target')
+        make_project(source_dir)
+        timer = timeit.default_timer
+        for name in ['full build', 'no-op rebuild']:
+            start = timer()
+            build(source_dir, target_dir)
+            report('%s, %d documents' % (name, DOCUMENTS), timer() - start)
+        path = os.path.join(source_dir, '000', '0.kr')
+        with open(path, 'ab') as file:
+            file.write(b'\nChanged.\n')
+        os.utime(path, (0, 0))
+        start = timer()
+        build(source_dir, target_dir)
+        report('rebuild after changing one document', timer() - start)
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
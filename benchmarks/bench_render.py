@@ -0,0 +1,28 @@
+# coding: utf-8
+"""
+    benchmarks.bench_render
+    ~~~~~~~~~~~~~~~~~~~~~~~
+
+    Measures the latency of rendering request sized documents in memory with
+    :func:`kurrent.render`.
+
+    :copyright: 2013 by Daniel Neuhäuser
+    :license: BSD, see LICENSE.rst for details
+"""
+import kurrent
+
+from common import make_source, measure, report
+
+
+def main():
+    for sections in [1, 10]:
+        source = make_source(sections)
+        for writer in ['html5', 'kurrent']:
+            report(
+                '%s, %d sections' % (writer, sections),
+                measure(lambda: kurrent.render(source, writer), number=20)
+            )
+
+
+if __name__ == '__main__':
+    main()
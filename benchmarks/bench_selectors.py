@@ -0,0 +1,64 @@
+# coding: utf-8
+"""
+    benchmarks.bench_selectors
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Compares transformations selecting nodes by hand with transformations
+    using selectors, in a fused pass and in passes of their own, where
+    selectors take their candidates from a shared node index.
+
+    :copyright: 2013 by Daniel Neuhäuser
+    :license: BSD, see LICENSE.rst for details
+"""
+from kurrent import ast
+from kurrent.transformations import Transformation, apply_transformations
+
+from common import make_source, parse, measure, report
+
+
+NODE_CLASSES = [ast.Emphasis, ast.Strong, ast.RawBlock, ast.BlockQuote]
+
+
+def make_transformation(node_cls, use_selector, after=None):
+    class PluginTransformation(Transformation):
+        # Depending on the previous transformation forces a pass of its own.
+        consumes = (node_cls,) if after is None else (node_cls, after)
+        produces = (node_cls.__name__,)
+
+        def transform(self, node):
+            pass
+
+    if use_selector:
+        PluginTransformation.selector = node_cls.__name__
+    else:
+        PluginTransformation.select_node = (
+            lambda self, node: isinstance(node, node_cls)
+        )
+    return PluginTransformation
+
+
+def make_transformations(use_selector, chained):
+    rv = []
+    after = None
+    for node_cls in NODE_CLASSES:
+        rv.append(make_transformation(node_cls, use_selector, after))
+        if chained:
+            after = node_cls.__name__
+    return rv
+
+
+def main():
+    document = parse(make_source(200))
+    for chained in [False, True]:
+        for use_selector in [False, True]:
+            transformations = make_transformations(use_selector, chained)
+            report('%s, %s' % (
+                'selector' if use_selector else 'by hand',
+                'one pass each' if chained else 'fused'
+            ), measure(
+                lambda: apply_transformations(document, {}, transformations)
+            ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+# coding: utf-8
+"""
+    benchmarks.bench_server
+    ~~~~~~~~~~~~~~~~~~~~~~~
+
+    Compares the latency of building a document by running ``kurrent build``
+    with sending the same command to a build server.
+
+    :copyright: 2013 by Daniel Neuhäuser
+    :license: BSD, see LICENSE.rst for details
+"""
+import os
+import shutil
+import tempfile
+import threading
+import subprocess
+
+from kurrent import client
+from kurrent.server import BuildServer
+
+from common import make_source, measure, report
+
+
+def main():
+    directory = tempfile.mkdtemp()
+    server = BuildServer(os.path.join(directory, 'kurrent.sock'))
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    try:
+        source_path = os.path.join(directory, 'document.kr')
+        with open(source_path, 'wb') as file:
+            file.write(make_source(1).encode('utf-8'))
+        argv = ['build', 'single', 'html5', source_path]
+        report('kurrent build', measure(
+            lambda: subprocess.check_call(['kurrent'] + argv)
+        ))
+        report('kurrent serve', measure(
+            lambda: client.send(argv, socket_path=server.socket_path)
+        ))
+    finally:
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+# coding: utf-8
+"""
+    benchmarks.bench_source
+    ~~~~~~~~~~~~~~~~~~~~~~~
+
+    Measures writing a document with the Kurrent writer, with and without
+    the parser keeping the source blocks are copied from.
+
+    :copyright: 2013 by Daniel Neuhäuser
+    :license: BSD, see LICENSE.rst for details
+"""
+from kurrent.parser import Parser
+from kurrent.writers import KurrentWriter
+
+from common import make_source, measure, report
+
+
+def render(document):
+    writer = KurrentWriter()
+    writer.write_node(document)
+    return writer.getvalue()
+
+
+def main():
+    source = make_source(500, extensions=False)
+    for keep_source in [False, True]:
+        document = Parser.from_string(source, keep_source=keep_source).parse()
+        size = len(render(document).encode('utf-8'))
+        report(
+            'parse, keep_source=%r' % keep_source,
+            measure(lambda: Parser.from_string(
+                source, keep_source=keep_source
+            ).parse())
+        )
+        report(
+            'write, keep_source=%r' % keep_source,
+            measure(lambda: render(document)),
+            size
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+# coding: utf-8
+"""
+    benchmarks.bench_startup
+    ~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Measures how long starting the command line interface takes, running
+    ``kurrent build single html5`` on a small document in a new interpreter
+    each time. On Python 3.7 and later the modules taking the longest to
+    import, as reported by ``python -X importtime``, are listed as well.
+
+    :copyright: 2013 by Daniel Neuhäuser
+    :license: BSD, see LICENSE.rst for details
+"""
+from __future__ import print_function
+import os
+import sys
+import shutil
+import tempfile
+import subprocess
+from timeit import default_timer
+
+from common import report
+
+
+REPEAT = 10
+
+BUILD = (
+    'import sys; from kurrent.cli import main; '
+    'main(["kurrent", "build", "single", "html5", sys.argv[1]])'
+)
+
+
+def measure_command(command):
+    rv = []
+    for _ in range(REPEAT):
+        start = default_timer()
+        subprocess.check_call(command)
+        rv.append(default_timer() - start)
+    return min(rv)
+
+
+def get_import_times(module):
+    # Returns (cumulative seconds, module) tuples, slowest first.
+    process = subprocess.Popen(
+        [sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+        stderr=subprocess.PIPE
+    )
+    _, stderr = process.communicate()
+    rv = []
+    for line in stderr.decode('utf-8').splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        try:
+            cumulative = int(fields[1]) / 1e6
+        except ValueError:
+            continue
+        rv.append((cumulative, fields[2].strip()))
+    rv.sort(reverse=True)
+    return rv
+
+
+def main():
+    directory = tempfile.mkdtemp()
+    try:
+        source = os.path.join(directory, 'x.kr')
+        with open(source, 'wb') as file:
+            file.write(b'# Test\n\nThis is a test.\n')
+        baseline = measure_command([sys.executable, '-c', 'pass'])
+        report('interpreter', baseline)
+        report('import kurrent.cli', measure_command(
+            [sys.executable, '-c', 'import kurrent.cli']
+        ) - baseline)
+        report('kurrent build single html5 x.kr', measure_command(
+            [sys.executable, '-c', BUILD, source]
+        ) - baseline)
+    finally:
+        shutil.rmtree(directory)
+    if sys.version_info >= (3, 7):
+        print('slowest imports of kurrent.cli:')
+        for seconds, module in get_import_times('kurrent.cli')[:10]:
+            report('  ' + module, seconds)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+# coding: utf-8
+"""
+    benchmarks.bench_transformations
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Compares applying transformations one after another with applying them
+    in fused passes, with and without declaring what plugins consume.
+
+    :copyright: 2013 by Daniel Neuhäuser
+    :license: BSD, see LICENSE.rst for details
+"""
+from kurrent import ast
+from kurrent.transformations import (
+    Transformation, CORE_TRANSFORMATIONS, LINK_TRANSFORMATIONS,
+    apply_transformations
+)
+
+from common import make_source, parse, measure, report
+
+
+class Unused(ast.ChildNode):
+    pass
+
+
+def make_plugin(node_cls, declared=False):
+    # Stands in for the kind of transformations plugins add.
+    class PluginTransformation(Transformation):
+        consumes = (node_cls,) if declared else ()
+
+        def select_node(self, node):
+            return isinstance(node, node_cls)
+
+        def transform(self, node):
+            pass
+    return PluginTransformation
+
+
+BUILTIN = CORE_TRANSFORMATIONS + LINK_TRANSFORMATIONS
+PLUGIN_NODE_CLASSES = [
+    ast.Emphasis, ast.Strong, ast.RawBlock, ast.BlockQuote, Unused
+]
+PLUGINS = [make_plugin(node_cls) for node_cls in PLUGIN_NODE_CLASSES]
+DECLARED_PLUGINS = [
+    make_plugin(node_cls, declared=True) for node_cls in PLUGIN_NODE_CLASSES
+]
+
+
+def apply_sequentially(document, transformations):
+    context = {}
+    for transformation_cls in transformations:
+        transformation_cls(document, context).apply()
+
+
+def main():
+    document = parse(make_source(200))
+    report('copy', measure(lambda: list(document.copy().traverse())))
+    cases = [
+        ('builtin', BUILTIN),
+        ('builtin + plugins', BUILTIN + PLUGINS),
+        ('builtin + declared plugins', BUILTIN + DECLARED_PLUGINS)
+    ]
+    for name, transformations in cases:
+        report('%s, sequential' % name, measure(
+            lambda: apply_sequentially(document.copy(), transformations)
+        ))
+        report('%s, fused' % name, measure(
+            lambda: apply_transformations(
+                document.copy(), {}, transformations
+            )
+        ))
+
+
+if __name__ == '__main__':
+    main()
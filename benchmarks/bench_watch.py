@@ -0,0 +1,72 @@
+# coding: utf-8
+"""
+    benchmarks.bench_watch
+    ~~~~~~~~~~~~~~~~~~~~~~
+
+    Measures the time from changing a single document of a large project to
+    having rebuilt it, as ``kurrent build --watch`` does.
+
+    :copyright: 2013 by Daniel Neuhäuser
+    :license: BSD, see LICENSE.rst for details
+"""
+from __future__ import print_function
+import os
+import shutil
+import tempfile
+import timeit
+
+from kurrent.builders import ProjectBuilder
+from kurrent.cache import MemoryDocumentCache
+from kurrent.watch import get_watcher, PollingWatcher
+from kurrent.writers import HTML5Writer
+
+from common import report
+from bench_project import DOCUMENTS, make_project
+
+
+CHANGES = 10
+
+
+def measure_changes(builder, watcher, source_dir):
+    timer = timeit.default_timer
+    latencies = []
+    for i in range(CHANGES):
+        path = os.path.join(source_dir, '%03d' % i, '%d.kr' % (i * 100))
+        start = timer()
+        with open(path, 'ab') as file:
+            file.write(b'\nChanged.\n')
+        builder.update(watcher.wait())
+        latencies.append(timer() - start)
+        assert builder.built
+    return min(latencies), max(latencies)
+
+
+def main():
+    directory = tempfile.mkdtemp()
+    try:
+        source_dir = os.path.join(directory, 'source')
+        target_dir = os.path.join(directory, 'target')
+        make_project(source_dir)
+        builder = ProjectBuilder(
+            source_dir, target_dir, HTML5Writer, cache=MemoryDocumentCache()
+        )
+        builder.build()
+        print('%d documents' % DOCUMENTS)
+        for watcher in [
+            get_watcher([source_dir]), PollingWatcher([source_dir], interval=0)
+        ]:
+            with watcher:
+                best, worst = measure_changes(builder, watcher, source_dir)
+            name = watcher.__class__.__name__
+            report('%s, best of %d changes' % (name, CHANGES), best)
+            report('%s, worst of %d changes' % (name, CHANGES), worst)
+        start = timeit.default_timer()
+        builder.save()
+        report('saving indexes, once changes settled',
+               timeit.default_timer() - start)
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+# coding: utf-8
+"""
+    benchmarks.bench_writers
+    ~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Measures rendering of a large document with every writer.
+
+    :copyright: 2013 by Daniel Neuhäuser
+    :license: BSD, see LICENSE.rst for details
+"""
+import os
+import codecs
+import tempfile
+from io import StringIO
+from contextlib import contextmanager
+
+from kurrent.transformations import CORE_TRANSFORMATIONS
+from kurrent.writers import HTML5Writer, KurrentWriter, ManWriter
+
+from common import make_source, parse, measure, report
+
+
+def make_context_manager_writer(tag):
+    @contextmanager
+    def write(self, node):
+        self.write_line(u'<%s>' % tag)
+        with self.indent(u'  '):
+            yield True
+        self.write_line(u'</%s>' % tag)
+    return write
+
+
+class ContextManagerHTML5Writer(HTML5Writer):
+    # Uses the context manager protocol for common container nodes, to
+    # compare it with the enter/leave protocol.
+    write_ListItem = make_context_manager_writer(u'li')
+    write_OrderedList = make_context_manager_writer(u'ol')
+    write_UnorderedList = make_context_manager_writer(u'ul')
+    write_BlockQuote = make_context_manager_writer(u'blockquote')
+    write_DefinitionList = make_context_manager_writer(u'dl')
+
+
+def transform(document, writer_cls):
+    context = {}
+    for transformation_cls in CORE_TRANSFORMATIONS + writer_cls.transformations:
+        transformation_cls(document, context).apply()
+    return document
+
+
+def render(document, writer_cls):
+    stream = StringIO()
+    writer_cls(stream).write_node(document)
+    return stream.getvalue()
+
+
+def render_to_file(document, writer_cls, path, buffer_size=None):
+    with codecs.open(path, 'w', encoding='utf-8') as file:
+        writer_cls(file, buffer_size=buffer_size).write_node(document)
+
+
+def main():
+    document = parse(make_source(200, extensions=False))
+    writers = [
+        HTML5Writer, ContextManagerHTML5Writer, KurrentWriter, ManWriter
+    ]
+    for writer_cls in writers:
+        transformed = transform(document.copy(), writer_cls)
+        size = len(render(transformed, writer_cls).encode('utf-8'))
+        report(
+            writer_cls.__name__,
+            measure(lambda: render(transformed, writer_cls)),
+            size
+        )
+
+    transformed = transform(document.copy(), HTML5Writer)
+    fd, path = tempfile.mkstemp()
+    os.close(fd)
+    try:
+        for buffer_size in [1, None]:
+            report(
+                'HTML5Writer to file, buffer_size=%r' % buffer_size,
+                measure(lambda: render_to_file(
+                    transformed, HTML5Writer, path, buffer_size=buffer_size
+                ))
+            )
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
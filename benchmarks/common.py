@@ -0,0 +1,67 @@
+# coding: utf-8
+"""
+    benchmarks.common
+    ~~~~~~~~~~~~~~~~~
+
+    :copyright: 2013 by Daniel Neuhäuser
+    :license: BSD, see LICENSE.rst for details
+"""
+from __future__ import print_function
+import sys
+import timeit
+
+from kurrent.parser import Parser
+
+
+SECTION = u"""\
+# Section %(index)d
+
+Some *emphasized* text, some **strong** text and a paragraph that spans
+multiple lines and contains characters like < and & that need escaping.
+
+- an item
+- another item with *emphasis*
+
+1. first
+2. second
+
+> A quote with **strong** text.
+>
+> - and a list
+
+term
+  A description of the term.
+
+"""
+
+EXTENSIONS = u"""\
+A [link][target%(index)d] and [another link].
+
+    some raw
+    lines
+
+[target%(index)d]: http://example.com/%(index)d
+
+"""
+
+
+def make_source(sections=100, extensions=True):
+    # The man writer supports neither extensions nor raw blocks.
+    template = SECTION + EXTENSIONS if extensions else SECTION
+    return u''.join(template % {'index': index} for index in range(sections))
+
+
+def parse(source):
+    return Parser.from_string(source).parse()
+
+
+def measure(function, repeat=5, number=1):
+    return min(timeit.repeat(function, repeat=repeat, number=number)) / number
+
+
+def report(name, seconds, size=None):
+    line = u'%-40s %10.3f ms' % (name, seconds * 1000)
+    if size is not None:
+        line += u' %10.2f MB/s' % (size / seconds / 1024 / 1024)
+    print(line)
+    sys.stdout.flush()
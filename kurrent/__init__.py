@@ -9,3 +9,35 @@
 
 __version__ = '0.1.0-dev'
 __version_info__ = (0, 1, 0)
+
+
+def render(source, writer='html5'):
+    """
+    Renders `source`, Kurrent text, with the given writer, which is the name
+    of one of :data:`kurrent.writers.WRITERS` or a writer class, and returns
+    the result. Bytes are decoded and the result encoded as UTF-8.
+    """
+    # imported here, so that importing kurrent stays cheap
+    from kurrent.parser import Parser
+    from kurrent.writers import get_writer
+    from kurrent.transformations import (
+        CORE_TRANSFORMATIONS, apply_transformations
+    )
+    if isinstance(writer, type):
+        writer_cls = writer
+    else:
+        writer_cls = get_writer(writer)
+    if isinstance(source, bytes):
+        parser = Parser.from_bytes(source)
+    else:
+        parser = Parser.from_string(source)
+    with parser:
+        document = parser.parse()
+    apply_transformations(
+        document, {}, CORE_TRANSFORMATIONS + writer_cls.transformations
+    )
+    writer = writer_cls()
+    writer.write_node(document)
+    if isinstance(source, bytes):
+        return writer.getvalue().encode('utf-8')
+    return writer.getvalue()
@@ -22,15 +22,21 @@ if PY2:
         return cls
 
     text_type = unicode
+    integer_types = (int, long)
 
     from itertools import ifilter
+    import StringIO as _StringIO
+    NativeStringIO = _StringIO.StringIO
 
     def iteritems(d):
         return d.iteritems()
 else:
     implements_iterator = _identity
     text_type = str
+    integer_types = (int, )
     ifilter = filter
+    import io as _io
+    NativeStringIO = _io.StringIO
 
     def iteritems(d):
         return iter(d.items())
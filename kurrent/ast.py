@@ -6,8 +6,12 @@
     :copyright: 2013 by Daniel Neuhäuser
     :license: BSD, see LICENSE.rst for details
 """
-from itertools import chain
+import hashlib
+import datetime
 from collections import Iterable
+from contextlib import contextmanager
+
+from ._compat import text_type, integer_types, iteritems
 
 
 class Location(object):
@@ -38,10 +42,127 @@ class Location(object):
         return '%s(%r, %r)' % (self.__class__.__name__, self.line, self.column)
 
 
+# callables called with the parent whenever children are added, replaced or
+# removed, see observe_mutations()
+_mutation_observers = []
+
+
+@contextmanager
+def observe_mutations(observer):
+    _mutation_observers.append(observer)
+    try:
+        yield
+    finally:
+        _mutation_observers.remove(observer)
+
+
+def _notify_mutation(node):
+    for observer in _mutation_observers:
+        observer(node)
+
+
+def _update_hash(hash, value):
+    if isinstance(value, ASTNode):
+        hash.update(value.fingerprint.encode('ascii'))
+    elif value is None:
+        hash.update(b'N')
+    elif isinstance(value, text_type):
+        value = value.encode('utf-8')
+        hash.update(b'S' + str(len(value)).encode('ascii') + b':' + value)
+    elif isinstance(value, bytes):
+        hash.update(b'B' + str(len(value)).encode('ascii') + b':' + value)
+    elif isinstance(value, (bool, ) + integer_types):
+        hash.update(b'I' + str(int(value)).encode('ascii') + b';')
+    elif isinstance(value, float):
+        hash.update(b'F' + repr(value).encode('ascii') + b';')
+    elif isinstance(value, (datetime.date, datetime.time)):
+        # datetime is a subclass of date, the class name keeps them apart
+        hash.update(b'T' + (
+            '%s:%s;' % (value.__class__.__name__, value.isoformat())
+        ).encode('ascii'))
+    elif isinstance(value, (list, tuple)):
+        hash.update(b'L' + str(len(value)).encode('ascii') + b':')
+        for item in value:
+            _update_hash(hash, item)
+    elif isinstance(value, dict):
+        hash.update(b'D' + str(len(value)).encode('ascii') + b':')
+        for key, item in sorted(iteritems(value)):
+            _update_hash(hash, key)
+            _update_hash(hash, item)
+    else:
+        raise TypeError('cannot fingerprint %r' % value)
+
+
+# the child fields of most parent nodes, ASTNode.traverse() takes a shortcut
+# for those
+_children_fields = ('children',)
+
+
 class ASTNode(object):
+    # attributes making up the content of the node, see fingerprint
+    fields = ()
+    # attributes holding lists of nodes, copy() copies these lazily
+    child_fields = ()
+    # the lines of the source a block of a document has been parsed from, if
+    # the parser kept them, until the block is modified
+    source = None
+
+    _fingerprint = None
+
     def __init__(self, parent=None):
         self.parent = parent
 
+    @property
+    def fingerprint(self):
+        # Changing fields directly does not invalidate the cached fingerprint,
+        # call invalidate_fingerprint() if you do that.
+        if self._fingerprint is None:
+            hash = hashlib.sha1(self.__class__.__name__.encode('utf-8'))
+            for field in self.fields:
+                _update_hash(hash, getattr(self, field))
+            self._fingerprint = hash.hexdigest()
+        return self._fingerprint
+
+    def invalidate_fingerprint(self):
+        # A cached fingerprint implies cached fingerprints for all
+        # descendants, so we can stop at the first node without one.
+        node = self
+        while node is not None and node._fingerprint is not None:
+            node._fingerprint = None
+            node = node.parent
+        # The source of the node and its ancestors no longer matches them.
+        node = self
+        while node is not None:
+            if node.source is not None:
+                node.source = None
+            node = node.parent
+
+    def copy(self, parent=None):
+        # Creates a shallow copy whose child nodes are only copied once they
+        # are accessed, until then the original subtrees are shared. This
+        # allows applying transformations to a copy without affecting the
+        # original and without paying for copying subtrees that are never
+        # looked at.
+        rv = self.__class__.__new__(self.__class__)
+        rv.__dict__.update(self.__dict__)
+        for field in self.child_fields:
+            rv.__dict__.pop(field, None)
+        rv._original = self
+        rv.parent = parent
+        return rv
+
+    def __getattr__(self, name):
+        # Only called for missing attributes, which includes child fields of
+        # copies that have not been copied yet.
+        if name in self.child_fields and '_original' in self.__dict__:
+            nodes = [
+                node.copy(parent=self)
+                for node in getattr(self._original, name)
+            ]
+            setattr(self, name, nodes)
+            return nodes
+        raise AttributeError(name)
+
     def replace_in_parent(self, replacement):
         self.parent.replace(self, replacement)
 
@@ -49,10 +170,28 @@ class ASTNode(object):
         self.parent.remove(self)
 
     def traverse(self):
-        yield self
+        # Yields the node and its descendants in document order. The children
+        # of a node are looked at after the node has been yielded, nodes that
+        # have been replaced or removed in the meantime are not descended into.
+        stack = [self]
+        pop = stack.pop
+        extend = stack.extend
+        while stack:
+            node = pop()
+            parent = node.parent
+            yield node
+            if node.child_fields and node.parent is parent:
+                if node.child_fields is _children_fields:
+                    extend(node.children[::-1])
+                else:
+                    for field in reversed(node.child_fields):
+                        extend(reversed(getattr(node, field)))
 
 
 class ParentNode(ASTNode):
+    fields = ('children',)
+    child_fields = _children_fields
+
     def __init__(self, children=None, parent=None):
         super(ParentNode, self).__init__(parent=parent)
         self.children = []
@@ -85,6 +224,9 @@ class ParentNode(ASTNode):
     def add_child(self, node):
         node.parent = self
         self.children.append(node)
+        self.invalidate_fingerprint()
+        if _mutation_observers:
+            _notify_mutation(self)
 
     def add_children(self, nodes):
         for node in nodes:
@@ -93,20 +235,22 @@ class ParentNode(ASTNode):
     def replace(self, old, new):
         index = self.children.index(old)
         del self.children[index]
+        old.parent = None
         if not isinstance(new, Iterable):
             new = [new]
         for node in reversed(new):
             node.parent = self
             self.children.insert(index, node)
+        self.invalidate_fingerprint()
+        if _mutation_observers:
+            _notify_mutation(self)
 
     def remove(self, node):
         self.children.remove(node)
-
-    def traverse(self):
-        yield self
-        for child in self.children:
-            for node in child.traverse():
-                yield node
+        node.parent = None
+        self.invalidate_fingerprint()
+        if _mutation_observers:
+            _notify_mutation(self)
 
     def __repr__(self):
         return '%s(children=%r, parent=%r)' % (
@@ -115,11 +259,18 @@ class ParentNode(ASTNode):
 
 
 class Document(ParentNode):
+    fields = ('metadata', 'children')
+
     def __init__(self, filename, metadata=None, children=None, parent=None):
         super(Document, self).__init__(children=children, parent=parent)
         self.filename = filename
         self.metadata = {} if metadata is None else metadata
 
+    def copy(self, parent=None):
+        rv = super(Document, self).copy(parent=parent)
+        rv.metadata = self.metadata.copy()
+        return rv
+
     def __repr__(self):
         return '%s(%r, metadata=%r, children=%r, parent=%r)' % (
             self.__class__.__name__, self.filename, self.metadata,
@@ -147,6 +298,8 @@ class ChildNode(ASTNode):
 
 
 class Text(ChildNode):
+    fields = ('text',)
+
     def __init__(self, text, start=None, end=None, parent=None):
         super(Text, self).__init__(start=start, end=end, parent=parent)
         self.text = text
@@ -159,6 +312,8 @@ class Text(ChildNode):
 
 
 class Header(ChildNode):
+    fields = ('text', 'level')
+
     def __init__(self, text, level, start=None, end=None, parent=None):
         super(Header, self).__init__(start=start, end=end, parent=parent)
         self.text = text
@@ -172,6 +327,8 @@ class Header(ChildNode):
 
 
 class InlineExtension(ChildNode):
+    fields = ('type', 'primary', 'secondary', 'text', 'metadata')
+
     def __init__(self, type, primary, secondary=None, text=None, metadata=None,
                  start=None, end=None, parent=None):
         super(InlineExtension, self).__init__(start=start, end=end, parent=parent)
@@ -181,6 +338,11 @@ class InlineExtension(ChildNode):
         self.text = text
         self.metadata = {} if metadata is None else metadata
 
+    def copy(self, parent=None):
+        rv = super(InlineExtension, self).copy(parent=parent)
+        rv.metadata = self.metadata.copy()
+        return rv
+
     def __repr__(self):
         return '%s(%r, %r, secondary=%r, text=%r, metadata=%r, start=%r, end=%r, parent=%r)' % (
             self.__class__.__name__, self.type, self.primary, self.secondary,
@@ -189,6 +351,8 @@ class InlineExtension(ChildNode):
 
 
 class Extension(ChildNode):
+    fields = ('type', 'primary', 'secondary', 'body')
+
     def __init__(self, type, primary, secondary=None, body=None, start=None,
                  end=None, parent=None):
         super(Extension, self).__init__(start=start, end=end, parent=parent)
@@ -221,6 +385,8 @@ class BlockQuote(ParentNode):
 
 
 class RawBlock(ChildNode):
+    fields = ('body',)
+
     def __init__(self, body, start=None, end=None, parent=None):
         super(RawBlock, self).__init__(start=start, end=end, parent=parent)
         self.body = body
@@ -237,6 +403,9 @@ class DefinitionList(ParentNode):
 
 
 class Definition(ASTNode):
+    fields = ('term', 'description')
+    child_fields = ('term', 'description')
+
     def __init__(self, term, description, parent=None):
         super(Definition, self).__init__(parent=parent)
         self.term = term
@@ -250,12 +419,6 @@ class Definition(ASTNode):
     def end(self):
         return self.description[-1].end
 
-    def traverse(self):
-        yield self
-        for child in chain(self.term, self.description):
-            for grandchild in child.traverse():
-                yield grandchild
-
     def __repr__(self):
         return '%s(%r, %r, parent=%r)' % (
             self.__class__.__name__, self.term, self.description, self.parent
@@ -263,6 +426,8 @@ class Definition(ASTNode):
 
 
 class Link(ChildNode):
+    fields = ('target', 'text')
+
     def __init__(self, target, text, start=None, end=None, parent=None):
         super(Link, self).__init__(start=start, end=end, parent=parent)
         self.target = target
@@ -7,42 +7,611 @@
     :license: BSD, see LICENSE.rst for details
 """
 import os
-import codecs
+import io
+import json
+import hashlib
+import traceback
 
+from kurrent import __version__
 from kurrent.parser import Parser
-from kurrent.transformations import CORE_TRANSFORMATIONS
+from kurrent.links import LinkRegistry
+from kurrent.utils import atomic_write
+from kurrent.transformations import (
+    CORE_TRANSFORMATIONS, apply_transformations, Profile
+)
+from kurrent._compat import iteritems
+
+
+class WriteStats(object):
+    # Counts the targets builders wrote and those they left alone, because
+    # their content did not change.
+    def __init__(self, written=0, unchanged=0):
+        self.written = written
+        self.unchanged = unchanged
+
+    def merge(self, other):
+        self.written += other.written
+        self.unchanged += other.unchanged
+
+    def format(self):
+        return u'%d written, %d unchanged' % (self.written, self.unchanged)
+
+
+def _as_writer_classes(writer_cls):
+    if isinstance(writer_cls, (list, tuple)):
+        return list(writer_cls)
+    return [writer_cls]
 
 
 class SingleDocumentBuilder(object):
-    def __init__(self, source_path, target_dir, writer_cls):
+    def __init__(self, source_path, target_dir, writer_cls, profile=None,
+                 link_registry=None, cache=None, write_stats=None,
+                 document=None):
         self.source_path = source_path
         self.target_dir = target_dir
-        self.writer_cls = writer_cls
+        # A writer class or a list of writer classes, the document is parsed
+        # once and written with each of them. writer_cls is the first one.
+        self.writer_classes = _as_writer_classes(writer_cls)
+        self.writer_cls = self.writer_classes[0]
+        # a kurrent.transformations.Profile the transformations are profiled
+        # with, may be shared between builders
+        self.profile = profile
+        # a kurrent.links.LinkRegistry used to resolve links not defined in
+        # the document itself
+        self.link_registry = link_registry
+        # a kurrent.cache.DocumentCache for documents with the core
+        # transformations applied
+        self.cache = cache
+        # links resolved with the registry mapped to the result of
+        # LinkRegistry.resolve()
+        self.link_dependencies = {}
+        # a WriteStats, may be shared between builders
+        if write_stats is None:
+            write_stats = WriteStats()
+        self.write_stats = write_stats
+        # the parsed source, if the caller has it already, e.g. from updating
+        # the link registry, the next build() uses it instead of parsing
+        self.document = document
+        # the path and hash of the last target written and (path, hash)
+        # tuples for all targets written by the last call of build()
+        self.target_path = None
+        self.target_hash = None
+        self.targets = []
+
+    @classmethod
+    def get_target_dir(cls, source):
+        return os.path.dirname(source)
 
     @property
     def transformations(self):
         return CORE_TRANSFORMATIONS + self.writer_cls.transformations
 
-    def get_target_path(self, document):
-        extension = self.writer_cls.get_file_extension(document)
+    def get_target_path(self, document, writer_cls=None):
+        if writer_cls is None:
+            writer_cls = self.writer_cls
+        extension = writer_cls.get_file_extension(document)
         return os.path.join(
             self.target_dir,
             os.path.splitext(os.path.basename(self.source_path))[0] + extension)
 
     def build(self):
-        document = self.parse()
-        self.apply_transformations(document)
-        self.write(document)
+        document, context = self.get_document()
+        self.targets = []
+        if len(self.writer_classes) == 1:
+            self.build_target(document, context, self.writer_cls)
+            return
+        # Each writer gets a lazy copy of the document, so that the
+        # transformations of one writer don't affect the others.
+        link_dependencies = {}
+        for writer_cls in self.writer_classes:
+            self.build_target(document.copy(), dict(context), writer_cls)
+            link_dependencies.update(self.link_dependencies)
+        self.link_dependencies = link_dependencies
+
+    def build_target(self, document, context, writer_cls):
+        self.apply_transformations(
+            document, context, writer_cls.transformations
+        )
+        self.write(document, writer_cls)
+
+    def get_document(self):
+        # Returns the parsed document with the core transformations applied
+        # and the context they were applied with, from the cache if possible.
+        parsed, self.document = self.document, None
+        if self.cache is None:
+            if parsed is None:
+                document = self.parse()
+            else:
+                document = parsed
+                document.filename = self.source_path
+            context = {}
+            self.apply_transformations(document, context, CORE_TRANSFORMATIONS)
+            return document, context
+        with open(self.source_path, 'rb') as file:
+            source = file.read()
+        key = self.cache.get_key(source)
+        cached = self.cache.get(key)
+        if cached is not None:
+            document, context = cached
+        else:
+            if parsed is None:
+                with Parser.from_bytes(source) as parser:
+                    parsed = parser.parse()
+            document = parsed
+            context = {}
+            self.apply_transformations(document, context, CORE_TRANSFORMATIONS)
+            self.cache.set(key, (document, context))
+            # A MemoryDocumentCache keeps the document itself, the writer
+            # transformations are applied to a copy so that it stays as it is.
+            document, context = document.copy(), dict(context)
+        # the same content may be cached for a different path
+        document.filename = self.source_path
+        return document, context
+
+    def update(self, paths):
+        # Builds the document again, if the source is one of the given paths
+        # or links it uses resolve differently.
+        if os.path.abspath(self.source_path) in map(os.path.abspath, paths):
+            self.build()
+        elif self.link_registry is not None:
+            for name, resolved in iteritems(self.link_dependencies):
+                if self.link_registry.resolve(name) != resolved:
+                    self.build()
+                    break
+
+    def save(self):
+        # There is nothing to save for a single document, see
+        # ProjectBuilder.save().
+        pass
 
     def parse(self):
         with Parser.from_path(self.source_path) as parser:
             return parser.parse()
 
-    def apply_transformations(self, document):
-        context = {}
-        for transformation_cls in self.transformations:
-            transformation_cls(document, context).apply()
+    def apply_transformations(self, document, context=None,
+                              transformations=None):
+        if context is None:
+            context = {}
+        if transformations is None:
+            transformations = self.transformations
+        if self.link_registry is not None:
+            context['link_registry'] = self.link_registry
+        try:
+            apply_transformations(
+                document, context, transformations, profile=self.profile
+            )
+        finally:
+            context.pop('link_registry', None)
+        self.link_dependencies = context.get('link_dependencies', {})
+
+    def write(self, document, writer_cls=None):
+        # Targets are replaced atomically and only if their content changed,
+        # so that their modification time only changes with the content.
+        if writer_cls is None:
+            writer_cls = self.writer_cls
+        self.target_path = self.get_target_path(document, writer_cls)
+        stream = io.StringIO()
+        writer_cls(stream).write_node(document)
+        data = stream.getvalue().encode('utf-8')
+        self.target_hash = hashlib.sha1(data).hexdigest()
+        if _hash_target(self.target_path, len(data)) == self.target_hash:
+            self.write_stats.unchanged += 1
+        else:
+            atomic_write(self.target_path, data)
+            self.write_stats.written += 1
+        self.targets.append((self.target_path, self.target_hash))
+
+
+def _hash_file(path):
+    with open(path, 'rb') as file:
+        return hashlib.sha1(file.read()).hexdigest()
+
+
+def _hash_target(path, size):
+    # Returns the hash of the file, if it exists and has the given size.
+    try:
+        if os.path.getsize(path) != size:
+            return None
+        return _hash_file(path)
+    except (IOError, OSError):
+        return None
+
+
+def _stat_entry(stat, hash):
+    return {'mtime': stat.st_mtime, 'size': stat.st_size, 'hash': hash}
+
+
+def _target_entry(path, stat, hash):
+    rv = _stat_entry(stat, hash)
+    rv['path'] = path
+    return rv
+
+
+def _is_unchanged(entry, stat):
+    return entry['mtime'] == stat.st_mtime and entry['size'] == stat.st_size
+
+
+def _as_list(resolved):
+    # Resolutions are stored as JSON, which turns tuples into lists.
+    return None if resolved is None else list(resolved)
+
+
+class ProjectBuilder(object):
+    # Builds every .kr file in a directory tree, mirroring the tree in the
+    # target directory.
+    #
+    # The manifest in the target directory records the size, modification
+    # time and hash of each source and its targets, one for each writer, as
+    # well as the links the document resolved with the project's link
+    # registry. A document is only
+    # built again, if its source or target changed or if one of those links
+    # resolves differently. Stat results are compared first, files are only
+    # hashed if those differ.
+    #
+    # Each set of writers has a manifest of its own, so that building a
+    # project with different writers into the same target directory does not
+    # build everything again each time.
+    source_extension = '.kr'
+    manifest_name = '.kurrent-manifest-%s.json'
+    link_index_name = '.kurrent-links.json'
+    document_builder_cls = SingleDocumentBuilder
+
+    def __init__(self, source_dir, target_dir, writer_cls, profile=None,
+                 link_registry=None, cache=None, write_stats=None):
+        self.source_dir = source_dir
+        self.target_dir = target_dir
+        self.writer_classes = _as_writer_classes(writer_cls)
+        self.writer_cls = self.writer_classes[0]
+        self.profile = profile
+        self.cache = cache
+        if write_stats is None:
+            write_stats = WriteStats()
+        self.write_stats = write_stats
+        if link_registry is None:
+            link_registry = LinkRegistry.load(
+                os.path.join(target_dir, self.link_index_name)
+            )
+        self.link_registry = link_registry
+        # sources, relative to source_dir, built and removed by the last
+        # call of build()
+        self.built = []
+        self.removed = []
+        # whether the manifest has to be saved, because the stat results of
+        # sources or targets changed
+        self.manifest_changed = False
+        # whether the manifest and link index have to be saved
+        self.unsaved = False
+        # the manifest entries of the documents, once build() was called
+        self.documents = None
+
+    @classmethod
+    def get_target_dir(cls, source):
+        return source
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.target_dir, self.manifest_name % '-'.join(
+            writer_cls.__name__ for writer_cls in self.writer_classes
+        ))
+
+    @property
+    def writer_names(self):
+        return [
+            '%s.%s' % (writer_cls.__module__, writer_cls.__name__)
+            for writer_cls in self.writer_classes
+        ]
+
+    def find_sources(self):
+        # Returns the paths of all sources, relative to source_dir.
+        rv = []
+        for directory, directories, filenames in os.walk(self.source_dir):
+            directories.sort()
+            relative_directory = os.path.relpath(directory, self.source_dir)
+            if relative_directory == os.curdir:
+                relative_directory = ''
+            for filename in sorted(filenames):
+                if filename.endswith(self.source_extension):
+                    rv.append(os.path.join(relative_directory, filename))
+        return rv
+
+    def load_manifest(self):
+        try:
+            with open(self.manifest_path, 'rb') as file:
+                manifest = json.loads(file.read().decode('utf-8'))
+        except (IOError, OSError, ValueError):
+            return {}
+        if (
+            manifest.get('version') != __version__ or
+            manifest.get('writers') != self.writer_names
+        ):
+            return {}
+        return manifest['documents']
+
+    def save_manifest(self, documents):
+        manifest = {
+            'version': __version__,
+            'writers': self.writer_names,
+            'documents': documents
+        }
+        atomic_write(
+            self.manifest_path,
+            json.dumps(manifest, sort_keys=True).encode('utf-8')
+        )
+
+    def get_source_hash(self, source):
+        # The registry has hashed the source already, if it changed.
+        source_path = os.path.abspath(os.path.join(self.source_dir, source))
+        return self.link_registry.sources[source_path]['hash']
+
+    def is_current(self, entry, source, source_stat):
+        # Returns True, if the document does not have to be built again,
+        # updates the stat results in the entry, if only those changed.
+        for name, resolved in iteritems(entry['links']):
+            if resolved != _as_list(self.link_registry.resolve(name)):
+                return False
+        target_stats = []
+        for target in entry['targets']:
+            try:
+                target_stats.append(
+                    os.stat(os.path.join(self.target_dir, target['path']))
+                )
+            except OSError:
+                return False
+        if _is_unchanged(entry['source'], source_stat) and all(
+            _is_unchanged(target, target_stat)
+            for target, target_stat in zip(entry['targets'], target_stats)
+        ):
+            return True
+        source_hash = self.get_source_hash(source)
+        if source_hash != entry['source']['hash']:
+            return False
+        for target in entry['targets']:
+            target_path = os.path.join(self.target_dir, target['path'])
+            if _hash_file(target_path) != target['hash']:
+                return False
+        entry['source'] = _stat_entry(source_stat, source_hash)
+        entry['targets'] = [
+            _target_entry(target['path'], target_stat, target['hash'])
+            for target, target_stat in zip(entry['targets'], target_stats)
+        ]
+        self.manifest_changed = True
+        return True
+
+    def build(self):
+        self.built = []
+        self.removed = []
+        self.manifest_changed = False
+        old_documents = self.load_manifest()
+        sources = self.find_sources()
+        stats = {}
+        # sources the registry parsed, mapped to their documents
+        parsed = {}
+        for source in sources:
+            source_path = os.path.join(self.source_dir, source)
+            stats[source] = os.stat(source_path)
+            self.link_registry.update(
+                source_path, stat=stats[source], documents=parsed
+            )
+        # The registry may be shared with builders for other sets of writers,
+        # whose manifests have entries for sources deleted since this one was
+        # saved, so sources are removed from it regardless of the manifest.
+        source_dir = os.path.join(os.path.abspath(self.source_dir), '')
+        source_paths = set(
+            os.path.abspath(os.path.join(self.source_dir, source))
+            for source in sources
+        )
+        registry_changed = False
+        for source_path in sorted(self.link_registry.sources):
+            if (
+                source_path.startswith(source_dir) and
+                source_path.endswith(self.source_extension) and
+                source_path not in source_paths
+            ):
+                self.link_registry.remove(source_path)
+                registry_changed = True
+        for source in sorted(old_documents):
+            if source not in stats:
+                self.remove_document(source, old_documents.pop(source))
+
+        self.documents = {}
+        for source in sources:
+            entry = old_documents.get(source)
+            document = parsed.pop(
+                os.path.abspath(os.path.join(self.source_dir, source)), None
+            )
+            if entry is None or not self.is_current(
+                entry, source, stats[source]
+            ):
+                entry = self.build_document(
+                    source, stats[source], document=document
+                )
+                self.built.append(source)
+            self.documents[source] = entry
+        self.unsaved = bool(
+            self.built or self.removed or self.manifest_changed or
+            registry_changed
+        )
+        self.save()
+
+    def update(self, paths):
+        # Builds the documents affected by changes to the given paths, e.g.
+        # reported by a kurrent.watch watcher. Unlike build() this only looks
+        # at the changed sources and the links of the others, which makes it
+        # fast enough for rebuilding after every change in large projects.
+        #
+        # Writing the manifest and link index takes longer than building a
+        # document in such projects, call save() once the changes settle.
+        if self.documents is None:
+            self.build()
+            return
+        self.built = []
+        self.removed = []
+        self.manifest_changed = False
+        source_dir = os.path.join(os.path.abspath(self.source_dir), '')
+        stats = {}
+        parsed = {}
+        definitions_changed = False
+        for path in sorted(set(map(os.path.abspath, paths))):
+            if not (
+                path.startswith(source_dir) and
+                path.endswith(self.source_extension)
+            ):
+                continue
+            source = os.path.relpath(path, source_dir)
+            try:
+                stats[source] = os.stat(path)
+            except OSError:
+                if source in self.documents:
+                    definitions_changed |= self.remove_document(
+                        source, self.documents.pop(source)
+                    )
+            else:
+                definitions_changed |= self.link_registry.update(
+                    path, stat=stats[source], documents=parsed
+                )
+
+        outdated = set()
+        for source, stat in iteritems(stats):
+            entry = self.documents.get(source)
+            if entry is None or not self.is_current(entry, source, stat):
+                outdated.add(source)
+        if definitions_changed:
+            for source, entry in iteritems(self.documents):
+                for name, resolved in iteritems(entry['links']):
+                    if resolved != _as_list(self.link_registry.resolve(name)):
+                        outdated.add(source)
+                        break
+        for source in sorted(outdated):
+            stat = stats.get(source)
+            if stat is None:
+                stat = os.stat(os.path.join(self.source_dir, source))
+            self.documents[source] = self.build_document(
+                source, stat, document=parsed.get(
+                    os.path.abspath(os.path.join(self.source_dir, source))
+                )
+            )
+            self.built.append(source)
+        if self.built or self.removed or self.manifest_changed:
+            self.unsaved = True
+
+    def remove_document(self, source, entry):
+        # Returns True, if the source defined any links.
+        rv = self.link_registry.remove(os.path.join(self.source_dir, source))
+        for target in entry['targets']:
+            target_path = os.path.join(self.target_dir, target['path'])
+            if os.path.exists(target_path):
+                os.remove(target_path)
+        self.removed.append(source)
+        return rv
+
+    def save(self):
+        if not self.unsaved:
+            return
+        self.link_registry.save(
+            os.path.join(self.target_dir, self.link_index_name)
+        )
+        self.save_manifest(self.documents)
+        self.unsaved = False
+
+    def build_document(self, source, source_stat, document=None):
+        target_dir = os.path.join(self.target_dir, os.path.dirname(source))
+        if not os.path.isdir(target_dir):
+            os.makedirs(target_dir)
+        builder = self.document_builder_cls(
+            os.path.join(self.source_dir, source), target_dir,
+            self.writer_classes, profile=self.profile,
+            link_registry=self.link_registry, cache=self.cache,
+            write_stats=self.write_stats, document=document
+        )
+        builder.build()
+        return {
+            'source': _stat_entry(source_stat, self.get_source_hash(source)),
+            'targets': [
+                _target_entry(
+                    os.path.relpath(target_path, self.target_dir),
+                    os.stat(target_path), target_hash
+                )
+                for target_path, target_hash in builder.targets
+            ],
+            'links': dict(
+                (name, _as_list(resolved))
+                for name, resolved in iteritems(builder.link_dependencies)
+            )
+        }
+
+
+def _build(builder_cls, writer_cls, source, profile, write_stats, options):
+    # Returns the formatted traceback, if the build failed.
+    try:
+        builder_cls(
+            source, builder_cls.get_target_dir(source), writer_cls,
+            profile=profile, write_stats=write_stats, **options
+        ).build()
+    except Exception:
+        return traceback.format_exc()
+
+
+# set by _initialize_worker() in worker processes
+_worker_options = None
+
+
+def _initialize_worker(*options):
+    global _worker_options
+    _worker_options = options
+
+
+def _build_in_worker(source):
+    builder_cls, writer_cls, profile, options = _worker_options
+    if profile:
+        profile = Profile()
+    else:
+        profile = None
+    write_stats = WriteStats()
+    error = _build(
+        builder_cls, writer_cls, source, profile, write_stats, options
+    )
+    return source, error, profile, write_stats
+
 
-    def write(self, document):
-        with codecs.open(self.get_target_path(document), 'w', encoding='utf-8') as file:
-            self.writer_cls(file).write_node(document)
+def build_sources(builder_cls, writer_cls, sources, jobs=1, profile=None,
+                  write_stats=None, **options):
+    # Builds each source with a builder of the given class, created with the
+    # given options, and yields (source, error) tuples in the order of
+    # `sources`, independent of the order in which the builds finish.
+    # `error` is the formatted traceback, if the build failed, or None. With
+    # more than one job, the sources are built in a pool of worker
+    # processes, which take sources in chunks to reduce the communication
+    # overhead.
+    sources = list(sources)
+    if write_stats is None:
+        write_stats = WriteStats()
+    if jobs == 1:
+        for source in sources:
+            yield source, _build(
+                builder_cls, writer_cls, source, profile, write_stats, options
+            )
+        return
+    # only imported when needed, because it takes a while
+    import multiprocessing
+    pool = multiprocessing.Pool(
+        jobs,
+        initializer=_initialize_worker,
+        initargs=(builder_cls, writer_cls, profile is not None, options)
+    )
+    try:
+        results = pool.imap(
+            _build_in_worker, sources,
+            chunksize=max(1, len(sources) // (jobs * 4))
+        )
+        for source, error, worker_profile, worker_stats in results:
+            if profile is not None:
+                profile.merge(worker_profile)
+            write_stats.merge(worker_stats)
+            yield source, error
+    except BaseException:
+        pool.terminate()
+        raise
+    else:
+        pool.close()
+    finally:
+        pool.join()
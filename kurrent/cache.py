@@ -0,0 +1,157 @@
+# coding: utf-8
+"""
+    kurrent.cache
+    ~~~~~~~~~~~~~
+
+    :copyright: 2013 by Daniel Neuhäuser
+    :license: BSD, see LICENSE.rst for details
+"""
+import os
+import sys
+import errno
+import pickle
+import hashlib
+
+from kurrent import __version__
+from kurrent.utils import atomic_write
+from kurrent._compat import iteritems
+
+
+class DocumentCache(object):
+    # Stores parsed and transformed documents on disk, keyed by the content
+    # of the source and the versions of Kurrent and Python, so that entries
+    # never have to be invalidated.
+    #
+    # Entries are written atomically, so any number of builders, even in
+    # different processes, may share a cache. Reading an entry updates its
+    # modification time, once the entries take up more than `max_size` bytes
+    # the least recently used ones are removed.
+    extension = '.pickle'
+
+    def __init__(self, directory, max_size=128 * 1024 * 1024):
+        self.directory = directory
+        self.max_size = max_size
+        self._size = None
+        if not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError as error:
+                # another builder might have created it in the meantime
+                if error.errno != errno.EEXIST:
+                    raise
+
+    def get_key(self, source):
+        hash = hashlib.sha1(source)
+        hash.update(('\0%s\0%d.%d' % (
+            (__version__, ) + tuple(sys.version_info[:2])
+        )).encode('ascii'))
+        return hash.hexdigest()
+
+    def get_path(self, key):
+        return os.path.join(self.directory, key + self.extension)
+
+    def get(self, key):
+        path = self.get_path(key)
+        try:
+            with open(path, 'rb') as file:
+                data = file.read()
+            os.utime(path, None)
+        except (IOError, OSError):
+            return None
+        try:
+            return pickle.loads(data)
+        except Exception:
+            # written by an incompatible version of a dependency or
+            # corrupted, the entry is replaced by the next set()
+            return None
+
+    def set(self, key, value):
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        atomic_write(self.get_path(key), data)
+        # Listing the directory for every entry would make filling the cache
+        # quadratic, so the size is only determined when the cache is first
+        # written to and when the estimate exceeds the maximum. Entries
+        # written by other builders are missing from the estimate until
+        # then.
+        if self._size is None:
+            self._size = sum(size for _, size, _ in self.get_entries())
+        else:
+            self._size += len(data)
+        if self._size > self.max_size:
+            self.evict()
+
+    def get_entries(self):
+        # Returns (mtime, size, path) tuples, oldest entries first.
+        rv = []
+        for filename in os.listdir(self.directory):
+            # temporary files of atomic_write() start with a dot
+            if filename.startswith('.') or not filename.endswith(self.extension):
+                continue
+            path = os.path.join(self.directory, filename)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            rv.append((stat.st_mtime, stat.st_size, path))
+        rv.sort()
+        return rv
+
+    def evict(self):
+        entries = self.get_entries()
+        size = sum(entry_size for _, entry_size, _ in entries)
+        for _, entry_size, path in entries:
+            if size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                # removed by another builder
+                pass
+            size -= entry_size
+        self._size = size
+
+    def clear(self):
+        for _, _, path in self.get_entries():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self._size = 0
+
+
+class MemoryDocumentCache(DocumentCache):
+    # Keeps documents in memory, for long running processes. get() returns
+    # lazy copies, so that builders can apply transformations to them without
+    # affecting the cached document. set() keeps the given document itself,
+    # it must not be modified afterwards.
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self.entries = {}
+        self._clock = 0
+
+    def get(self, key):
+        try:
+            _, (document, context) = self.entries[key]
+        except KeyError:
+            return None
+        self._clock += 1
+        self.entries[key] = self._clock, (document, context)
+        return document.copy(), dict(context)
+
+    def set(self, key, value):
+        self._clock += 1
+        self.entries[key] = self._clock, value
+        if len(self.entries) > self.max_entries:
+            self.evict()
+
+    def evict(self):
+        # Removes the least recently used quarter, so that we don't have to
+        # sort the entries every time one is added.
+        entries = sorted(
+            (clock, key) for key, (clock, _) in iteritems(self.entries)
+        )
+        for _, key in entries[:max(1, len(entries) // 4)]:
+            del self.entries[key]
+
+    def clear(self):
+        self.entries.clear()
@@ -10,21 +10,22 @@ from __future__ import print_function
 import os
 import sys
 import textwrap
+import traceback
 
 from docopt import docopt
 
 from kurrent import __version__
-from kurrent.builders import SingleDocumentBuilder
-from kurrent.writers import HTML5Writer, KurrentWriter, ManWriter
+from kurrent.builders import (
+    SingleDocumentBuilder, ProjectBuilder, WriteStats, build_sources
+)
+from kurrent.links import LinkRegistry
+from kurrent.transformations import Profile
+from kurrent.writers import get_writer
 
 
 BUILDERS = {
-    'single': SingleDocumentBuilder
-}
-WRITERS = {
-    'kurrent': KurrentWriter,
-    'html5': HTML5Writer,
-    'man': ManWriter
+    'single': SingleDocumentBuilder,
+    'project': ProjectBuilder
 }
 
 
@@ -35,6 +36,7 @@ def main(argv=sys.argv):
 
     Commands:
       build
+      serve
     """
     arguments = docopt(
         textwrap.dedent(main.__doc__),
@@ -45,6 +47,8 @@ def main(argv=sys.argv):
     arguments['<args>'].insert(0, arguments['<command>'])
     if arguments['<command>'] == 'build':
         build(arguments['<args>'])
+    elif arguments['<command>'] == 'serve':
+        serve(arguments['<args>'])
     else:
         print(
             u'Error: %r is not a kurrent command.\n' % arguments['<command>'],
@@ -56,18 +60,37 @@ def main(argv=sys.argv):
             sys.exit(1)
 
 
-def build(argv):
+def build(argv, cache=None):
     """
     Usage:
-      kurrent build [-h | --help] <builder> <writer> <sources>...
+      kurrent build [-h | --help] [-v | --verbose] [--profile] [--jobs=<n>]
+                    [--watch] [--link-index=<path>] [--cache=<directory>]
+                    <builder> <writer> <sources>...
+
+    Options:
+      -v, --verbose        Prints how many files were written and how many
+                           were left unchanged.
+      --profile            Prints how much time each transformation took.
+      -j <n>, --jobs=<n>   Builds up to n sources in parallel, 0 uses as
+                           many processes as there are CPUs [default: 1].
+      --link-index=<path>  Resolves links defined in any of the sources and
+                           keeps an index of them in the given file.
+      --cache=<directory>  Caches parsed documents in the given directory.
+      --watch              Builds the sources again whenever they change,
+                           until interrupted.
 
     Builders:
-      single  Builds a single document.
+      single   Builds a single document.
+      project  Builds all documents in a directory, if they changed since
+               the last build.
 
     Writers:
       kurrent  Creates a kurrent file.
       html5    Creates an HTML5 file.
       man      Creates a man page.
+
+    Several writers separated by commas, e.g. html5,man, create a file for
+    each of them, parsing every source only once.
     """
     arguments = docopt(
         textwrap.dedent(build.__doc__),
@@ -84,16 +107,181 @@ def build(argv):
             build(['build', '--help'])
         except SystemExit:
             sys.exit(1)
+    writers = []
+    for name in arguments['<writer>'].split(','):
+        try:
+            writer_cls = get_writer(name)
+        except KeyError:
+            print(u'Error: %r is not a known writer.\n' % name, file=sys.stderr)
+            try:
+                build(['build', '--help'])
+            except SystemExit:
+                sys.exit(1)
+        if writer_cls not in writers:
+            writers.append(writer_cls)
+    # builders take a writer class or a list of them
+    writer = writers[0] if len(writers) == 1 else writers
     try:
-        writer = WRITERS[arguments['<writer>']]
-    except KeyError:
+        jobs = int(arguments['--jobs'])
+        if jobs < 0:
+            raise ValueError(jobs)
+    except ValueError:
         print(
-            u'Error: %r is not a known writer.\n' % arguments['<writer>'],
+            u'Error: %r is not a valid number of jobs.\n' % arguments['--jobs'],
             file=sys.stderr
         )
         try:
             build(['build', '--help'])
         except SystemExit:
             sys.exit(1)
-    for source in arguments['<sources>']:
-        builder(source, os.path.dirname(source), writer).build()
+    if jobs == 0:
+        import multiprocessing
+        jobs = multiprocessing.cpu_count()
+    profile = Profile() if arguments['--profile'] else None
+    link_registry = None
+    if arguments['--link-index'] is not None:
+        link_registry = LinkRegistry.load(arguments['--link-index'])
+        for source in arguments['<sources>']:
+            # project builders update the registry themselves
+            if os.path.isfile(source):
+                link_registry.update(source)
+        link_registry.prune()
+        link_registry.save()
+    if arguments['--cache'] is not None:
+        from kurrent.cache import DocumentCache
+        cache = DocumentCache(arguments['--cache'])
+    write_stats = WriteStats()
+    if arguments['--watch']:
+        if cache is None:
+            from kurrent.cache import MemoryDocumentCache
+            cache = MemoryDocumentCache()
+        watch(
+            builder, writer, arguments['<sources>'], profile=profile,
+            verbose=arguments['--verbose'], link_registry=link_registry,
+            cache=cache, write_stats=write_stats
+        )
+        return
+    failed = False
+    results = build_sources(
+        builder, writer, arguments['<sources>'], jobs=jobs, profile=profile,
+        write_stats=write_stats, link_registry=link_registry, cache=cache
+    )
+    for source, error in results:
+        if error is not None:
+            failed = True
+            print(u'Error: building %r failed:\n%s' % (source, error),
+                  file=sys.stderr)
+    if arguments['--verbose']:
+        print(write_stats.format())
+    if profile is not None:
+        print(profile.format(), file=sys.stderr)
+    if failed:
+        sys.exit(1)
+
+
+def _print_error(source):
+    print(u'Error: building %r failed:\n%s' % (
+        source, traceback.format_exc()
+    ), file=sys.stderr)
+
+
+# seconds without changes after which watch() saves indexes
+SAVE_DELAY = 0.5
+
+
+def _print_write_stats(write_stats):
+    # Prints and resets the stats, they are shared by all builders.
+    print(write_stats.format())
+    sys.stdout.flush()
+    write_stats.written = write_stats.unchanged = 0
+
+
+def _save(builders, link_registry):
+    for _, builder in builders:
+        builder.save()
+    if link_registry is not None:
+        link_registry.save()
+
+
+def watch(builder_cls, writer_cls, sources, profile=None, verbose=False,
+          link_registry=None, write_stats=None, **options):
+    # Keeps a builder for each source, so that only the documents affected by
+    # a change are built again.
+    from kurrent.watch import get_watcher
+    if write_stats is None:
+        write_stats = WriteStats()
+    builders = []
+    for source in sources:
+        builders.append((source, builder_cls(
+            source, builder_cls.get_target_dir(source), writer_cls,
+            profile=profile, link_registry=link_registry,
+            write_stats=write_stats, **options
+        )))
+    with get_watcher(sources) as watcher:
+        for source, builder in builders:
+            try:
+                builder.build()
+            except Exception:
+                _print_error(source)
+        if verbose:
+            _print_write_stats(write_stats)
+        print(u'Watching for changes...', file=sys.stderr)
+        unsaved = False
+        try:
+            while True:
+                # Saving indexes can take longer than building a document,
+                # so that is done once no more changes come in.
+                changed = watcher.wait(timeout=SAVE_DELAY if unsaved else None)
+                if not changed:
+                    _save(builders, link_registry)
+                    unsaved = False
+                    continue
+                if link_registry is not None:
+                    for source in sources:
+                        if os.path.abspath(source) not in changed:
+                            continue
+                        if os.path.isfile(source):
+                            link_registry.update(source)
+                        else:
+                            link_registry.remove(source)
+                for source, builder in builders:
+                    try:
+                        builder.update(changed)
+                    except Exception:
+                        _print_error(source)
+                if verbose:
+                    _print_write_stats(write_stats)
+                unsaved = True
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if unsaved:
+                _save(builders, link_registry)
+    if profile is not None:
+        print(profile.format(), file=sys.stderr)
+
+
+def serve(argv):
+    """
+    Usage:
+      kurrent serve [-h | --help] [--socket=<path>]
+
+    Runs commands sent with kurrent-client, keeping parsed documents in
+    memory between them.
+
+    Options:
+      --socket=<path>  The Unix domain socket to listen on, defaults to
+                       $KURRENT_SOCKET or kurrent-<uid>.sock in the
+                       temporary directory.
+    """
+    from kurrent.server import BuildServer, get_default_socket_path
+    arguments = docopt(textwrap.dedent(serve.__doc__), argv=argv)
+    socket_path = arguments['--socket'] or get_default_socket_path()
+    server = BuildServer(socket_path)
+    print(u'Listening on %s' % socket_path, file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,84 @@
+# coding: utf-8
+"""
+    kurrent.client
+    ~~~~~~~~~~~~~~
+
+    Sends commands to a server started with ``kurrent serve`` and takes the
+    same arguments as ``kurrent``. This module is imported for every
+    command, keep its imports to a minimum.
+
+    :copyright: 2013 by Daniel Neuhäuser
+    :license: BSD, see LICENSE.rst for details
+"""
+import os
+import sys
+import json
+import socket
+import tempfile
+
+
+def get_socket_path():
+    # kept in sync with kurrent.server.get_default_socket_path(), which we
+    # don't import to avoid importing everything the server needs
+    return os.environ.get('KURRENT_SOCKET') or os.path.join(
+        tempfile.gettempdir(), 'kurrent-%d.sock' % os.getuid()
+    )
+
+
+def _receive_line(client):
+    chunks = []
+    while True:
+        chunk = client.recv(65536)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        if chunk.endswith(b'\n'):
+            break
+    return b''.join(chunks)
+
+
+def send(argv, socket_path=None, cwd=None):
+    # Returns the response of the server, raises socket.error, if the
+    # server is not running.
+    if socket_path is None:
+        socket_path = get_socket_path()
+    if cwd is None:
+        cwd = os.getcwd()
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(socket_path)
+        client.sendall(json.dumps({
+            'argv': argv,
+            'cwd': cwd
+        }).encode('utf-8') + b'\n')
+        response = _receive_line(client)
+    finally:
+        client.close()
+    if not response:
+        raise socket.error('%s closed the connection' % socket_path)
+    return json.loads(response.decode('utf-8'))
+
+
+def _write(stream, text):
+    if not text:
+        return
+    # Python 3 streams want text, Python 2 streams want bytes.
+    if hasattr(stream, 'buffer'):
+        stream.buffer.write(text.encode('utf-8'))
+    elif sys.version_info[0] == 2:
+        stream.write(text.encode('utf-8'))
+    else:
+        stream.write(text)
+    stream.flush()
+
+
+def main(argv=sys.argv):
+    try:
+        response = send(argv[1:])
+    except socket.error:
+        # no server, run the command ourselves
+        from kurrent.cli import main
+        return main(['kurrent'] + argv[1:])
+    _write(sys.stdout, response['stdout'])
+    _write(sys.stderr, response['stderr'])
+    sys.exit(response['returncode'])
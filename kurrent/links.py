@@ -0,0 +1,141 @@
+# coding: utf-8
+"""
+    kurrent.links
+    ~~~~~~~~~~~~~
+
+    :copyright: 2013 by Daniel Neuhäuser
+    :license: BSD, see LICENSE.rst for details
+"""
+import os
+import json
+import hashlib
+
+from . import ast
+from .parser import Parser
+from .utils import atomic_write
+from ._compat import text_type, iteritems
+
+
+def get_link_definitions(document):
+    links = {}
+    for node in document.traverse():
+        if isinstance(node, ast.Extension) and node.type is None:
+            links.setdefault(text_type(node.primary), text_type(node.secondary))
+    return links
+
+
+class LinkRegistry(object):
+    # Maps link names defined in any document of a project to their targets.
+    #
+    # The index keeps the link definitions of each source keyed by the hash
+    # of its content, along with the modification time and size of each
+    # source path. Sources whose modification time and size did not change
+    # are neither read nor parsed again, sources that changed but have the
+    # same content are read but not parsed.
+    version = 1
+
+    def __init__(self, path=None):
+        self.path = path
+        # source path -> {'mtime': ..., 'size': ..., 'hash': ...}
+        self.sources = {}
+        # source hash -> {link name: target}
+        self.definitions = {}
+        self._links = None
+
+    @classmethod
+    def load(cls, path):
+        registry = cls(path)
+        try:
+            with open(path, 'rb') as file:
+                index = json.loads(file.read().decode('utf-8'))
+        except (IOError, OSError, ValueError):
+            return registry
+        if index.get('version') == cls.version:
+            registry.sources = index['sources']
+            registry.definitions = index['definitions']
+        return registry
+
+    def save(self, path=None):
+        if path is None:
+            path = self.path
+        hashes = set(entry['hash'] for entry in self.sources.values())
+        index = {
+            'version': self.version,
+            'sources': self.sources,
+            'definitions': dict(
+                (hash, links) for hash, links in iteritems(self.definitions)
+                if hash in hashes
+            )
+        }
+        atomic_write(path, json.dumps(index, sort_keys=True).encode('utf-8'))
+
+    def is_current(self, source_path, stat=None):
+        entry = self.sources.get(os.path.abspath(source_path))
+        if entry is None:
+            return False
+        if stat is None:
+            stat = os.stat(source_path)
+        return entry['mtime'] == stat.st_mtime and entry['size'] == stat.st_size
+
+    def update(self, source_path, stat=None, documents=None):
+        # Returns True, if the link definitions of the source changed. Pass
+        # the result of os.stat(), if you have it already. If the source has
+        # to be parsed and a dict is given as `documents`, the document is
+        # added to it keyed by the absolute source path, so that builders
+        # don't have to parse it again.
+        if stat is None:
+            stat = os.stat(source_path)
+        if self.is_current(source_path, stat=stat):
+            return False
+        with open(source_path, 'rb') as file:
+            source = file.read()
+        hash = hashlib.sha1(source).hexdigest()
+        if hash not in self.definitions:
+            with Parser.from_bytes(source) as parser:
+                document = parser.parse()
+            self.definitions[hash] = get_link_definitions(document)
+            if documents is not None:
+                documents[os.path.abspath(source_path)] = document
+        entry = self.sources.get(os.path.abspath(source_path))
+        if entry is None:
+            changed = bool(self.definitions[hash])
+        else:
+            # most changes don't touch the link definitions
+            changed = self.definitions[entry['hash']] != self.definitions[hash]
+        self.sources[os.path.abspath(source_path)] = {
+            'mtime': stat.st_mtime,
+            'size': stat.st_size,
+            'hash': hash
+        }
+        if changed:
+            self._links = None
+        return changed
+
+    def remove(self, source_path):
+        # Returns True, if the source defined any links.
+        entry = self.sources.pop(os.path.abspath(source_path), None)
+        if entry is None or not self.definitions[entry['hash']]:
+            return False
+        self._links = None
+        return True
+
+    def prune(self):
+        # Removes the sources that no longer exist, e.g. because they have
+        # been deleted or renamed since the index was saved. Returns True, if
+        # any of them defined links.
+        rv = False
+        for source_path in sorted(self.sources):
+            if not os.path.exists(source_path):
+                rv |= self.remove(source_path)
+        return rv
+
+    def resolve(self, name):
+        # Returns a `(target, source_path)` tuple or None. If several sources
+        # define the same link, the one with the first path wins.
+        if self._links is None:
+            self._links = {}
+            for source_path in sorted(self.sources):
+                hash = self.sources[source_path]['hash']
+                for link, target in iteritems(self.definitions[hash]):
+                    self._links.setdefault(link, (target, source_path))
+        return self._links.get(name)
@@ -89,17 +89,34 @@ class InlineTokenizer(TransactionIterator):
         super(InlineTokenizer, self).__init__(self._iter())
         self.lines = lines
 
-        self.states = self._compile_states(self.states)
+        self.states = self.get_compiled_states()
         self.state_stack = [None]
 
     @property
     def state(self):
         return self.states[self.state_stack[-1]]
 
-    def _compile_states(self, states):
+    @classmethod
+    def get_compiled_states(cls):
+        # A tokenizer is created for every paragraph, the states are only
+        # compiled once for each class.
+        rv = cls.__dict__.get('_compiled_states')
+        if rv is None:
+            rv = cls._compiled_states = cls._compile_states(cls.states)
+        return rv
+
+    @staticmethod
+    def _compile_states(states):
+        # Each state is compiled into a single regex, which has an
+        # alternative for each rule in order, so that text not matching any
+        # rule can be skipped with one search. The regex is returned with a
+        # dictionary mapping the group of each alternative to the label,
+        # method and arguments of the rule.
         rv = {}
         for identifier, state in iteritems(states):
-            rv[identifier] = compiled_state = []
+            alternatives = []
+            rules = {}
+            group = 1
             for rule in state:
                 method = None
                 args = []
@@ -112,7 +129,10 @@ class InlineTokenizer(TransactionIterator):
                     args = rule[3:]
                 else:
                     assert False, (identifier, rule)
-                compiled_state.append((re.compile(regex), label, method, args))
+                alternatives.append(u'(%s)' % regex)
+                rules[group] = label, method, args
+                group += re.compile(regex).groups + 1
+            rv[identifier] = re.compile(u'|'.join(alternatives)), rules
         return rv
 
     def _iter(self):
@@ -135,34 +155,31 @@ class InlineTokenizer(TransactionIterator):
 
     def _tokenize(self, line):
         columnno = 0
-        text_columnno = line.columnno
-        text = []
-        while line[columnno:]:
-            for regex, label, method, args in self.state:
-                match = regex.match(line, columnno)
-                if match is not None:
-                    break
-            else:
-                if not text:
-                    if columnno == 0:
-                        text_columnno = line.columnno
-                    else:
-                        text_columnno = columnno + 1
-                text.append(line[columnno:columnno + 1])
-                columnno += 1
-            if match is not None:
-                if text:
-                    yield Line(u''.join(text), line.lineno, text_columnno), None
-                    text = []
-                yield Line(match.group(1), line.lineno, columnno + 1), label
-                if match.end() <= columnno:
-                    assert False
-                columnno = match.end()
-                if method is not None:
-                    getattr(self, method)(*args)
-        if text:
-            yield Line(u''.join(text), line.lineno, text_columnno), None
-            text = []
+        length = len(line)
+        while columnno < length:
+            regex, rules = self.state
+            match = regex.search(line, columnno)
+            end = length if match is None else match.start()
+            if end > columnno:
+                if columnno == 0:
+                    text_columnno = line.columnno
+                else:
+                    text_columnno = columnno + 1
+                yield Line(
+                    line[columnno:end], line.lineno, text_columnno
+                ), None
+            if match is None:
+                break
+            label, method, args = rules[match.lastindex]
+            # the first group of the rule's own regex
+            yield Line(
+                match.group(match.lastindex + 1), line.lineno, end + 1
+            ), label
+            if match.end() <= end:
+                assert False
+            columnno = match.end()
+            if method is not None:
+                getattr(self, method)(*args)
 
     def push_state(self, state):
         self.state_stack.append(state)
@@ -208,6 +225,9 @@ class Line(text_type):
         self.columnno = columnno
         return self
 
+    def __getnewargs__(self):
+        return text_type(self), self.lineno, self.columnno
+
     @property
     def start(self):
         return ast.Location(self.lineno, self.columnno)
@@ -319,29 +339,37 @@ class Parser(object):
     encoding = 'utf-8'
 
     @classmethod
-    def from_path(cls, path):
+    def from_path(cls, path, keep_source=False):
         return cls.from_stream(codecs.open(path, 'r', encoding=cls.encoding),
-                               filename=path)
+                               filename=path, keep_source=keep_source)
 
     @classmethod
-    def from_string(cls, string):
-        return cls.from_stream(io.StringIO(string), filename='<string>')
+    def from_string(cls, string, keep_source=False):
+        return cls.from_stream(
+            io.StringIO(string), filename='<string>', keep_source=keep_source
+        )
 
     @classmethod
-    def from_bytes(cls, bytes):
+    def from_bytes(cls, bytes, keep_source=False):
         bytestream = io.BytesIO(bytes)
         stringstream = codecs.lookup(cls.encoding).streamreader(bytestream)
-        return cls.from_stream(stringstream, filename='<string>')
+        return cls.from_stream(
+            stringstream, filename='<string>', keep_source=keep_source
+        )
 
     @classmethod
-    def from_stream(cls, stream, filename=None):
+    def from_stream(cls, stream, filename=None, keep_source=False):
         if filename is None:
             filename = stream.filename
-        return cls(LineIterator(stream), filename)
+        return cls(LineIterator(stream), filename, keep_source=keep_source)
 
-    def __init__(self, lineiterator, filename=None):
+    def __init__(self, lineiterator, filename=None, keep_source=False):
         self.lines = lineiterator
         self.filename = filename
+        # Keeps the lines each block of the document has been parsed from as
+        # its source, writers may copy unmodified blocks instead of writing
+        # them again, see KurrentWriter.
+        self.keep_source = keep_source
 
     def __enter__(self):
         self.lines.__enter__()
@@ -351,10 +379,24 @@ class Parser(object):
         self.lines.__exit__(*exc_info)
 
     def parse(self):
-        return ast.Document(
+        if not self.keep_source:
+            return ast.Document(
+                self.filename,
+                children=list(self.parse_blocks(self.lines))
+            )
+        offset = self.lines.lineno + 1
+        source = list(self.lines)
+        rv = ast.Document(
             self.filename,
-            children=list(self.parse_blocks(self.lines))
+            children=list(self.parse_blocks(
+                LineIterator(source, offset - 1, self.lines.columnno)
+            ))
         )
+        for block in rv.children:
+            start, end = block.start, block.end
+            if start is not None and end is not None:
+                block.source = source[start.line - offset:end.line - offset + 1]
+        return rv
 
     def parse_blocks(self, lines):
         while True:
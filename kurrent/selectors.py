@@ -0,0 +1,221 @@
+# coding: utf-8
+"""
+    kurrent.selectors
+    ~~~~~~~~~~~~~~~~~
+
+    Selectors match nodes by their type, attributes and ancestors::
+
+        Paragraph > InlineExtension[type=None]
+        BlockQuote Text[text="foo"]
+        Header[level=1]:first
+
+    Types are the names of the node classes in :mod:`kurrent.ast` or ``*``,
+    attribute values are ``None``, ``True``, ``False``, integers or strings,
+    optionally quoted. ``A > B`` matches ``B`` nodes whose parent matches
+    ``A``, ``A B`` those with any ancestor matching ``A``. ``:first`` at the
+    end of a selector restricts it to the first match in document order.
+
+    :copyright: 2013 by Daniel Neuhäuser
+    :license: BSD, see LICENSE.rst for details
+"""
+import re
+
+from . import ast
+
+
+class SelectorError(Exception):
+    pass
+
+
+_compound_re = re.compile(r'(\*|[A-Za-z_]\w*)((?:\[[^\]]*\])*)((?::\w+)*)')
+_attribute_re = re.compile(r'\[\s*(\w+)\s*=\s*(.*?)\s*\]')
+_combinator_re = re.compile(r'\s*(>)\s*|\s+')
+
+_constants = {'None': None, 'True': True, 'False': False}
+
+_missing = object()
+
+
+def _parse_value(string):
+    if string in _constants:
+        return _constants[string]
+    if len(string) >= 2 and string[0] in '"\'' and string[-1] == string[0]:
+        return string[1:-1]
+    try:
+        return int(string)
+    except ValueError:
+        return string
+
+
+def _get_node_class(name):
+    if name == '*':
+        return ast.ASTNode
+    node_cls = getattr(ast, name, None)
+    if not (isinstance(node_cls, type) and issubclass(node_cls, ast.ASTNode)):
+        raise SelectorError('unknown node type %r' % name)
+    return node_cls
+
+
+def _is_attached(node, root):
+    while node is not None:
+        if node is root:
+            return True
+        node = node.parent
+    return False
+
+
+class NodeIndex(object):
+    # Maps node classes to the nodes that are instances of them, in document
+    # order. The index is not updated when the tree changes, selectors ignore
+    # nodes that have been removed since it was created but nodes that have
+    # been added are missing.
+    #
+    # If `nodes` is given, the index consists of the given mapping, e.g.
+    # collected while traversing the document for other reasons, and only
+    # covers the classes in it.
+    def __init__(self, root, nodes=None):
+        self.root = root
+        if nodes is None:
+            nodes = {}
+            for node in root.traverse():
+                for node_cls in node.__class__.__mro__:
+                    nodes.setdefault(node_cls, []).append(node)
+            self.complete = True
+        else:
+            self.complete = False
+        self.nodes = nodes
+
+    def covers(self, node_cls):
+        return self.complete or node_cls in self.nodes
+
+    def get(self, node_cls):
+        return self.nodes.get(node_cls, [])
+
+
+class Selector(object):
+    def __init__(self, compounds, combinators, first=False):
+        # compounds are (node class, [(attribute, value), ...]) tuples from
+        # left to right with a combinator, '>' or ' ', between each of them.
+        self.compounds = compounds
+        self.combinators = combinators
+        self.first = first
+        # whether the selector matches all instances of node_cls
+        self.by_type = len(compounds) == 1 and not compounds[0][1]
+        if self.by_type:
+            # the common case of selecting by type alone
+            node_cls = compounds[0][0]
+            self.matches = lambda node: isinstance(node, node_cls)
+
+    @property
+    def node_cls(self):
+        return self.compounds[-1][0]
+
+    def _matches_compound(self, node, position):
+        node_cls, attributes = self.compounds[position]
+        if not isinstance(node, node_cls):
+            return False
+        for name, value in attributes:
+            if getattr(node, name, _missing) != value:
+                return False
+        return True
+
+    def _matches(self, node, position):
+        if not self._matches_compound(node, position):
+            return False
+        if position == 0:
+            return True
+        if self.combinators[position - 1] == '>':
+            return (
+                node.parent is not None and
+                self._matches(node.parent, position - 1)
+            )
+        ancestor = node.parent
+        while ancestor is not None:
+            if self._matches(ancestor, position - 1):
+                return True
+            ancestor = ancestor.parent
+        return False
+
+    def matches(self, node):
+        # Ignores :first, that depends on the other nodes in the document.
+        return self._matches(node, len(self.compounds) - 1)
+
+    def candidates(self, root, index=None):
+        # Yields the nodes below root, which may match, in document order.
+        if index is None:
+            node_cls = self.node_cls
+            for node in root.traverse():
+                if isinstance(node, node_cls):
+                    yield node
+        else:
+            for node in index.get(self.node_cls):
+                if _is_attached(node, root):
+                    yield node
+
+    def select(self, root, index=None):
+        for node in self.candidates(root, index=index):
+            if self.matches(node):
+                yield node
+                if self.first:
+                    break
+
+    def __repr__(self):
+        return '%s(%r, %r, first=%r)' % (
+            self.__class__.__name__, self.compounds, self.combinators,
+            self.first
+        )
+
+
+def _compile(selector):
+    compounds = []
+    combinators = []
+    first = False
+    position = 0
+    string = selector.strip()
+    while True:
+        if first:
+            raise SelectorError(':first must be at the end of %r' % selector)
+        match = _compound_re.match(string, position)
+        if match is None:
+            raise SelectorError('expected node type at %d in %r' % (
+                position, selector
+            ))
+        attributes = []
+        for attribute in re.findall(r'\[[^\]]*\]', match.group(2)):
+            attribute_match = _attribute_re.match(attribute)
+            if attribute_match is None:
+                raise SelectorError('invalid attribute %r in %r' % (
+                    attribute, selector
+                ))
+            name, value = attribute_match.groups()
+            attributes.append((name, _parse_value(value)))
+        for pseudo_class in match.group(3).split(':')[1:]:
+            if pseudo_class != 'first':
+                raise SelectorError('unknown pseudo class %r' % pseudo_class)
+            first = True
+        compounds.append((_get_node_class(match.group(1)), attributes))
+        position = match.end()
+        if position == len(string):
+            return Selector(compounds, combinators, first=first)
+        match = _combinator_re.match(string, position)
+        if match is None:
+            raise SelectorError('expected combinator at %d in %r' % (
+                position, selector
+            ))
+        combinators.append(match.group(1) or ' ')
+        position = match.end()
+
+
+_cache = {}
+
+
+def compile(selector):
+    try:
+        return _cache[selector]
+    except KeyError:
+        rv = _cache[selector] = _compile(selector)
+        return rv
+
+
+def select(selector, root, index=None):
+    return compile(selector).select(root, index=index)
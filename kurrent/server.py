@@ -0,0 +1,128 @@
+# coding: utf-8
+"""
+    kurrent.server
+    ~~~~~~~~~~~~~~
+
+    A server running kurrent commands, sent to it over a Unix domain socket
+    by :mod:`kurrent.client`, so that they don't have to pay for starting
+    the interpreter and importing everything each time.
+
+    Requests and responses are JSON objects on a single line. A request has
+    the command line arguments, without the program name, in ``argv`` and
+    the working directory of the client in ``cwd``. The response has the
+    ``returncode`` and the ``stdout`` and ``stderr`` output of the command.
+
+    :copyright: 2013 by Daniel Neuhäuser
+    :license: BSD, see LICENSE.rst for details
+"""
+import os
+import sys
+import json
+import socket
+import tempfile
+import traceback
+
+from kurrent import cli
+from kurrent.cache import MemoryDocumentCache
+from kurrent._compat import PY2, NativeStringIO
+
+# not in kurrent._compat, importing it would slow down every command
+if PY2:
+    import SocketServer as socketserver
+else:
+    import socketserver
+
+
+def get_default_socket_path():
+    return os.environ.get('KURRENT_SOCKET') or os.path.join(
+        tempfile.gettempdir(), 'kurrent-%d.sock' % os.getuid()
+    )
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline().decode('utf-8'))
+            response = self.server.run(request['argv'], request['cwd'])
+        except Exception as error:
+            response = {
+                'returncode': 1,
+                'stdout': u'',
+                'stderr': u'Error: invalid request: %s\n' % error
+            }
+        self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+
+
+class BuildServer(socketserver.UnixStreamServer):
+    # Requests are handled one after another, commands change the working
+    # directory and replace sys.stdout and sys.stderr.
+    def __init__(self, socket_path, cache=None):
+        self.socket_path = socket_path
+        if cache is None:
+            cache = MemoryDocumentCache()
+        self.cache = cache
+        if os.path.exists(socket_path):
+            if self.is_running(socket_path):
+                raise socket.error('%s is in use' % socket_path)
+            os.remove(socket_path)
+        socketserver.UnixStreamServer.__init__(
+            self, socket_path, RequestHandler
+        )
+
+    def server_bind(self):
+        # Anyone who can connect can run commands as the user who started
+        # the server, so the socket is restricted to that user. Binding with
+        # a restrictive umask leaves no window in which others could connect.
+        umask = os.umask(0o077)
+        try:
+            socketserver.UnixStreamServer.server_bind(self)
+        finally:
+            os.umask(umask)
+        os.chmod(self.socket_path, 0o600)
+
+    @staticmethod
+    def is_running(socket_path):
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            client.connect(socket_path)
+        except socket.error:
+            return False
+        else:
+            return True
+        finally:
+            client.close()
+
+    def run(self, argv, cwd):
+        stdout, stderr = sys.stdout, sys.stderr
+        old_cwd = os.getcwd()
+        sys.stdout, sys.stderr = NativeStringIO(), NativeStringIO()
+        returncode = 0
+        try:
+            os.chdir(cwd)
+            if argv[:1] == ['build']:
+                cli.build(argv, cache=self.cache)
+            else:
+                cli.main(['kurrent'] + argv)
+        except SystemExit as exit:
+            if exit.code is None or isinstance(exit.code, int):
+                returncode = exit.code or 0
+            else:
+                sys.stderr.write(u'%s\n' % exit.code)
+                returncode = 1
+        except Exception:
+            sys.stderr.write(traceback.format_exc())
+            returncode = 1
+        finally:
+            response = {
+                'returncode': returncode,
+                'stdout': sys.stdout.getvalue(),
+                'stderr': sys.stderr.getvalue()
+            }
+            sys.stdout, sys.stderr = stdout, stderr
+            os.chdir(old_cwd)
+        return response
+
+    def server_close(self):
+        socketserver.UnixStreamServer.server_close(self)
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
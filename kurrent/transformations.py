@@ -6,7 +6,9 @@
     :copyright: 2013 by Daniel Neuhäuser
     :license: BSD, see LICENSE.rst for details
 """
-from . import ast
+from timeit import default_timer
+
+from . import ast, selectors
 from ._compat import ifilter
 
 
@@ -15,36 +17,75 @@ class StopTransformation(BaseException):
 
 
 class Transformation(object):
+    # transformations that must have been applied to the entire document,
+    # before this one is applied
+    requires = ()
+    # What the transformation reads and writes, either node classes or
+    # strings such as 'context:links' or 'metadata:title'. The scheduler
+    # uses these to order and fuse transformations, and skips
+    # transformations consuming node classes that are absent from the
+    # document. Transformations declaring neither are never reordered.
+    consumes = ()
+    produces = ()
+    # a selector, see kurrent.selectors, used by select_node(); a selector
+    # ending with :first stops the transformation after the first match
+    selector = None
+
+    # a kurrent.selectors.NodeIndex apply() takes candidates for the
+    # selector from, set by apply_transformations()
+    index = None
+    exhausted = False
+
     def __init__(self, document, context):
         self.document = document
         self.context = context
 
     def apply(self):
-        for node in ifilter(self.select_node, self.document.traverse()):
+        if self.selector is None:
+            nodes = self.document.traverse()
+        else:
+            nodes = selectors.compile(self.selector).candidates(
+                self.document, index=self.index
+            )
+        for node in ifilter(self.select_node, nodes):
             try:
                 self.transform(node)
             except StopTransformation:
                 break
+            if self.exhausted:
+                break
 
     def select_node(self, node):
-        raise NotImplementedError()
+        if self.selector is None:
+            raise NotImplementedError()
+        if self.exhausted:
+            return False
+        try:
+            selector = self._selector
+        except AttributeError:
+            selector = self._selector = selectors.compile(self.selector)
+        if selector.matches(node):
+            self.exhausted = selector.first
+            return True
+        return False
 
     def transform(self, node):
         raise NotImplementedError()
 
 
 class TitleTransformation(Transformation):
-    def select_node(self, node):
-        return isinstance(node, ast.Header)
+    consumes = (ast.Header,)
+    produces = ('metadata:title',)
+    selector = 'Header:first'
 
     def transform(self, node):
         self.document.metadata['title'] = node.text
-        raise StopTransformation()
 
 
 class LinkExtensionTransformation(Transformation):
-    def select_node(self, node):
-        return isinstance(node, ast.Extension) and node.type is None
+    consumes = (ast.Extension,)
+    produces = ('context:links',)
+    selector = 'Extension[type=None]'
 
     def transform(self, node):
         links = self.context.setdefault('links', {})
@@ -55,13 +96,26 @@ class LinkExtensionTransformation(Transformation):
 
 
 class LinkInlineExtensionTransformation(Transformation):
-    def select_node(self, node):
-        return isinstance(node, ast.InlineExtension) and node.type is None
+    consumes = (ast.InlineExtension, 'context:links')
+    produces = (ast.Link,)
+    selector = 'InlineExtension[type=None]'
 
-    def transform(self, node):
+    def resolve(self, name):
         links = self.context.get('links', {})
-        if node.primary in links:
-            target = links[node.primary]
+        if name in links:
+            return links[name]
+        registry = self.context.get('link_registry')
+        if registry is not None:
+            # Links defined in other documents of the project. Builders
+            # rebuild the document, if the recorded resolutions change.
+            resolved = registry.resolve(name)
+            self.context.setdefault('link_dependencies', {})[name] = resolved
+            if resolved is not None:
+                return resolved[0]
+
+    def transform(self, node):
+        target = self.resolve(node.primary)
+        if target is not None:
             text = node.primary if node.text is None else node.text
         elif node.text is None:
             target = text = node.primary
@@ -73,6 +127,414 @@ class LinkInlineExtensionTransformation(Transformation):
         ))
 
 
+def _is_fusable(transformation_cls):
+    # Transformations with their own apply() can't share a traversal.
+    return (
+        _get_function(transformation_cls.apply) is
+        _get_function(Transformation.apply)
+    )
+
+
+def _overlaps(resources, other_resources):
+    for resource in resources:
+        for other in other_resources:
+            if resource == other or (
+                isinstance(resource, type) and isinstance(other, type) and
+                (issubclass(resource, other) or issubclass(other, resource))
+            ):
+                return True
+    return False
+
+
+def _depends(transformation_cls, other_cls):
+    return (
+        other_cls in transformation_cls.requires or
+        _overlaps(transformation_cls.consumes, other_cls.produces)
+    )
+
+
+def _is_declared(transformation_cls):
+    return bool(transformation_cls.consumes or transformation_cls.produces)
+
+
+def _get_node_classes(transformation_cls):
+    return [
+        resource for resource in transformation_cls.consumes
+        if isinstance(resource, type)
+    ]
+
+
+def _find_node_classes(document, node_classes):
+    # Returns those of the given node classes that have instances in the
+    # document, stopping as soon as all have been found.
+    missing = set(node_classes)
+    found = set()
+    stack = [document]
+    while stack and missing:
+        node = stack.pop()
+        for node_cls in list(missing):
+            if isinstance(node, node_cls):
+                missing.remove(node_cls)
+                found.add(node_cls)
+        for field in node.child_fields:
+            stack.extend(getattr(node, field))
+    return found
+
+
+def schedule(transformation_classes, document=None):
+    # Returns a list of passes, lists of transformations that are applied
+    # with a single traversal of the document.
+    #
+    # A transformation is applied after those it depends on, those it
+    # requires or whose products it consumes, and in a later pass. The same
+    # is true for transformations producing the same thing, which are
+    # applied in the given order. Transformations that don't declare what
+    # they consume and produce and those that can't be fused keep their
+    # position relative to all others and get a pass of their own.
+    #
+    # If a document is given, transformations consuming only node classes
+    # that neither appear in the document nor are produced by an earlier
+    # transformation are skipped. We don't know what undeclared
+    # transformations produce, so none after them are skipped.
+    classes = list(transformation_classes)
+    predecessors = [[] for _ in classes]
+    for j, later in enumerate(classes):
+        for i, earlier in enumerate(classes[:j]):
+            forward = _depends(later, earlier)
+            backward = _depends(earlier, later)
+            if forward or backward:
+                if forward:
+                    predecessors[j].append(i)
+                if backward:
+                    predecessors[i].append(j)
+            elif (
+                _overlaps(earlier.produces, later.produces) or
+                not (_is_fusable(earlier) and _is_fusable(later)) or
+                not (_is_declared(earlier) and _is_declared(later))
+            ):
+                predecessors[j].append(i)
+
+    order = []
+    remaining = list(range(len(classes)))
+    while remaining:
+        for index in remaining:
+            if all(i in order for i in predecessors[index]):
+                break
+        else:
+            raise ValueError('cyclic dependencies between %s' % ', '.join(
+                classes[index].__name__ for index in remaining
+            ))
+        remaining.remove(index)
+        order.append(index)
+
+    present = None
+    if document is not None:
+        consumed = set()
+        for transformation_cls in classes:
+            consumed.update(_get_node_classes(transformation_cls))
+        present = _find_node_classes(document, consumed)
+    levels = {}
+    for index in order:
+        transformation_cls = classes[index]
+        if present is not None:
+            node_classes = _get_node_classes(transformation_cls)
+            if node_classes and not _overlaps(node_classes, present):
+                continue
+            if _is_declared(transformation_cls):
+                present.update(
+                    resource for resource in transformation_cls.produces
+                    if isinstance(resource, type)
+                )
+            else:
+                present = None
+        levels[index] = max([0] + [
+            levels[i] + 1 for i in predecessors[index] if i in levels
+        ])
+
+    passes = []
+    for index in order:
+        if index not in levels:
+            continue
+        while len(passes) <= levels[index]:
+            passes.append([])
+        passes[levels[index]].append(classes[index])
+    return [pass_ for pass_ in passes if pass_]
+
+
+def _get_matcher(transformation):
+    # Returns a `(node_cls, match, first)` tuple, the transformation selects
+    # nodes that are instances of node_cls and for which match(node) is true,
+    # or all of them if match is None. Selectors are matched directly,
+    # instead of calling select_node() for every node, `first` is what
+    # select_node() would set `exhausted` to or None.
+    select_node = transformation.select_node
+    if (
+        transformation.selector is None or
+        _get_function(select_node) is not
+        _get_function(Transformation.select_node)
+    ):
+        return ast.ASTNode, select_node, None
+    selector = selectors.compile(transformation.selector)
+    if selector.by_type:
+        return selector.node_cls, None, selector.first
+    return selector.node_cls, selector.matches, selector.first
+
+
+def apply_fused(document, transformations, collect=()):
+    # Applies the transformations with a single traversal of the document.
+    # If node classes to `collect` are given, returns a
+    # kurrent.selectors.NodeIndex of their instances, which is filled during
+    # the traversal.
+    matchers = [
+        (transformation, ) + _get_matcher(transformation)
+        for transformation in transformations
+    ]
+    nodes = dict((node_cls, []) for node_cls in collect)
+    # node classes mapped to the matchers and lists of collected nodes
+    # applying to them
+    dispatch = {}
+    for node in document.traverse():
+        try:
+            candidates, lists = dispatch[node.__class__]
+        except KeyError:
+            candidates, lists = dispatch[node.__class__] = (
+                [matcher for matcher in matchers
+                 if issubclass(node.__class__, matcher[1])],
+                [nodes[node_cls] for node_cls in collect
+                 if issubclass(node.__class__, node_cls)]
+            )
+        for list_ in lists:
+            list_.append(node)
+        if not candidates:
+            continue
+        parent = node.parent
+        stopped = []
+        for transformation, _, match, first in candidates:
+            if match is not None and not match(node):
+                continue
+            if first is not None:
+                transformation.exhausted = first
+            try:
+                transformation.transform(node)
+            except StopTransformation:
+                stopped.append(transformation)
+            else:
+                if transformation.exhausted:
+                    stopped.append(transformation)
+            if node.parent is not parent:
+                # The node has been replaced or removed, the remaining
+                # transformations must not see it anymore.
+                break
+        if stopped:
+            matchers = [
+                matcher for matcher in matchers if matcher[0] not in stopped
+            ]
+            dispatch.clear()
+            if not matchers and not collect:
+                break
+    if collect:
+        return selectors.NodeIndex(document, nodes=nodes)
+
+
+def _get_function(method):
+    return getattr(method, '__func__', method)
+
+
+class TransformationStats(object):
+    def __init__(self, transformation_cls):
+        self.transformation_cls = transformation_cls
+        # number of times the transformation has been applied to a document
+        self.applied = 0
+        self.time = 0.0
+        # number of nodes select_node() has been called with
+        self.candidates = 0
+        self.selected = 0
+        # number of times children have been added, replaced or removed and
+        # metadata has been changed
+        self.mutations = 0
+
+    def __repr__(self):
+        return (
+            '%s(%s, applied=%r, time=%r, candidates=%r, selected=%r, '
+            'mutations=%r)'
+        ) % (
+            self.__class__.__name__, self.transformation_cls.__name__,
+            self.applied, self.time, self.candidates, self.selected,
+            self.mutations
+        )
+
+
+class Profile(object):
+    # Collects TransformationStats for every transformation applied by
+    # apply_transformations(). The time of transformations that are applied
+    # as part of a pass is the time spent in their select_node() and
+    # transform() methods, the time of those with their own apply() is the
+    # time spent in apply().
+    def __init__(self):
+        self.stats = []
+        self._stats_by_cls = {}
+
+    def get_stats(self, transformation_cls):
+        try:
+            return self._stats_by_cls[transformation_cls]
+        except KeyError:
+            stats = TransformationStats(transformation_cls)
+            self._stats_by_cls[transformation_cls] = stats
+            self.stats.append(stats)
+            return stats
+
+    def merge(self, other):
+        # Adds the stats collected by another profile, e.g. in another
+        # process, to this one.
+        for other_stats in other.stats:
+            stats = self.get_stats(other_stats.transformation_cls)
+            stats.applied += other_stats.applied
+            stats.time += other_stats.time
+            stats.candidates += other_stats.candidates
+            stats.selected += other_stats.selected
+            stats.mutations += other_stats.mutations
+
+    def instrument(self, transformation):
+        stats = self.get_stats(transformation.__class__)
+        stats.applied += 1
+        fusable = _is_fusable(transformation.__class__)
+        select_node = transformation.select_node
+        transform = transformation.transform
+        apply = transformation.apply
+
+        def count_mutation(node):
+            stats.mutations += 1
+
+        def observe(function, *args):
+            metadata = dict(transformation.document.metadata)
+            try:
+                with ast.observe_mutations(count_mutation):
+                    return function(*args)
+            finally:
+                if transformation.document.metadata != metadata:
+                    stats.mutations += 1
+
+        def timed(function, *args):
+            start = default_timer()
+            try:
+                return function(*args)
+            finally:
+                stats.time += default_timer() - start
+
+        def instrumented_select_node(node):
+            stats.candidates += 1
+            if fusable:
+                selected = timed(select_node, node)
+            else:
+                selected = select_node(node)
+            if selected:
+                stats.selected += 1
+            return selected
+
+        def instrumented_transform(node):
+            if fusable:
+                return timed(observe, transform, node)
+            return transform(node)
+
+        def instrumented_apply():
+            if fusable:
+                return apply()
+            return timed(observe, apply)
+
+        transformation.select_node = instrumented_select_node
+        transformation.transform = instrumented_transform
+        transformation.apply = instrumented_apply
+        return transformation
+
+    def format(self):
+        lines = [u'%-40s %7s %12s %10s %9s %9s' % (
+            u'transformation', u'applied', u'time', u'candidates',
+            u'selected', u'mutations'
+        )]
+        for stats in sorted(self.stats, key=lambda stats: -stats.time):
+            lines.append(u'%-40s %7d %10.3fms %10d %9d %9d' % (
+                stats.transformation_cls.__name__, stats.applied,
+                stats.time * 1000, stats.candidates, stats.selected,
+                stats.mutations
+            ))
+        return u'\n'.join(lines)
+
+
+def _uses_index(transformation_cls):
+    return (
+        transformation_cls.selector is not None and
+        _is_fusable(transformation_cls)
+    )
+
+
+def _invalidates_index(transformation_classes):
+    # Removed nodes are skipped, added nodes are missing from the index.
+    for transformation_cls in transformation_classes:
+        if not _is_declared(transformation_cls) or any(
+            isinstance(resource, type)
+            for resource in transformation_cls.produces
+        ):
+            return True
+    return False
+
+
+def _get_collected(passes, position):
+    # Returns the node classes, which the passes after the given one can
+    # take from an index filled during the traversal of that pass. Building
+    # an index of its own takes longer than traversing the document twice,
+    # nodes are only collected while the document is traversed anyway.
+    if _invalidates_index(passes[position]):
+        return []
+    rv = []
+    for transformation_classes in passes[position + 1:]:
+        if (
+            len(transformation_classes) == 1 and
+            _uses_index(transformation_classes[0])
+        ):
+            node_cls = selectors.compile(
+                transformation_classes[0].selector
+            ).node_cls
+            if node_cls not in rv:
+                rv.append(node_cls)
+        if _invalidates_index(transformation_classes):
+            break
+    return rv
+
+
+def apply_transformations(document, context, transformation_classes,
+                          profile=None):
+    passes = schedule(transformation_classes, document=document)
+    index = None
+    for position, transformation_classes in enumerate(passes):
+        transformations = [
+            transformation_cls(document, context)
+            for transformation_cls in transformation_classes
+        ]
+        if profile is not None:
+            for transformation in transformations:
+                profile.instrument(transformation)
+        if len(transformations) == 1 and not _is_fusable(
+            transformation_classes[0]
+        ):
+            transformations[0].apply()
+        elif (
+            len(transformations) == 1 and index is not None and
+            _uses_index(transformation_classes[0]) and index.covers(
+                selectors.compile(transformation_classes[0].selector).node_cls
+            )
+        ):
+            transformations[0].index = index
+            transformations[0].apply()
+        else:
+            collect = _get_collected(passes, position)
+            if collect:
+                index = apply_fused(document, transformations, collect)
+            else:
+                apply_fused(document, transformations)
+        if _invalidates_index(transformation_classes):
+            index = None
+
+
 CORE_TRANSFORMATIONS = [TitleTransformation]
 LINK_TRANSFORMATIONS = [
     LinkExtensionTransformation, LinkInlineExtensionTransformation
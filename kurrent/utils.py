@@ -6,23 +6,119 @@
     :copyright: 2013 by Daniel Neuhäuser
     :license: BSD, see LICENSE.rst for details
 """
-from io import StringIO
+import os
+import stat
 from contextlib import contextmanager
 
 from ._compat import implements_iterator
 
+
+# os.replace() is only available on Python 3.3+, on POSIX os.rename() is
+# atomic and overwrites the target as well.
+_replace = getattr(os, 'replace', os.rename)
+
+
+def _get_mode(path):
+    # Returns the mode of the file, or the one open() would create it with.
+    try:
+        return stat.S_IMODE(os.stat(path).st_mode)
+    except OSError:
+        # the umask can only be read by changing it
+        umask = os.umask(0)
+        os.umask(umask)
+        return 0o666 & ~umask
+
+
+def atomic_write(path, data):
+    # Writes `data` (bytes) to a temporary file in the same directory first
+    # and moves it into place afterwards, readers either see the old or the
+    # new content but never a partially written file.
+    import tempfile  # slow to import and not needed by every command
+    fd, temp_path = tempfile.mkstemp(
+        dir=os.path.dirname(os.path.abspath(path)),
+        prefix='.' + os.path.basename(path) + '.'
+    )
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            file.write(data)
+        # mkstemp() creates the file only readable by the owner
+        os.chmod(temp_path, _get_mode(path))
+        _replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+def get_dispatch_table(cls, name):
+    # Returns a dictionary stored on `cls` itself, subclasses get their own
+    # table instead of sharing the one of their base class.
+    table = cls.__dict__.get(name)
+    if table is None:
+        table = {}
+        setattr(cls, name, table)
+    return table
+
+
+def resolve_method(cls, prefixes, node_cls):
+    # Looks up a method named `prefix + name` on `cls` for each of the
+    # prefixes and the names of `node_cls` and its bases, so that subclasses
+    # of nodes are handled by the method for their base class unless they
+    # have one of their own. If methods with different prefixes exist, the
+    # one defined on the most derived class wins. Returns a `(prefix, name)`
+    # tuple, with the name of the matching node class, or `(None, None)`.
+    for base in node_cls.__mro__:
+        for owner in cls.__mro__:
+            for prefix in prefixes:
+                if prefix + base.__name__ in owner.__dict__:
+                    return prefix, base.__name__
+    return None, None
+
+
 try:
-    from __pypy__.builders import UnicodeBuilder as StringBuilder
-except ImportError:
-    class StringBuilder(object):
-        def __init__(self, size=None):
-            self.stream = StringIO()
+    _StopAsyncIteration = StopAsyncIteration
+except NameError:
+    # Python < 3.5 does not support asynchronous iteration
+    class _StopAsyncIteration(Exception):
+        pass
+
+
+class AsyncIterator(object):
+    # Adapts an iterator to the asynchronous iterator protocol. Getting each
+    # item first lets the event loop run other tasks, like asyncio.sleep(0)
+    # does.
+    def __init__(self, iterator):
+        self.iterator = iterator
+
+    def __aiter__(self):
+        return self
+
+    def __anext__(self):
+        return _AsyncNext(self.iterator)
 
-        def append(self, string):
-            self.stream.write(string)
 
-        def build(self):
-            return self.stream.getvalue()
+@implements_iterator
+class _AsyncNext(object):
+    # The awaitable returned by AsyncIterator.__anext__(), implemented as an
+    # iterator instead of a coroutine, which would require Python 3.5 syntax.
+    def __init__(self, iterator):
+        self.iterator = iterator
+        self.suspended = False
+
+    def __await__(self):
+        return self
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if not self.suspended:
+            self.suspended = True
+            return None
+        try:
+            item = next(self.iterator)
+        except StopIteration:
+            raise _StopAsyncIteration()
+        raise StopIteration(item)
 
 
 @implements_iterator
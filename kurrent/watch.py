@@ -0,0 +1,231 @@
+# coding: utf-8
+"""
+    kurrent.watch
+    ~~~~~~~~~~~~~
+
+    :copyright: 2013 by Daniel Neuhäuser
+    :license: BSD, see LICENSE.rst for details
+"""
+import os
+import stat
+import time
+import errno
+import struct
+import select
+
+try:
+    import ctypes
+    import ctypes.util
+except ImportError:
+    ctypes = None
+
+
+class Watcher(object):
+    # Watches files and directory trees. wait() returns the paths of the
+    # files that have been created, modified or removed since the last call.
+    def __init__(self, paths):
+        self.paths = [os.path.abspath(path) for path in paths]
+
+    def wait(self, timeout=None):
+        raise NotImplementedError()
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class PollingWatcher(Watcher):
+    # Compares the modification time and size of all files every `interval`
+    # seconds, directories are only listed again if their modification time
+    # changed.
+    interval = 0.1
+
+    def __init__(self, paths, interval=None):
+        super(PollingWatcher, self).__init__(paths)
+        if interval is not None:
+            self.interval = interval
+        self.directories = {}
+        self.files = {}
+        self.poll()
+
+    def _stat_directory(self, path, directories, files):
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            return
+        if self.directories.get(path, (None, None))[0] == mtime:
+            names = self.directories[path][1]
+        else:
+            try:
+                names = os.listdir(path)
+            except OSError:
+                return
+        directories[path] = mtime, names
+        for name in names:
+            self._stat(os.path.join(path, name), directories, files)
+
+    def _stat(self, path, directories, files):
+        try:
+            result = os.stat(path)
+        except OSError:
+            return
+        if stat.S_ISDIR(result.st_mode):
+            self._stat_directory(path, directories, files)
+        else:
+            files[path] = result.st_mtime, result.st_size
+
+    def poll(self):
+        directories = {}
+        files = {}
+        for path in self.paths:
+            self._stat(path, directories, files)
+        changed = set(
+            path for path in set(files) | set(self.files)
+            if files.get(path) != self.files.get(path)
+        )
+        self.directories = directories
+        self.files = files
+        return changed
+
+    def wait(self, timeout=None):
+        start = time.time()
+        while timeout is None or time.time() - start < timeout:
+            time.sleep(self.interval)
+            changed = self.poll()
+            if changed:
+                return changed
+        return set()
+
+
+_IN_MODIFY = 0x00000002
+_IN_ATTRIB = 0x00000004
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_ISDIR = 0x40000000
+_IN_CLOEXEC = 0o2000000
+
+_event = struct.Struct('iIII')
+
+
+def _load_libc():
+    if ctypes is None:
+        raise ImportError('ctypes is not available')
+    libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+    # raises AttributeError, if the functions don't exist
+    libc.inotify_init1
+    libc.inotify_add_watch
+    return libc
+
+
+class InotifyWatcher(Watcher):
+    # Uses inotify(7) through ctypes, available on Linux only. Raises
+    # OSError, if inotify is not available.
+    mask = (
+        _IN_MODIFY | _IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVED_FROM |
+        _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+    )
+    # Editors tend to save files in several steps, events arriving within
+    # this time of each other are reported together.
+    settle_time = 0.005
+
+    def __init__(self, paths):
+        super(InotifyWatcher, self).__init__(paths)
+        try:
+            self.libc = _load_libc()
+        except (ImportError, OSError, AttributeError, TypeError):
+            raise OSError(errno.ENOSYS, 'inotify is not available')
+        self.fd = self.libc.inotify_init1(_IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.directories = {}
+        try:
+            for path in self.paths:
+                if os.path.isdir(path):
+                    self.add_tree(path)
+                else:
+                    self.add_directory(os.path.dirname(path))
+        except BaseException:
+            self.close()
+            raise
+
+    def add_directory(self, path):
+        if path in self.directories.values():
+            return
+        wd = self.libc.inotify_add_watch(
+            self.fd, path.encode('utf-8'), self.mask
+        )
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_add_watch failed', path)
+        self.directories[wd] = path
+
+    def add_tree(self, path):
+        for directory, _, _ in os.walk(path):
+            self.add_directory(directory)
+
+    def is_watched(self, path):
+        for watched in self.paths:
+            if path == watched or path.startswith(watched + os.sep):
+                return True
+        return False
+
+    def read_events(self):
+        data = os.read(self.fd, 65536)
+        changed = set()
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _event.unpack_from(data, offset)
+            offset += _event.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if wd not in self.directories or not name:
+                continue
+            path = os.path.join(self.directories[wd], name.decode('utf-8'))
+            if not self.is_watched(path):
+                continue
+            if mask & _IN_ISDIR:
+                if mask & (_IN_CREATE | _IN_MOVED_TO):
+                    # report the files in directories moved into the tree
+                    self.add_tree(path)
+                    for directory, _, filenames in os.walk(path):
+                        for filename in filenames:
+                            changed.add(os.path.join(directory, filename))
+            else:
+                changed.add(path)
+        return changed
+
+    def wait(self, timeout=None):
+        changed = set()
+        start = time.time()
+        while not changed:
+            if timeout is None:
+                remaining = None
+            else:
+                remaining = timeout - (time.time() - start)
+                if remaining <= 0:
+                    break
+            if not select.select([self.fd], [], [], remaining)[0]:
+                break
+            changed |= self.read_events()
+            while select.select([self.fd], [], [], self.settle_time)[0]:
+                changed |= self.read_events()
+        return changed
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+def get_watcher(paths):
+    try:
+        return InotifyWatcher(paths)
+    except OSError:
+        return PollingWatcher(paths)
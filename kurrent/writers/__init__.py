@@ -6,9 +6,49 @@
     :copyright: 2013 by Daniel Neuhäuser
     :license: BSD, see LICENSE.rst for details
 """
-from .kurrent import KurrentWriter
-from .html import HTML5Writer
-from .man import ManWriter
+import sys
+from types import ModuleType
 
 
-__all__ = ['KurrentWriter', 'HTML5Writer', 'ManWriter']
+# writer names mapped to the modules and classes implementing them
+WRITERS = {
+    'kurrent': ('kurrent.writers.kurrent', 'KurrentWriter'),
+    'html5': ('kurrent.writers.html', 'HTML5Writer'),
+    'man': ('kurrent.writers.man', 'ManWriter')
+}
+
+
+def get_writer(name):
+    # Returns the writer class with the given name, raises KeyError if there
+    # is none.
+    module_name, cls_name = WRITERS[name]
+    return getattr(__import__(module_name, None, None, [cls_name]), cls_name)
+
+
+class _WritersModule(ModuleType):
+    # Writers and their dependencies, like MarkupSafe or Babel, take longer
+    # to import than everything else the command line interface needs.
+    # Accessing them as attributes of this module imports them on demand.
+    def __getattr__(self, name):
+        for module_name, cls_name in WRITERS.values():
+            if cls_name == name:
+                rv = getattr(__import__(module_name, None, None, [name]), name)
+                setattr(self, name, rv)
+                return rv
+        raise AttributeError(
+            '%r module has no attribute %r' % (self.__name__, name)
+        )
+
+    def __dir__(self):
+        return sorted(set(self.__all__) | set(self.__dict__))
+
+
+__all__ = ['KurrentWriter', 'HTML5Writer', 'ManWriter', 'WRITERS', 'get_writer']
+
+
+_module = sys.modules[__name__]
+_lazy_module = sys.modules[__name__] = _WritersModule(__name__)
+_lazy_module.__dict__.update(_module.__dict__)
+# The functions above use the globals of the original module, which Python
+# 2 clears once the module is garbage collected.
+_lazy_module._module = _module
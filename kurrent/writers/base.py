@@ -6,42 +6,105 @@
     :copyright: 2013 by Daniel Neuhäuser
     :license: BSD, see LICENSE.rst for details
 """
+import sys
 from contextlib import contextmanager
 
+from ..utils import AsyncIterator, get_dispatch_table, resolve_method
+
+
+# Markers for entries on the stack of Writer.write_node, that call the leave
+# method for a node or exit the context manager returned by a write method.
+_LEAVE = object()
+_EXIT = object()
+
+
+def make_write_method(enter=None, leave=None, handler=None):
+    # Returns a `write_X` method, which returns a context manager calling the
+    # given `enter_X` and `leave_X` methods around the children of a node.
+    # Writers implementing nodes with such a pair provide it as well, so
+    # that subclasses can extend them through super(). The writer itself uses
+    # the pair or, if given, the `(enter, leave, write)` handler instead.
+    @contextmanager
+    def write(self, node):
+        if enter is not None:
+            enter(self, node)
+        yield True
+        if leave is not None:
+            leave(self, node)
+    write.handler = handler
+    return write
+
 
 class Writer(object):
     transformations = []
+    # number of characters collected before they are written to the stream
+    buffer_size = 2 ** 16
 
     @classmethod
     def get_file_extension(self, document):
         raise NotImplementedError()
 
-    def __init__(self, stream):
+    def __init__(self, stream=None, buffer_size=None):
+        # Without a stream the output is kept in the buffer, use getvalue()
+        # to get it.
         self.stream = stream
+        if stream is None:
+            self.buffer_size = float('inf')
+        elif buffer_size is not None:
+            self.buffer_size = buffer_size
 
         self.indent_stack = []
+        self.indentation = u''
         self.newlines = 0
 
+        self.buffer = []
+        self.buffered = 0
+        self.depth = 0
+
     def __enter__(self):
         return self
 
     def __exit__(self, exc_type, exc_value, tb):
-        if hasattr(self.stream, 'close'):
+        self.flush()
+        if self.stream is not None and hasattr(self.stream, 'close'):
             self.stream.close()
 
     @contextmanager
     def indent(self, string):
+        self.push_indent(string)
+        try:
+            yield
+        finally:
+            assert self.pop_indent() == string
+
+    def push_indent(self, string):
         self.indent_stack.append(string)
-        yield
-        assert self.indent_stack.pop() == string
+        self.indentation += string
+
+    def pop_indent(self):
+        rv = self.indent_stack.pop()
+        self.indentation = u''.join(self.indent_stack)
+        return rv
 
     def write(self, string):
         if self.newlines:
-            for _ in range(self.newlines):
-                self.stream.write(u'\n')
-            self.stream.write(u''.join(self.indent_stack))
+            self.buffer.append(u'\n' * self.newlines + self.indentation)
             self.newlines = 0
-        self.stream.write(string)
+        self.buffer.append(string)
+        self.buffered += len(string)
+        if self.buffered >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self.buffer and self.stream is not None:
+            self.stream.write(u''.join(self.buffer))
+            del self.buffer[:]
+            self.buffered = 0
+
+    def getvalue(self):
+        rv = u''.join(self.buffer)
+        self.buffer[:] = [rv]
+        return rv
 
     def newline(self):
         self.newlines += 1
@@ -54,26 +117,159 @@ class Writer(object):
         for string in strings:
             self.write_line(string)
 
+    @classmethod
+    def get_handler(cls, node):
+        # Returns a `(enter, leave, write, has_children)` tuple for the class
+        # of the given node.
+        #
+        # Nodes are written either by an `enter_X` and/or `leave_X` method,
+        # which are called before and after the children of a node are
+        # written, or by a `write_X` method. A `write_X` method for a node
+        # with children may return a context manager, whose value determines
+        # whether the children are written within it. A `write_X` method
+        # created with make_write_method() is replaced by its handler.
+        table = get_dispatch_table(cls, '_handlers')
+        try:
+            return table[node.__class__]
+        except KeyError:
+            prefix, name = resolve_method(
+                cls, ['enter_', 'leave_', 'write_'], node.__class__
+            )
+            enter = leave = write = None
+            if prefix == 'write_':
+                write = getattr(cls, prefix + name)
+                if getattr(write, 'handler', None) is not None:
+                    enter, leave, write = write.handler
+            elif prefix is not None:
+                enter = getattr(cls, 'enter_' + name, None)
+                leave = getattr(cls, 'leave_' + name, None)
+            handler = table[node.__class__] = (
+                enter, leave, write, hasattr(node, 'children')
+            )
+            return handler
+
     def write_node(self, node):
+        self.depth += 1
+        try:
+            for _ in self.walk(node):
+                pass
+        finally:
+            self.depth -= 1
+        if not self.depth:
+            self.flush()
+
+    def iter_node(self, node, chunk_size=None):
+        # Yields the output for the node in chunks, instead of writing it to
+        # the stream. Chunks end between nodes, so they are at least
+        # `chunk_size` characters long, the last one aside, but usually not
+        # much longer. Without a `chunk_size`, the buffer size of the class
+        # is used.
+        if chunk_size is None:
+            chunk_size = self.__class__.buffer_size
+        stream, buffer_size = self.stream, self.buffer_size
+        self.stream, self.buffer_size = None, float('inf')
         try:
-            method = getattr(self, 'write_' + node.__class__.__name__)
-        except AttributeError as error:
-            error = error
-            method = None
-        if hasattr(node, 'children'):
-            if method is None:
-                self.write_children(node)
-            else:
-                result = method(node)
-                if hasattr(result, '__enter__'):
-                    with result as write_children:
-                        if write_children:
-                            self.write_children(node)
-        else:
-            if method is None:
-                raise error
-            method(node)
+            for _ in self.walk(node, chunk_size):
+                yield self._pop_buffer()
+        finally:
+            self.stream, self.buffer_size = stream, buffer_size
+        if self.buffer:
+            yield self._pop_buffer()
+
+    def aiter_node(self, node, chunk_size=None):
+        # Like iter_node(), as an asynchronous iterator, e.g. for streaming
+        # responses in asyncio based servers.
+        return AsyncIterator(self.iter_node(node, chunk_size))
+
+    def _pop_buffer(self):
+        rv = u''.join(self.buffer)
+        del self.buffer[:]
+        self.buffered = 0
+        return rv
+
+    @classmethod
+    def walks_children(cls):
+        # The walk writes children itself, unless write_node() or
+        # write_children() are overridden, in which case children are written
+        # by calling write_children().
+        return (
+            _get_function(cls.write_node) is
+            _get_function(Writer.write_node) and
+            _get_function(cls.write_children) is
+            _get_function(Writer.write_children)
+        )
+
+    def walk(self, node, chunk_size=float('inf')):
+        # Writes the node, yielding whenever the buffer holds at least
+        # `chunk_size` characters.
+        walks_children = self.walks_children()
+        stack = [node]
+        push = stack.append
+        pop = stack.pop
+        while stack:
+            try:
+                while stack:
+                    if self.buffered >= chunk_size:
+                        yield
+                    node = pop()
+                    if node is _LEAVE:
+                        leave = pop()
+                        leave(self, pop())
+                        continue
+                    elif node is _EXIT:
+                        pop().__exit__(None, None, None)
+                        continue
+                    enter, leave, write, has_children = self.get_handler(node)
+                    if write is not None:
+                        if not has_children:
+                            write(self, node)
+                            continue
+                        result = write(self, node)
+                        if not hasattr(result, '__enter__'):
+                            continue
+                        write_children = result.__enter__()
+                        push(result)
+                        push(_EXIT)
+                        if not write_children:
+                            continue
+                    else:
+                        if enter is not None:
+                            enter(self, node)
+                        elif leave is None and not has_children:
+                            raise AttributeError(
+                                '%r object has no attribute %r' % (
+                                    self.__class__.__name__,
+                                    'write_' + node.__class__.__name__
+                                )
+                            )
+                        if leave is not None:
+                            push(node)
+                            push(leave)
+                            push(_LEAVE)
+                        if not has_children:
+                            continue
+                    if walks_children:
+                        stack.extend(reversed(node.children))
+                    else:
+                        self.write_children(node)
+            except BaseException:
+                if not self._unwind(stack, sys.exc_info()):
+                    raise
+
+    def _unwind(self, stack, exc_info):
+        # Exits the context managers returned by write methods on the stack
+        # with the exception, like a with statement would, until one of them
+        # suppresses it. Returns whether one did, the walk continues with the
+        # siblings of its node in that case.
+        while stack:
+            if stack.pop() is _EXIT and stack.pop().__exit__(*exc_info):
+                return True
+        return False
 
     def write_children(self, node):
         for child in node.children:
             self.write_node(child)
+
+
+def _get_function(method):
+    return getattr(method, '__func__', method)
@@ -6,31 +6,53 @@
     :copyright: 2013 by Daniel Neuhäuser
     :license: BSD, see LICENSE.rst for details
 """
-from contextlib import contextmanager
-
 from markupsafe import escape
 
+from .. import ast
 from ..transformations import LINK_TRANSFORMATIONS
-from .base import Writer
+from ..utils import get_dispatch_table
+from .._compat import text_type
+from .base import Writer, make_write_method
 
 
 def make_block_writer(tag, indent=True, follow_with_newline=False):
+    start = u'<%s>' % tag
+    end = u'</%s>' % tag
     if indent:
-        @contextmanager
-        def write(self, node):
-            self.write_line(u'<%s>' % tag)
-            with self.indent(u'  '):
-                yield True
+        def enter(self, node):
+            self.write_line(start)
+            self.push_indent(u'  ')
+
+        def leave(self, node):
+            self.pop_indent()
             if follow_with_newline:
                 self.newline()
-            self.write_line(u'</%s>' % tag)
+            self.write_line(end)
     else:
-        @contextmanager
-        def write(self, node):
-            self.write(u'<%s>' % tag)
-            yield True
-            self.write(u'</%s>' % tag)
-    return write
+        def enter(self, node):
+            self.write(start)
+
+        def leave(self, node):
+            self.write(end)
+    return enter, leave
+
+
+class _EndTag(text_type):
+    pass
+
+
+_enter_paragraph, _leave_paragraph = make_block_writer(
+    u'p', follow_with_newline=True
+)
+
+# inline nodes rendered by HTML5Writer.render_inline() mapped to the tags
+# they are enclosed in
+_inline_tags = {
+    ast.Text: None,
+    ast.Emphasis: (u'<em>', _EndTag(u'</em>')),
+    ast.Strong: (u'<strong>', _EndTag(u'</strong>')),
+    ast.Link: None
+}
 
 
 class HTML5Writer(Writer):
@@ -43,36 +65,121 @@ class HTML5Writer(Writer):
     def write_Text(self, node):
         self.write(escape(node.text))
 
-    write_Paragraph = make_block_writer(u'p', follow_with_newline=True)
-    write_ListItem = make_block_writer(u'li')
-    write_OrderedList = make_block_writer(u'ol')
-    write_UnorderedList = make_block_writer(u'ul')
-    write_BlockQuote = make_block_writer(u'blockquote')
-    write_DefinitionList = make_block_writer(u'dl')
-    write_Emphasis = make_block_writer(u'em', indent=False)
-    write_Strong = make_block_writer(u'strong', indent=False)
+    @classmethod
+    def get_inline_tags(cls, node):
+        # Returns the entry of _inline_tags for the class of the node, if it
+        # is written by the methods of this class and not those of a subclass
+        # overriding them, or False.
+        table = get_dispatch_table(cls, '_inline_tags')
+        try:
+            return table[node.__class__]
+        except KeyError:
+            if (
+                node.__class__ in _inline_tags and
+                cls.get_handler(node) == HTML5Writer.get_handler(node)
+            ):
+                rv = _inline_tags[node.__class__]
+            else:
+                rv = False
+            table[node.__class__] = rv
+            return rv
+
+    def render_inline(self, nodes):
+        # Paragraphs mostly contain text, emphasis, strong emphasis and links.
+        # Rendering those into a single string, escaping all text at once,
+        # avoids most of the overhead per node. Returns None, if the nodes
+        # contain anything else or write_node() is overridden.
+        if not self.walks_children():
+            return None
+        table = get_dispatch_table(self.__class__, '_inline_tags')
+        parts = []
+        texts = []
+        stack = list(reversed(nodes))
+        while stack:
+            node = stack.pop()
+            if node.__class__ is _EndTag:
+                parts.append(node)
+                continue
+            tags = table.get(node.__class__, False)
+            if tags is False:
+                tags = self.get_inline_tags(node)
+                if tags is False:
+                    return None
+            if tags is not None:
+                parts.append(tags[0])
+                stack.append(tags[1])
+                stack.extend(reversed(node.children))
+            elif node.__class__ is ast.Link:
+                parts.append(u'<a href="%s">%s</a>' % (node.target, node.text))
+            else:
+                texts.append(len(parts))
+                parts.append(node.text)
+        if texts:
+            escaped = escape(u'\0'.join([parts[i] for i in texts])).split(
+                u'\0'
+            )
+            if len(escaped) != len(texts):
+                # the text contains the separator itself
+                escaped = [escape(parts[i]) for i in texts]
+            for i, text in zip(texts, escaped):
+                parts[i] = text
+        return u''.join(parts)
+
+    def _write_paragraph(self, node):
+        content = self.render_inline(node.children)
+        _enter_paragraph(self, node)
+        if content is None:
+            self.write_children(node)
+        elif node.children:
+            self.write(content)
+        _leave_paragraph(self, node)
+
+    write_Paragraph = make_write_method(
+        _enter_paragraph, _leave_paragraph,
+        handler=(None, None, _write_paragraph)
+    )
+
+    enter_ListItem, leave_ListItem = make_block_writer(u'li')
+    enter_OrderedList, leave_OrderedList = make_block_writer(u'ol')
+    enter_UnorderedList, leave_UnorderedList = make_block_writer(u'ul')
+    enter_BlockQuote, leave_BlockQuote = make_block_writer(u'blockquote')
+    enter_DefinitionList, leave_DefinitionList = make_block_writer(u'dl')
+    enter_Emphasis, leave_Emphasis = make_block_writer(u'em', indent=False)
+    enter_Strong, leave_Strong = make_block_writer(u'strong', indent=False)
+
+    write_ListItem = make_write_method(enter_ListItem, leave_ListItem)
+    write_OrderedList = make_write_method(enter_OrderedList, leave_OrderedList)
+    write_UnorderedList = make_write_method(
+        enter_UnorderedList, leave_UnorderedList
+    )
+    write_BlockQuote = make_write_method(enter_BlockQuote, leave_BlockQuote)
+    write_DefinitionList = make_write_method(
+        enter_DefinitionList, leave_DefinitionList
+    )
+    write_Emphasis = make_write_method(enter_Emphasis, leave_Emphasis)
+    write_Strong = make_write_method(enter_Strong, leave_Strong)
 
     def write_Header(self, node):
-        self.write(u'<h%d>' % node.level)
-        self.write(escape(node.text))
-        self.write(u'</h%d>' % node.level)
+        self.write(u'<h%d>%s</h%d>' % (
+            node.level, escape(node.text), node.level
+        ))
         self.newline()
 
-    @contextmanager
-    def write_Document(self, node):
+    def enter_Document(self, node):
         self.write_line(u'<!doctype html>')
         self.write_line(u'<title>%s</title>' % (
             escape(node.metadata.get('title', u''))
         ))
-        yield True
+
+    write_Document = make_write_method(enter_Document)
 
     def write_RawBlock(self, node):
         self.write_line(u'<pre>')
-        indent_stack = self.indent_stack
-        self.indent_stack = []
+        indentation = self.indentation
+        self.indentation = u''
         for line in node.body:
             self.write_line(line)
-        self.indent_stack = indent_stack
+        self.indentation = indentation
         self.write_line(u'</pre>')
 
     def write_Definition(self, node):
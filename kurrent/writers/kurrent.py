@@ -9,19 +9,31 @@
 from itertools import count
 from contextlib import contextmanager
 
-from ..utils import StringBuilder
-from .base import Writer
+from .base import Writer, make_write_method
+
+
+_escapes = [(u'*', u'\\*'), (u'[', u'\\['), (u']', u'\\]')]
 
 
 def escape(string):
-    builder = StringBuilder(size=len(string))
-    for char in string:
-        builder.append({
-            u'*': u'\*',
-            u'[': u'\[',
-            u']': u'\]'
-        }.get(char, char))
-    return builder.build()
+    # Most strings contain nothing to escape, checking for each character
+    # first and replacing it with str.replace() is faster than translating
+    # or substituting.
+    for char, escaped in _escapes:
+        if char in string:
+            string = string.replace(char, escaped)
+    return string
+
+
+def _write_source(self, node):
+    self.write(u'\n'.join(node.source))
+    self.newline()
+    # raw blocks end with the empty lines following them
+    if node.source[-1]:
+        self.write_block_newline()
+
+
+_source_handler = (None, None, _write_source, False)
 
 
 class KurrentWriter(Writer):
@@ -29,8 +41,16 @@ class KurrentWriter(Writer):
     def get_file_extension(self, document):
         return '.kr'
 
-    def __init__(self, stream):
-        super(KurrentWriter, self).__init__(stream)
+    @classmethod
+    def get_handler(cls, node):
+        # Blocks whose source has been kept by the parser and which have not
+        # been modified since, are copied from the source as they are.
+        if node.source is not None:
+            return _source_handler
+        return super(KurrentWriter, cls).get_handler(node)
+
+    def __init__(self, stream=None, buffer_size=None):
+        super(KurrentWriter, self).__init__(stream, buffer_size=buffer_size)
 
         self.post_block_newline = True
 
@@ -45,12 +65,12 @@ class KurrentWriter(Writer):
         yield
         self.post_block_newline = old_post_block_newline
 
-    @contextmanager
-    def write_Paragraph(self, node):
-        yield True
+    def leave_Paragraph(self, node):
         self.newline()
         self.write_block_newline()
 
+    write_Paragraph = make_write_method(leave=leave_Paragraph)
+
     def write_Header(self, node):
         self.write_line(u'%s %s' % (u'#' * node.level, node.text))
         self.write_block_newline()
@@ -85,18 +105,21 @@ class KurrentWriter(Writer):
                     self.write_node(child)
         self.write_block_newline()
 
-    @contextmanager
-    def write_Emphasis(self, node):
+    def enter_Emphasis(self, node):
         self.write(u'*')
-        yield True
+
+    def leave_Emphasis(self, node):
         self.write(u'*')
 
-    @contextmanager
-    def write_Strong(self, node):
+    def enter_Strong(self, node):
         self.write(u'**')
-        yield True
+
+    def leave_Strong(self, node):
         self.write(u'**')
 
+    write_Emphasis = make_write_method(enter_Emphasis, leave_Emphasis)
+    write_Strong = make_write_method(enter_Strong, leave_Strong)
+
     def write_InlineExtension(self, node):
         self.write(u'[')
         if node.text is not None:
@@ -126,14 +149,16 @@ class KurrentWriter(Writer):
         with self.indent(u' ' * 4):
             self.write_lines(node.body)
 
-    @contextmanager
-    def write_BlockQuote(self, node):
+    def enter_BlockQuote(self, node):
         self.write(u'> ')
-        with self.indent(u'  '):
-            yield True
+        self.push_indent(u'  ')
+
+    def leave_BlockQuote(self, node):
+        self.pop_indent()
         # block newline is emitted by last quoted block
 
-    @contextmanager
+    write_BlockQuote = make_write_method(enter_BlockQuote, leave_BlockQuote)
+
     def write_RawBlock(self, node):
         for line in node.body:
             self.write_line(u' ' * 4 + line)
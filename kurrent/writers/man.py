@@ -6,12 +6,14 @@
     :copyright: 2013 by Daniel Neuhäuser
     :license: BSD, see LICENSE.rst for details
 """
-from datetime import datetime
-from contextlib import contextmanager
+import os
+from datetime import date, datetime
+from itertools import chain
 
 import babel.dates
 
-from .base import Writer
+from ..utils import get_dispatch_table, resolve_method
+from .base import Writer, make_write_method
 
 
 class ManASTNode(object):
@@ -88,33 +90,140 @@ class Indentation(ParentNode):
         self.indentation = indentation
 
 
+def get_build_date(metadata):
+    # Returns the date a document is built on, which is the `date` in its
+    # metadata, a date or a string in YYYY-MM-DD format, or the one given by
+    # $SOURCE_DATE_EPOCH, so that builds can be reproduced, or today.
+    rv = metadata.get('date')
+    if rv is None:
+        epoch = os.environ.get('SOURCE_DATE_EPOCH')
+        if epoch is None:
+            return date.today()
+        return datetime.utcfromtimestamp(int(epoch)).date()
+    if isinstance(rv, datetime):
+        return rv.date()
+    if isinstance(rv, date):
+        return rv
+    return datetime.strptime(rv, '%Y-%m-%d').date()
+
+
+_formatted_dates = {}
+
+
+def format_date(build_date, locale):
+    # Loading the locale data is the expensive part of formatting a date,
+    # the few different dates a build uses are only formatted once.
+    try:
+        return _formatted_dates[build_date, locale]
+    except KeyError:
+        rv = _formatted_dates[build_date, locale] = babel.dates.format_date(
+            build_date, format='full', locale=locale
+        )
+        return rv
+
+
+class _PendingHangingIndentation(object):
+    # A hanging indentation whose content has not been translated yet, see
+    # Translator.complete().
+    def __init__(self, id, designator, indentation, children):
+        self.id = id
+        self.designator = designator
+        self.indentation = indentation
+        self.children = children
+
+
 class Translator(object):
+    # Translates a Kurrent AST into a man AST in a single pass from the top
+    # down. Lists and quotes are translated into pending hanging indentations
+    # first, their parents complete them after applying the rules that fold
+    # them into each other.
+    #
+    # The man AST is not streamed into the writer: ManWriter and its
+    # subclasses dispatch on the man node classes, and a hanging indentation
+    # can only be written once its first child has been translated.
+    @classmethod
+    def get_translator(cls, node_cls):
+        table = get_dispatch_table(cls, '_translators')
+        try:
+            return table[node_cls]
+        except KeyError:
+            prefix, name = resolve_method(cls, ['translate_'], node_cls)
+            if prefix is None:
+                raise AttributeError('%r object has no attribute %r' % (
+                    cls.__name__, 'translate_' + node_cls.__name__
+                ))
+            method = table[node_cls] = getattr(cls, prefix + name)
+            return method
+
     def translate(self, node):
-        return getattr(self, 'translate_%s' % node.__class__.__name__)(node)
+        return self.get_translator(node.__class__)(self, node)
 
-    def translate_nodes(self, nodes):
+    def translate_pending(self, nodes):
+        # Translates the nodes, leaving hanging indentations pending.
         rv = []
         for child in nodes:
             translated = self.translate(child)
-            if hasattr(translated, '__iter__'):
+            if isinstance(translated, list):
                 rv.extend(translated)
             else:
                 rv.append(translated)
         return rv
 
+    def complete_nodes(self, nodes, nested=True):
+        # Hanging indentations directly within the document or an indentation
+        # are not nested.
+        return [
+            self.complete(node, nested)
+            if isinstance(node, _PendingHangingIndentation) else node
+            for node in nodes
+        ]
+
+    def translate_nodes(self, nodes, nested=True):
+        return self.complete_nodes(self.translate_pending(nodes), nested)
+
     def translate_children(self, node):
         return self.translate_nodes(node.children)
 
+    def complete(self, pending, nested):
+        rv = HangingIndentation(
+            pending.id,
+            designator=pending.designator,
+            indentation=pending.indentation,
+            nested=nested
+        )
+        children = self.translate_pending(pending.children)
+        if (
+            children and
+            isinstance(children[0], _PendingHangingIndentation) and
+            children[0].id != pending.id
+        ):
+            # A list or quote starting with a different kind of list or
+            # quote, e.g. a list item starting with a quote, becomes a
+            # single hanging indentation with both designators.
+            first = children.pop(0)
+            rv.designator += first.designator
+            rv.indentation += first.indentation
+            rv.children = self.translate_nodes(first.children) + [
+                Indentation(
+                    pending.indentation,
+                    children=self.complete_nodes(children, nested=False)
+                )
+            ]
+        else:
+            rv.children = self.complete_nodes(children)
+        if rv.children and isinstance(rv.children[0], Paragraph):
+            rv.children[0].transparent = True
+        return rv
+
     def translate_Document(self, node):
         return Document(
             title=node.metadata.get('title', u''),
             section=node.metadata.get('section', 1),
-            date=babel.dates.format_date(
-                datetime.now(),
-                format='full',
-                locale=node.metadata.get('locale', babel.default_locale())
+            date=format_date(
+                get_build_date(node.metadata),
+                node.metadata.get('locale', babel.default_locale())
             ),
-            children=self.translate_children(node)
+            children=self.translate_nodes(node.children, nested=False)
         )
 
     def translate_Header(self, node):
@@ -137,82 +246,42 @@ class Translator(object):
         return Paragraph(children=self.translate_children(node))
 
     def translate_BlockQuote(self, node):
-        return HangingIndentation(
-            '>',
-            designator=u'> ',
-            indentation=2,
-            children=self.translate_children(node)
-        )
+        return _PendingHangingIndentation('>', u'> ', 2, node.children)
 
     def translate_OrderedList(self, node):
         indentation = len(u'%d. ' % len(node.children))
-        for index, item in enumerate(node.children, start=1):
-            yield HangingIndentation(
-                'ol',
-                designator=u'%d. ' % index,
-                indentation=indentation,
-                children=self.translate_children(item)
+        return [
+            _PendingHangingIndentation(
+                'ol', u'%d. ' % index, indentation, item.children
             )
+            for index, item in enumerate(node.children, start=1)
+        ]
 
     def translate_UnorderedList(self, node):
-        for item in node.children:
-            yield HangingIndentation(
-                'ul',
-                designator=u'\(bu ',
-                indentation=2,
-                children=self.translate_children(item)
-            )
+        return [
+            _PendingHangingIndentation('ul', u'\\(bu ', 2, item.children)
+            for item in node.children
+        ]
 
     def translate_DefinitionList(self, node):
-        return self.translate_children(node)
+        return self.translate_pending(node.children)
 
     def translate_Definition(self, node):
-        yield Paragraph(children=self.translate_nodes(node.term))
         description = Indentation(
             4,
-            children=self.translate_nodes(node.description)
+            children=self.translate_nodes(node.description, nested=False)
         )
         if isinstance(description.children[0], Paragraph):
             description.children[0].transparent = True
-        yield description
-
-
-translate = Translator().translate
-
-
-def fold(node):
-    if isinstance(node, (Document, Indentation)):
-        for child in node.children:
-            if isinstance(child, HangingIndentation):
-                child.nested = False
-    elif isinstance(node, HangingIndentation):
-        if node.children:
-            if isinstance(node.children[0], HangingIndentation):
-                if node.id != node.children[0].id:
-                    child_indent = node.children.pop(0)
-                    node.designator += child_indent.designator
-                    node.children = (
-                        child_indent.children +
-                        [Indentation(
-                            node.indentation,
-                            node.children
-                        )]
-                    )
-                    node.indentation += child_indent.indentation
-            if isinstance(node.children[0], Paragraph):
-                node.children[0].transparent = True
-    if hasattr(node, 'children'):
-        for child in node.children:
-            fold(child)
-    return node
+        return [
+            Paragraph(children=self.translate_nodes(node.term)),
+            description
+        ]
 
 
 def compile(node):
-    nodes = translate(node)
-    if not hasattr(nodes, '__iter__'):
-        nodes = [nodes]
-    for node in nodes:
-        yield fold(node)
+    # Returns a list of man nodes, which the given node translates to.
+    return Translator().translate_nodes([node])
 
 
 class ManWriter(Writer):
@@ -220,76 +289,74 @@ class ManWriter(Writer):
     def get_file_extension(self, document):
         return '.%d' % document.metadata.get('section', 1)
 
-    def write_node(self, kurrent_node):
-        if isinstance(kurrent_node, ManASTNode):
-            man_nodes = kurrent_node
-        elif hasattr(kurrent_node, '__iter__'):
-            man_nodes = kurrent_node
-        else:
-            man_nodes = compile(kurrent_node)
-        if not hasattr(man_nodes, '__iter__'):
-            man_nodes = [man_nodes]
-        for man_node in man_nodes:
-            method = getattr(self, 'write_' + man_node.__class__.__name__)
-            if hasattr(man_node, 'children'):
-                result = method(man_node)
-                if hasattr(result, '__enter__'):
-                    with result as write_children:
-                        if write_children:
-                            self.write_children(man_node)
-            else:
-                method(man_node)
-
-    def write_children(self, node):
-        for child in node.children:
-            self.write_node(child)
+    def walk(self, node, chunk_size=float('inf')):
+        # Kurrent nodes are compiled into man nodes, which are written
+        # instead.
+        if isinstance(node, ManASTNode):
+            return super(ManWriter, self).walk(node, chunk_size)
+        if not hasattr(node, '__iter__'):
+            node = compile(node)
+        return chain.from_iterable(
+            super(ManWriter, self).walk(man_node, chunk_size)
+            for man_node in node
+        )
 
     def write_Text(self, node):
         self.write(node.text)
 
-    @contextmanager
-    def write_Emphasis(self, node):
+    def enter_Emphasis(self, node):
         self.write(u'\\fI')
-        yield True
+
+    def leave_Emphasis(self, node):
         self.write(u'\\fP')
 
-    @contextmanager
-    def write_Strong(self, node):
+    def enter_Strong(self, node):
         self.write(u'\\fB')
-        yield True
+
+    def leave_Strong(self, node):
         self.write(u'\\fP')
 
-    @contextmanager
-    def write_Paragraph(self, node):
+    write_Emphasis = make_write_method(enter_Emphasis, leave_Emphasis)
+    write_Strong = make_write_method(enter_Strong, leave_Strong)
+
+    def enter_Paragraph(self, node):
         if not node.transparent:
             self.write_line(u'.P')
-        yield True
+
+    def leave_Paragraph(self, node):
         self.newline()
 
+    write_Paragraph = make_write_method(enter_Paragraph, leave_Paragraph)
+
     def write_Section(self, node):
         self.write_line(u'.SH "%s"' % node.title)
 
     def write_SubSection(self, node):
         self.write_line(u'.SS "%s"' % node.title)
 
-    @contextmanager
-    def write_Document(self, node):
+    def enter_Document(self, node):
         self.write_line(u'.TH "%s" "%s" "%s" "%s"' % (
             node.title, node.section, node.date, node.author
         ))
-        yield True
 
-    @contextmanager
-    def write_HangingIndentation(self, node):
+    write_Document = make_write_method(enter_Document)
+
+    def enter_HangingIndentation(self, node):
         if node.nested:
             self.write_line(u'.RS')
         self.write_line(u'.IP "%s" %d' % (node.designator, node.indentation))
-        yield True
+
+    def leave_HangingIndentation(self, node):
         if node.nested:
             self.write_line(u'.RE')
 
-    @contextmanager
-    def write_Indentation(self, node):
+    def enter_Indentation(self, node):
         self.write_line(u'.RS %d' % node.indentation)
-        yield True
+
+    def leave_Indentation(self, node):
         self.write_line(u'.RE')
+
+    write_HangingIndentation = make_write_method(
+        enter_HangingIndentation, leave_HangingIndentation
+    )
+    write_Indentation = make_write_method(enter_Indentation, leave_Indentation)
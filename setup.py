@@ -33,7 +33,8 @@ setup(
     include_package_data=True,
     entry_points={
         'console_scripts': [
-            'kurrent = kurrent.cli:main'
+            'kurrent = kurrent.cli:main',
+            'kurrent-client = kurrent.client:main'
         ]
     },
     install_requires=[
@@ -6,12 +6,14 @@
     :copyright: 2013 by Daniel Neuhäuser
     :license: BSD, see LICENSE.rst for details
 """
+import datetime
+
 import pytest
 
 from kurrent.ast import (
     Location, Document, Paragraph, Emphasis, Strong, Text, Header,
     UnorderedList, OrderedList, ListItem, InlineExtension, Extension,
-    BlockQuote, RawBlock, DefinitionList, Definition, Link
+    BlockQuote, RawBlock, DefinitionList, Definition, Link, observe_mutations
 )
 
 
@@ -112,6 +114,17 @@ class ASTNodeTest(object):
         node.remove_from_parent()
         assert not document.children
 
+    def test_fingerprint(self, node_cls):
+        assert node_cls().fingerprint == node_cls().fingerprint
+
+    def test_copy(self, node):
+        parent = Document('test')
+        copy = node.copy(parent=parent)
+        assert copy is not node
+        assert copy.__class__ is node.__class__
+        assert copy.parent is parent
+        assert copy.fingerprint == node.fingerprint
+
 
 class ParentNodeTest(ASTNodeTest):
     def test_init(self, node_cls):
@@ -193,6 +206,66 @@ class ParentNodeTest(ASTNodeTest):
         node.remove(child)
         assert not node.children
 
+    def test_copy_children(self, node):
+        child = Paragraph(children=[Text(u'foo')])
+        node.add_child(child)
+        copy = node.copy()
+        assert 'children' not in vars(copy)
+        assert len(copy.children) == 1
+        assert copy.children[0] is not child
+        assert copy.children[0].parent is copy
+        assert 'children' not in vars(copy.children[0])
+        assert copy.children[0].children[0].text == u'foo'
+
+    def test_copy_is_independent(self, node):
+        child = Text(u'foo')
+        node.add_child(child)
+        copy = node.copy()
+        copy.children[0].replace_in_parent(Text(u'bar'))
+        copy.add_child(Text(u'baz'))
+        assert node.children == [child]
+        assert child.parent is node
+        assert [c.text for c in copy.children] == [u'bar', u'baz']
+
+    def test_fingerprint_invalidation(self, node):
+        empty = node.fingerprint
+        child = Text(u'foo')
+        node.add_child(child)
+        with_foo = node.fingerprint
+        assert with_foo != empty
+
+        node.replace(child, Text(u'bar'))
+        assert node.fingerprint not in [empty, with_foo]
+
+        node.remove(node.children[0])
+        assert node.fingerprint == empty
+
+    def test_fingerprint_invalidates_ancestors(self, node):
+        child = Paragraph(children=[Text(u'foo')])
+        node.add_child(child)
+        fingerprint = node.fingerprint
+        child.add_child(Text(u'bar'))
+        assert node.fingerprint != fingerprint
+
+    def test_modification_drops_source(self, node):
+        child = Paragraph(children=[Text(u'foo')])
+        node.add_child(child)
+        node.source = [u'foo']
+        child.source = [u'foo']
+        child.children[0].invalidate_fingerprint()
+        assert node.source is None
+        assert child.source is None
+
+    def test_observe_mutations(self, node):
+        mutated = []
+        child = Text(u'foo')
+        with observe_mutations(mutated.append):
+            node.add_child(child)
+            node.replace(child, Text(u'bar'))
+            node.remove(node.children[0])
+        node.add_child(child)
+        assert mutated == [node, node, node]
+
     def test_repr(self, node):
         assert (
             repr(node) ==
@@ -251,6 +324,42 @@ class TestDocument(ParentNodeTest):
         assert document.start == Location(1, 1)
         assert document.end == Location(1, 3)
 
+    def test_traverse_with_removal(self):
+        a = Paragraph(children=[Text(u'a')])
+        b = Text(u'b')
+        document = Document('foo', children=[a, b])
+        visited = []
+        for node in document.traverse():
+            visited.append(node)
+            if node is a:
+                a.remove_from_parent()
+        assert visited == [document, a, b]
+        assert a.parent is None
+
+    def test_copy_metadata(self):
+        document = Document('foo', metadata={'title': u'bar'})
+        copy = document.copy()
+        copy.metadata['title'] = u'baz'
+        assert document.metadata == {'title': u'bar'}
+        assert copy.filename == 'foo'
+
+    def test_fingerprint_metadata(self):
+        values = [
+            None, 1, 1.0, 1.5, u'1', datetime.date(2013, 1, 2),
+            datetime.datetime(2013, 1, 2), datetime.datetime(2013, 1, 2, 3),
+            datetime.time(3)
+        ]
+        fingerprints = [
+            Document('foo', metadata={'value': value}).fingerprint
+            for value in values
+        ]
+        assert len(set(fingerprints)) == len(values)
+        assert fingerprints[5] == Document(
+            'foo', metadata={'value': datetime.date(2013, 1, 2)}
+        ).fingerprint
+        with pytest.raises(TypeError):
+            Document('foo', metadata={'value': object()}).fingerprint
+
     def test_repr(self):
         assert (
             repr(Document('foo')) ==
@@ -281,6 +390,15 @@ class TestText(ASTNodeTest):
     def node_cls(self):
         return lambda *args, **kwargs: Text(u'foo', *args, **kwargs)
 
+    def test_fingerprint(self, node_cls):
+        super(TestText, self).test_fingerprint(node_cls)
+        assert (
+            Text(u'foo', start=Location(1, 1)).fingerprint ==
+            Text(u'foo', start=Location(2, 1)).fingerprint
+        )
+        assert Text(u'foo').fingerprint != Text(u'bar').fingerprint
+        assert Text(u'foo').fingerprint != Link(u'foo', u'foo').fingerprint
+
     def test_repr(self):
         assert (
             repr(Text('foo')) ==
@@ -463,6 +581,15 @@ class TestDefinition(ASTNodeTest):
         with pytest.raises(StopIteration):
             next(traversal)
 
+    def test_copy_children(self):
+        term, description = Text(u'foo'), Text(u'bar')
+        node = Definition([term], [description])
+        copy = node.copy()
+        assert copy.term[0] is not term
+        assert copy.term[0].parent is copy
+        assert copy.description[0].text == u'bar'
+        assert node.term == [term]
+
     def test_repr(self):
         assert repr(Definition([], [])) == 'Definition([], [], parent=None)'
 
@@ -13,8 +13,15 @@ import textwrap
 
 import pytest
 
-from kurrent.builders import SingleDocumentBuilder
+from kurrent.builders import (
+    SingleDocumentBuilder, ProjectBuilder, WriteStats, build_sources
+)
+from kurrent.cache import DocumentCache, MemoryDocumentCache
+from kurrent.links import LinkRegistry
+from kurrent.parser import Parser
+from kurrent.transformations import Profile, TitleTransformation
 from kurrent.writers import KurrentWriter, HTML5Writer, ManWriter
+from kurrent._compat import iteritems
 
 
 TEST_DOCUMENT_DIRECTORY = os.path.abspath(os.path.dirname(__file__))
@@ -82,3 +89,394 @@ class TestSingleDocumentBuilder(object):
             u'<a href="http://google.com">google</a>\n'
             u'</p>'
         )
+
+    def test_several_writers(self, temp_file_directory, monkeypatch):
+        source = os.path.join(
+            TEST_DOCUMENT_DIRECTORY, 'single_document_link_test.kr'
+        )
+        expected = {}
+        for writer_cls in [KurrentWriter, HTML5Writer]:
+            builder = SingleDocumentBuilder(
+                source, temp_file_directory, writer_cls
+            )
+            builder.build()
+            expected[builder.target_path] = read_file(builder.target_path)
+            os.remove(builder.target_path)
+
+        parse = Parser.parse
+        parsed = []
+
+        def counting_parse(self):
+            parsed.append(self)
+            return parse(self)
+        monkeypatch.setattr(Parser, 'parse', counting_parse)
+        # the link transformations of the HTML5 writer must not affect the
+        # document written by the Kurrent writer
+        builder = SingleDocumentBuilder(
+            source, temp_file_directory, [HTML5Writer, KurrentWriter]
+        )
+        builder.build()
+        assert len(parsed) == 1
+        assert sorted(path for path, _ in builder.targets) == sorted(expected)
+        for path, content in iteritems(expected):
+            assert read_file(path) == content
+
+    @pytest.mark.parametrize('writer_cls', [HTML5Writer, KurrentWriter])
+    def test_cache(self, temp_file_directory, monkeypatch, writer_cls):
+        cache = DocumentCache(os.path.join(temp_file_directory, 'cache'))
+
+        def build():
+            builder = SingleDocumentBuilder(
+                os.path.join(
+                    TEST_DOCUMENT_DIRECTORY, 'single_document_link_test.kr'
+                ),
+                temp_file_directory,
+                writer_cls,
+                cache=cache
+            )
+            builder.build()
+            return read_file(builder.target_path)
+
+        uncached = build()
+        monkeypatch.setattr(Parser, 'parse', None)
+        assert build() == uncached
+
+    def test_memory_cache_writers(self, temp_file_directory):
+        source_path = os.path.join(
+            TEST_DOCUMENT_DIRECTORY, 'single_document_link_test.kr'
+        )
+
+        def build(writer_cls, cache):
+            builder = SingleDocumentBuilder(
+                source_path, temp_file_directory, writer_cls, cache=cache
+            )
+            builder.build()
+            return read_file(builder.target_path)
+
+        cache = MemoryDocumentCache()
+        for writer_cls in [HTML5Writer, KurrentWriter, HTML5Writer]:
+            assert build(writer_cls, cache) == build(writer_cls, None)
+
+    def test_profile(self, temp_file_directory):
+        builder = SingleDocumentBuilder(
+            os.path.join(TEST_DOCUMENT_DIRECTORY, 'single_document_test.kr'),
+            temp_file_directory,
+            HTML5Writer,
+            profile=Profile()
+        )
+        builder.build()
+        stats = builder.profile.get_stats(TitleTransformation)
+        assert stats.applied == 1
+        assert stats.selected == 1
+
+    def test_write_unchanged(self, temp_file_directory):
+        source = os.path.join(temp_file_directory, 'test.kr')
+        write_file(source, u'# Test')
+        write_stats = WriteStats()
+        builder = SingleDocumentBuilder(
+            source, temp_file_directory, HTML5Writer, write_stats=write_stats
+        )
+        builder.build()
+        set_mtime(builder.target_path, 0)
+        builder.build()
+        assert os.stat(builder.target_path).st_mtime == 0
+        assert (write_stats.written, write_stats.unchanged) == (1, 1)
+        write_file(source, u'# Changed')
+        builder.build()
+        assert os.stat(builder.target_path).st_mtime != 0
+        assert u'Changed' in read_file(builder.target_path)
+        assert (write_stats.written, write_stats.unchanged) == (2, 1)
+        assert sorted(os.listdir(temp_file_directory)) == [
+            'test.html', 'test.kr'
+        ]
+
+    def test_update(self, temp_file_directory):
+        source = os.path.join(temp_file_directory, 'test.kr')
+        links = os.path.join(temp_file_directory, 'links.kr')
+        write_file(source, u'[foo]')
+        write_file(links, u'[foo]: http://example.com')
+        registry = LinkRegistry(os.path.join(temp_file_directory, 'links.json'))
+        registry.update(links)
+        builder = SingleDocumentBuilder(
+            source, temp_file_directory, HTML5Writer, link_registry=registry
+        )
+        builder.build()
+        builder.update([links, os.path.join(temp_file_directory, 'other.kr')])
+        write_file(links, u'[foo]: http://example.org')
+        registry.update(links)
+        builder.update([links])
+        assert u'<a href="http://example.org">foo</a>' in read_file(
+            builder.target_path
+        )
+        write_file(source, u'# Changed')
+        builder.update([source])
+        assert u'Changed' in read_file(builder.target_path)
+
+
+def write_file(path, content):
+    directory = os.path.dirname(path)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    with codecs.open(path, 'w', encoding='utf-8') as file:
+        file.write(content)
+
+
+def set_mtime(path, mtime):
+    os.utime(path, (mtime, mtime))
+
+
+class TestProjectBuilder(object):
+    @pytest.fixture
+    def source_dir(self, temp_file_directory):
+        path = os.path.join(temp_file_directory, 'source')
+        write_file(os.path.join(path, 'index.kr'), u'# Index\n\n[foo]')
+        write_file(
+            os.path.join(path, 'sub', 'links.kr'),
+            u'[foo]: http://example.com'
+        )
+        write_file(os.path.join(path, 'other.kr'), u'# Other')
+        write_file(os.path.join(path, 'ignored.txt'), u'# Ignored')
+        return path
+
+    @pytest.fixture
+    def target_dir(self, temp_file_directory):
+        return os.path.join(temp_file_directory, 'target')
+
+    def build(self, source_dir, target_dir):
+        builder = ProjectBuilder(source_dir, target_dir, HTML5Writer)
+        builder.build()
+        return builder
+
+    def test_build(self, source_dir, target_dir):
+        builder = self.build(source_dir, target_dir)
+        assert builder.built == [
+            'index.kr', 'other.kr', os.path.join('sub', 'links.kr')
+        ]
+        assert os.path.exists(os.path.join(target_dir, 'sub', 'links.html'))
+        assert not os.path.exists(os.path.join(target_dir, 'ignored.html'))
+        assert u'<a href="http://example.com">foo</a>' in read_file(
+            os.path.join(target_dir, 'index.html')
+        )
+
+    def test_noop(self, source_dir, target_dir):
+        builder = self.build(source_dir, target_dir)
+        manifest_mtime = os.stat(builder.manifest_path).st_mtime
+        builder = self.build(source_dir, target_dir)
+        assert builder.built == []
+        assert builder.removed == []
+        assert os.stat(builder.manifest_path).st_mtime == manifest_mtime
+
+    def test_source_changed(self, source_dir, target_dir):
+        self.build(source_dir, target_dir)
+        write_file(os.path.join(source_dir, 'other.kr'), u'# Changed')
+        set_mtime(os.path.join(source_dir, 'other.kr'), 0)
+        assert self.build(source_dir, target_dir).built == ['other.kr']
+        assert u'Changed' in read_file(os.path.join(target_dir, 'other.html'))
+
+    def test_source_touched(self, source_dir, target_dir):
+        self.build(source_dir, target_dir)
+        set_mtime(os.path.join(source_dir, 'other.kr'), 0)
+        assert self.build(source_dir, target_dir).built == []
+        assert self.build(source_dir, target_dir).built == []
+
+    def test_target_changed(self, source_dir, target_dir):
+        self.build(source_dir, target_dir)
+        os.remove(os.path.join(target_dir, 'other.html'))
+        assert self.build(source_dir, target_dir).built == ['other.kr']
+
+    def test_link_changed(self, source_dir, target_dir):
+        self.build(source_dir, target_dir)
+        links_path = os.path.join(source_dir, 'sub', 'links.kr')
+        write_file(links_path, u'[foo]: http://example.org')
+        set_mtime(links_path, 0)
+        assert self.build(source_dir, target_dir).built == [
+            'index.kr', os.path.join('sub', 'links.kr')
+        ]
+        assert u'<a href="http://example.org">foo</a>' in read_file(
+            os.path.join(target_dir, 'index.html')
+        )
+
+    def test_removed(self, source_dir, target_dir):
+        self.build(source_dir, target_dir)
+        os.remove(os.path.join(source_dir, 'sub', 'links.kr'))
+        builder = self.build(source_dir, target_dir)
+        assert builder.removed == [os.path.join('sub', 'links.kr')]
+        assert builder.built == ['index.kr']
+        assert not os.path.exists(
+            os.path.join(target_dir, 'sub', 'links.html')
+        )
+
+    def test_update(self, source_dir, target_dir):
+        builder = ProjectBuilder(source_dir, target_dir, HTML5Writer)
+        builder.update([])
+        assert len(builder.built) == 3
+        other_path = os.path.join(source_dir, 'other.kr')
+        builder.update([other_path, os.path.join(source_dir, 'ignored.txt')])
+        assert builder.built == []
+        write_file(other_path, u'# Changed')
+        builder.update([other_path])
+        assert builder.built == ['other.kr']
+        assert u'Changed' in read_file(os.path.join(target_dir, 'other.html'))
+        assert builder.unsaved
+        builder.save()
+        assert self.build(source_dir, target_dir).built == []
+
+    @pytest.mark.parametrize('cache', [None, MemoryDocumentCache()])
+    def test_parses_once(self, source_dir, target_dir, monkeypatch, cache):
+        parse = Parser.parse
+        parsed = []
+
+        def counting_parse(self):
+            parsed.append(self)
+            return parse(self)
+        monkeypatch.setattr(Parser, 'parse', counting_parse)
+        # the documents the link registry parses are built
+        builder = ProjectBuilder(
+            source_dir, target_dir, HTML5Writer, cache=cache
+        )
+        builder.build()
+        assert len(parsed) == 3
+        del parsed[:]
+        other_path = os.path.join(source_dir, 'other.kr')
+        write_file(other_path, u'# Changed')
+        builder.update([other_path])
+        assert builder.built == ['other.kr']
+        assert len(parsed) == 1
+        assert u'Changed' in read_file(os.path.join(target_dir, 'other.html'))
+
+    def test_update_added(self, source_dir, target_dir):
+        builder = self.build(source_dir, target_dir)
+        new_path = os.path.join(source_dir, 'sub', 'new.kr')
+        write_file(new_path, u'# New')
+        builder.update([new_path])
+        assert builder.built == [os.path.join('sub', 'new.kr')]
+        assert os.path.exists(os.path.join(target_dir, 'sub', 'new.html'))
+
+    def test_update_link_changed(self, source_dir, target_dir):
+        builder = self.build(source_dir, target_dir)
+        links_path = os.path.join(source_dir, 'sub', 'links.kr')
+        write_file(links_path, u'[foo]: http://example.org')
+        builder.update([links_path])
+        assert builder.built == ['index.kr', os.path.join('sub', 'links.kr')]
+        assert u'<a href="http://example.org">foo</a>' in read_file(
+            os.path.join(target_dir, 'index.html')
+        )
+
+    def test_update_link_changed_memory_cache(self, source_dir, target_dir):
+        builder = ProjectBuilder(
+            source_dir, target_dir, HTML5Writer, cache=MemoryDocumentCache()
+        )
+        builder.build()
+        links_path = os.path.join(source_dir, 'sub', 'links.kr')
+        for target in [u'http://example.org', u'http://example.net']:
+            write_file(links_path, u'[foo]: %s' % target)
+            builder.update([links_path])
+            assert builder.built == [
+                'index.kr', os.path.join('sub', 'links.kr')
+            ]
+            assert u'<a href="%s">foo</a>' % target in read_file(
+                os.path.join(target_dir, 'index.html')
+            )
+
+    def test_update_removed(self, source_dir, target_dir):
+        builder = self.build(source_dir, target_dir)
+        links_path = os.path.join(source_dir, 'sub', 'links.kr')
+        os.remove(links_path)
+        builder.update([links_path])
+        assert builder.removed == [os.path.join('sub', 'links.kr')]
+        assert builder.built == ['index.kr']
+        assert not os.path.exists(
+            os.path.join(target_dir, 'sub', 'links.html')
+        )
+
+    def test_write_stats(self, source_dir, target_dir):
+        os.remove(self.build(source_dir, target_dir).manifest_path)
+        builder = self.build(source_dir, target_dir)
+        assert len(builder.built) == 3
+        assert builder.write_stats.written == 0
+        assert builder.write_stats.unchanged == 3
+
+    def test_writer_changed(self, source_dir, target_dir):
+        self.build(source_dir, target_dir)
+        builder = ProjectBuilder(source_dir, target_dir, KurrentWriter)
+        builder.build()
+        assert len(builder.built) == 3
+        assert self.build(source_dir, target_dir).built == []
+        builder.build()
+        assert builder.built == []
+
+        os.remove(os.path.join(source_dir, 'other.kr'))
+        assert self.build(source_dir, target_dir).removed == ['other.kr']
+        builder.build()
+        assert builder.removed == ['other.kr']
+        assert not os.path.exists(os.path.join(target_dir, 'other.html'))
+        assert not os.path.exists(os.path.join(target_dir, 'other.kr'))
+
+    def test_several_writers(self, source_dir, target_dir):
+        builder = ProjectBuilder(
+            source_dir, target_dir, [HTML5Writer, KurrentWriter]
+        )
+        builder.build()
+        assert len(builder.built) == 3
+        assert os.path.exists(os.path.join(target_dir, 'other.html'))
+        assert os.path.exists(os.path.join(target_dir, 'other.kr'))
+
+        builder = ProjectBuilder(
+            source_dir, target_dir, [HTML5Writer, KurrentWriter]
+        )
+        builder.build()
+        assert builder.built == []
+        os.remove(os.path.join(target_dir, 'other.kr'))
+        builder.build()
+        assert builder.built == ['other.kr']
+
+        os.remove(os.path.join(source_dir, 'other.kr'))
+        builder.build()
+        assert builder.removed == ['other.kr']
+        assert not os.path.exists(os.path.join(target_dir, 'other.html'))
+        assert not os.path.exists(os.path.join(target_dir, 'other.kr'))
+
+    def test_removed_with_other_writers(self, source_dir, target_dir):
+        self.build(source_dir, target_dir)
+        links_path = os.path.join(source_dir, 'sub', 'links.kr')
+        os.remove(links_path)
+        # the manifest of these writers has no entry for the removed source,
+        # its links must not be resolved anyway
+        builder = ProjectBuilder(
+            source_dir, target_dir, [HTML5Writer, KurrentWriter]
+        )
+        builder.build()
+        assert builder.removed == []
+        assert os.path.abspath(links_path) not in builder.link_registry.sources
+        assert u'http://example.com' not in read_file(
+            os.path.join(target_dir, 'index.html')
+        )
+        assert self.build(source_dir, target_dir).removed == [
+            os.path.join('sub', 'links.kr')
+        ]
+
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_build_sources(temp_file_directory, jobs):
+    sources = []
+    for i in range(10):
+        sources.append(os.path.join(temp_file_directory, '%d.kr' % i))
+        write_file(sources[-1], u'# Document %d' % i)
+    sources.insert(5, os.path.join(temp_file_directory, 'missing.kr'))
+    profile = Profile()
+    write_stats = WriteStats()
+    results = list(build_sources(
+        SingleDocumentBuilder, HTML5Writer, sources, jobs=jobs,
+        profile=profile, write_stats=write_stats
+    ))
+    assert [source for source, _ in results] == sources
+    assert [
+        source for source, error in results if error is not None
+    ] == [sources[5]]
+    assert 'missing.kr' in results[5][1]
+    assert profile.get_stats(TitleTransformation).applied == 10
+    assert write_stats.written == 10
+    for i in range(10):
+        assert read_file(
+            os.path.join(temp_file_directory, '%d.html' % i)
+        ).startswith(u'<!doctype html>\n<title>Document %d</title>' % i)
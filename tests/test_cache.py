@@ -0,0 +1,76 @@
+# coding: utf-8
+"""
+    tests.test_cache
+    ~~~~~~~~~~~~~~~~
+
+    :copyright: 2013 by Daniel Neuhäuser
+    :license: BSD, see LICENSE.rst for details
+"""
+import os
+
+import pytest
+
+from kurrent import ast
+from kurrent.cache import DocumentCache
+from kurrent.parser import Parser
+
+
+@pytest.fixture
+def cache(temp_file_directory):
+    return DocumentCache(os.path.join(temp_file_directory, 'cache'))
+
+
+class TestDocumentCache(object):
+    def test_get_key(self, cache):
+        assert cache.get_key(b'foo') == cache.get_key(b'foo')
+        assert cache.get_key(b'foo') != cache.get_key(b'bar')
+
+    def test_get_set(self, cache):
+        key = cache.get_key(b'foo')
+        assert cache.get(key) is None
+        with Parser.from_string(u'# Foo\n\n*bar*') as parser:
+            document = parser.parse()
+        cache.set(key, (document, {'foo': 1}))
+        cached_document, context = cache.get(key)
+        assert context == {'foo': 1}
+        assert cached_document is not document
+        assert cached_document.fingerprint == document.fingerprint
+        assert cached_document.children[0].parent is cached_document
+
+    def test_get_corrupted(self, cache):
+        key = cache.get_key(b'foo')
+        with open(cache.get_path(key), 'wb') as file:
+            file.write(b'garbage')
+        assert cache.get(key) is None
+
+    def test_get_updates_mtime(self, cache):
+        key = cache.get_key(b'foo')
+        cache.set(key, ast.Document('<test>'))
+        os.utime(cache.get_path(key), (0, 0))
+        cache.get(key)
+        assert os.stat(cache.get_path(key)).st_mtime > 0
+
+    def test_evict(self, cache):
+        keys = [cache.get_key(str(i).encode('ascii')) for i in range(4)]
+        for i, key in enumerate(keys):
+            cache.set(key, u'x' * 1000)
+            os.utime(cache.get_path(key), (i, i))
+        cache.get(keys[0])
+        cache.max_size = 3500
+        cache.set(cache.get_key(b'new'), u'x' * 1000)
+        assert cache.get(keys[1]) is None
+        assert cache.get(keys[2]) is None
+        assert cache.get(keys[0]) is not None
+        assert cache.get(keys[3]) is not None
+        assert sum(size for _, size, _ in cache.get_entries()) <= 3500
+
+    def test_ignores_temporary_files(self, cache):
+        with open(os.path.join(cache.directory, '.foo.pickle.1234'), 'wb'):
+            pass
+        assert cache.get_entries() == []
+
+    def test_clear(self, cache):
+        key = cache.get_key(b'foo')
+        cache.set(key, u'foo')
+        cache.clear()
+        assert cache.get(key) is None
@@ -6,6 +6,10 @@
     :copyright: 2013 by Daniel Neuhäuser
     :license: BSD, see LICENSE.rst for details
 """
+import os
+import sys
+import time
+import signal
 import subprocess
 
 import pytest
@@ -61,6 +65,18 @@ class TestMain(CLITest):
         assert stdout == help_text
 
 
+    def test_lazy_imports(self):
+        # only needed by some commands and slow to import
+        modules = ['babel', 'markupsafe', 'multiprocessing', 'socketserver']
+        returncode, stdout, stderr = self.execute([
+            sys.executable, '-c',
+            'import sys, kurrent.cli; '
+            'print([m for m in %r if m in sys.modules])' % modules
+        ])
+        assert returncode == 0, stderr
+        assert stdout.strip() == b'[]'
+
+
 class TestBuild(CLITest):
     @pytest.fixture
     def help_text(self):
@@ -86,3 +102,132 @@ class TestBuild(CLITest):
         assert returncode == 1
         assert stderr == b"Error: 'does-not-exist' is not a known writer.\n\n"
         assert stdout == help_text
+
+    def test_several_writers(self, temp_file_directory):
+        source = os.path.join(temp_file_directory, 'test.kr')
+        with open(source, 'wb') as file:
+            file.write(b'# Test')
+        returncode, stdout, stderr = self.execute([
+            'kurrent', 'build', '--verbose', 'single', 'html5,man', source
+        ])
+        assert returncode == 0, stderr
+        assert stdout == b'2 written, 0 unchanged\n'
+        for name in ['test.html', 'test.1']:
+            assert os.path.exists(os.path.join(temp_file_directory, name))
+
+        returncode, stdout, stderr = self.execute(
+            ['kurrent', 'build', 'single', 'html5,does-not-exist', source]
+        )
+        assert returncode == 1
+        assert stderr.startswith(
+            b"Error: 'does-not-exist' is not a known writer.\n\n"
+        )
+
+    def test_profile(self, temp_file_directory):
+        source = os.path.join(temp_file_directory, 'test.kr')
+        with open(source, 'wb') as file:
+            file.write(b'# Test\n\nThis is a test.')
+        returncode, stdout, stderr = self.execute(
+            ['kurrent', 'build', '--profile', 'single', 'html5', source]
+        )
+        assert returncode == 0
+        assert b'TitleTransformation' in stderr
+        assert os.path.exists(os.path.join(temp_file_directory, 'test.html'))
+
+    def test_verbose(self, temp_file_directory):
+        source = os.path.join(temp_file_directory, 'test.kr')
+        with open(source, 'wb') as file:
+            file.write(b'# Test')
+        command = ['kurrent', 'build', '--verbose', 'single', 'html5', source]
+        returncode, stdout, stderr = self.execute(command)
+        assert returncode == 0, stderr
+        assert stdout == b'1 written, 0 unchanged\n'
+        returncode, stdout, stderr = self.execute(command)
+        assert returncode == 0, stderr
+        assert stdout == b'0 written, 1 unchanged\n'
+
+    def test_link_index(self, temp_file_directory):
+        source = os.path.join(temp_file_directory, 'test.kr')
+        with open(source, 'wb') as file:
+            file.write(b'[foo]')
+        with open(os.path.join(temp_file_directory, 'links.kr'), 'wb') as file:
+            file.write(b'[foo]: http://example.com')
+        index = os.path.join(temp_file_directory, 'links.json')
+        returncode, stdout, stderr = self.execute([
+            'kurrent', 'build', '--link-index', index, 'single', 'html5',
+            source, os.path.join(temp_file_directory, 'links.kr')
+        ])
+        assert returncode == 0, stderr
+        assert os.path.exists(index)
+        with open(os.path.join(temp_file_directory, 'test.html'), 'rb') as file:
+            assert b'<a href="http://example.com">foo</a>' in file.read()
+
+        os.remove(os.path.join(temp_file_directory, 'links.kr'))
+        returncode, stdout, stderr = self.execute([
+            'kurrent', 'build', '--link-index', index, 'single', 'html5',
+            source
+        ])
+        assert returncode == 0, stderr
+        with open(os.path.join(temp_file_directory, 'test.html'), 'rb') as file:
+            assert b'<a href="foo">foo</a>' in file.read()
+
+    @pytest.mark.parametrize('jobs', ['1', '2'])
+    def test_jobs(self, temp_file_directory, jobs):
+        sources = []
+        for name in ['a', 'b', 'c']:
+            sources.append(os.path.join(temp_file_directory, name + '.kr'))
+            with open(sources[-1], 'wb') as file:
+                file.write(b'# Test')
+        missing = os.path.join(temp_file_directory, 'missing.kr')
+        returncode, stdout, stderr = self.execute(
+            ['kurrent', 'build', '--jobs', jobs, 'single', 'html5'] +
+            sources[:2] + [missing] + sources[2:]
+        )
+        assert returncode == 1
+        assert stderr.startswith(
+            ("Error: building %r failed:\n" % missing).encode('utf-8')
+        )
+        for name in ['a', 'b', 'c']:
+            assert os.path.exists(
+                os.path.join(temp_file_directory, name + '.html')
+            )
+
+    def test_invalid_jobs(self):
+        returncode, stdout, stderr = self.execute(
+            ['kurrent', 'build', '--jobs', 'many', 'single', 'html5', 'source']
+        )
+        assert returncode == 1
+        assert stderr == b"Error: 'many' is not a valid number of jobs.\n\n"
+
+    def test_watch(self, temp_file_directory):
+        source = os.path.join(temp_file_directory, 'test.kr')
+        target = os.path.join(temp_file_directory, 'test.html')
+        with open(source, 'wb') as file:
+            file.write(b'# Test')
+
+        def wait_for(content):
+            start = time.time()
+            while time.time() - start < 10:
+                if os.path.exists(target):
+                    with open(target, 'rb') as file:
+                        if content in file.read():
+                            return True
+                time.sleep(0.01)
+            return False
+
+        process = subprocess.Popen(
+            ['kurrent', 'build', '--watch', 'single', 'html5', source],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE
+        )
+        try:
+            assert wait_for(b'<h1>Test</h1>')
+            assert process.stderr.readline() == b'Watching for changes...\n'
+            with open(source, 'wb') as file:
+                file.write(b'# Changed')
+            assert wait_for(b'<h1>Changed</h1>')
+        finally:
+            process.send_signal(signal.SIGINT)
+            stdout, stderr = process.communicate()
+        assert process.returncode == 0
+        assert stderr == b''
@@ -0,0 +1,136 @@
+# coding: utf-8
+"""
+    tests.test_links
+    ~~~~~~~~~~~~~~~~
+
+    :copyright: 2013 by Daniel Neuhäuser
+    :license: BSD, see LICENSE.rst for details
+"""
+import os
+
+import pytest
+
+from kurrent import ast
+from kurrent.links import LinkRegistry, get_link_definitions
+from kurrent.transformations import (
+    LINK_TRANSFORMATIONS, apply_transformations
+)
+
+
+def write_file(path, content):
+    with open(path, 'wb') as file:
+        file.write(content)
+
+
+def test_get_link_definitions():
+    document = ast.Document('<test>', children=[
+        ast.Extension(None, u'foo', secondary=u'http://example.com'),
+        ast.Extension(u'note', u'bar', secondary=u'baz'),
+        ast.BlockQuote(children=[
+            ast.Extension(None, u'bar', secondary=u'http://example.org')
+        ])
+    ])
+    assert get_link_definitions(document) == {
+        u'foo': u'http://example.com',
+        u'bar': u'http://example.org'
+    }
+
+
+class TestLinkRegistry(object):
+    @pytest.fixture
+    def source_path(self, temp_file_directory):
+        path = os.path.join(temp_file_directory, 'source.kr')
+        write_file(path, b'[foo]: http://example.com')
+        return path
+
+    def test_resolve(self, source_path):
+        registry = LinkRegistry()
+        assert registry.update(source_path)
+        assert registry.resolve(u'foo') == (
+            u'http://example.com', os.path.abspath(source_path)
+        )
+        assert registry.resolve(u'bar') is None
+
+    def test_first_path_wins(self, temp_file_directory):
+        registry = LinkRegistry()
+        for name in ['b.kr', 'a.kr']:
+            path = os.path.join(temp_file_directory, name)
+            write_file(path, ('[foo]: %s' % name).encode('ascii'))
+            registry.update(path)
+        assert registry.resolve(u'foo')[0] == u'a.kr'
+
+    def test_update(self, source_path):
+        registry = LinkRegistry()
+        registry.update(source_path)
+        assert not registry.update(source_path)
+        write_file(source_path, b'[bar]: http://example.org')
+        os.utime(source_path, (0, 0))
+        assert registry.update(source_path)
+        assert registry.resolve(u'foo') is None
+        assert registry.resolve(u'bar')[0] == u'http://example.org'
+        write_file(source_path, b'Text\n\n[bar]: http://example.org')
+        os.utime(source_path, (1, 1))
+        assert not registry.update(source_path)
+        assert registry.is_current(source_path)
+
+    def test_update_same_content(self, source_path, monkeypatch):
+        registry = LinkRegistry()
+        registry.update(source_path)
+        os.utime(source_path, (0, 0))
+        monkeypatch.setattr(ast.Document, 'traverse', None)
+        assert not registry.update(source_path)
+        assert registry.is_current(source_path)
+
+    def test_remove(self, source_path):
+        registry = LinkRegistry()
+        registry.update(source_path)
+        assert registry.remove(source_path)
+        assert registry.resolve(u'foo') is None
+        assert not registry.remove(source_path)
+
+    def test_prune(self, temp_file_directory, source_path):
+        other_path = os.path.join(temp_file_directory, 'other.kr')
+        write_file(other_path, b'Text')
+        registry = LinkRegistry()
+        registry.update(source_path)
+        registry.update(other_path)
+        assert not registry.prune()
+        os.remove(other_path)
+        assert not registry.prune()
+        assert list(registry.sources) == [os.path.abspath(source_path)]
+        os.remove(source_path)
+        assert registry.prune()
+        assert registry.resolve(u'foo') is None
+
+    def test_save_and_load(self, temp_file_directory, source_path):
+        index_path = os.path.join(temp_file_directory, 'links.json')
+        registry = LinkRegistry(index_path)
+        registry.update(source_path)
+        registry.save()
+
+        loaded = LinkRegistry.load(index_path)
+        assert loaded.is_current(source_path)
+        assert loaded.resolve(u'foo') == registry.resolve(u'foo')
+
+    def test_load_missing(self, temp_file_directory):
+        registry = LinkRegistry.load(
+            os.path.join(temp_file_directory, 'links.json')
+        )
+        assert registry.sources == {}
+
+    def test_transformation(self, source_path):
+        registry = LinkRegistry()
+        registry.update(source_path)
+        document = ast.Document('<test>', children=[
+            ast.InlineExtension(None, u'foo'),
+            ast.InlineExtension(None, u'bar')
+        ])
+        context = {'link_registry': registry}
+        apply_transformations(document, context, LINK_TRANSFORMATIONS)
+        assert [link.target for link in document.children] == [
+            u'http://example.com', u'bar'
+        ]
+        assert context['link_dependencies'] == {
+            u'foo': (u'http://example.com', os.path.abspath(source_path)),
+            u'bar': None
+        }
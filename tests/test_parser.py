@@ -6,10 +6,12 @@
     :copyright: 2013 by Daniel Neuhäuser
     :license: BSD, see LICENSE.rst for details
 """
+import copy
+
 import pytest
 
 from kurrent import ast
-from kurrent.parser import LineIterator, Parser, DocumentError
+from kurrent.parser import Line, LineIterator, Parser, DocumentError
 
 
 class TestParser(object):
@@ -18,6 +20,26 @@ class TestParser(object):
         with pytest.raises(DocumentError):
             parser.parse()
 
+    def test_keep_source(self):
+        source = u'# foo\n\nbar\n*baz*\n\n    raw\n\n[spam]: eggs\n'
+        document = Parser.from_string(source).parse()
+        assert [block.source for block in document.children] == [None] * 4
+
+        document = Parser.from_string(source, keep_source=True).parse()
+        assert [block.source for block in document.children] == [
+            [u'# foo'],
+            [u'bar', u'*baz*'],
+            [u'    raw', u''],
+            [u'[spam]: eggs']
+        ]
+        assert document.children[1].children[1].source is None
+
+
+def test_line_deepcopy():
+    line = copy.deepcopy(Line(u'foo', 1, 2))
+    assert line == u'foo'
+    assert line.start == ast.Location(1, 2)
+
 
 class TestLineIterator(object):
     def test_next(self):
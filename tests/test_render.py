@@ -0,0 +1,39 @@
+# coding: utf-8
+"""
+    tests.test_render
+    ~~~~~~~~~~~~~~~~~
+
+    :copyright: 2013 by Daniel Neuhäuser
+    :license: BSD, see LICENSE.rst for details
+"""
+import pytest
+
+from kurrent import render
+from kurrent.writers import KurrentWriter
+
+
+SOURCE = u'# Tëst\n\nA [link].\n\n[link]: http://example.com'
+
+
+def test_render():
+    assert render(SOURCE) == (
+        u'<!doctype html>\n'
+        u'<title>Tëst</title>\n'
+        u'<h1>Tëst</h1>\n'
+        u'<p>\n'
+        u'  A <a href="http://example.com">link</a>.\n'
+        u'</p>'
+    )
+
+
+@pytest.mark.parametrize('writer', ['kurrent', KurrentWriter])
+def test_writer(writer):
+    assert render(u'# Test\n\nThis is a test.', writer) == (
+        u'# Test\n\nThis is a test.'
+    )
+
+
+def test_bytes():
+    rv = render(SOURCE.encode('utf-8'))
+    assert isinstance(rv, bytes)
+    assert rv.decode('utf-8') == render(SOURCE)
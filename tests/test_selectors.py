@@ -0,0 +1,95 @@
+# coding: utf-8
+"""
+    tests.test_selectors
+    ~~~~~~~~~~~~~~~~~~~~
+
+    :copyright: 2013 by Daniel Neuhäuser
+    :license: BSD, see LICENSE.rst for details
+"""
+import pytest
+
+from kurrent import ast
+from kurrent.selectors import SelectorError, NodeIndex, compile, select
+
+
+@pytest.fixture
+def document():
+    return ast.Document('<test>', children=[
+        ast.Header(u'foo', 1),
+        ast.Paragraph(children=[
+            ast.InlineExtension(None, u'bar'),
+            ast.Emphasis(children=[ast.InlineExtension(u'note', u'baz')])
+        ]),
+        ast.Header(u'spam', 2),
+        ast.BlockQuote(children=[
+            ast.Paragraph(children=[ast.InlineExtension(None, u'eggs')])
+        ])
+    ])
+
+
+def primaries(nodes):
+    return [node.primary for node in nodes]
+
+
+class TestSelect(object):
+    @pytest.mark.parametrize('use_index', [False, True])
+    @pytest.mark.parametrize(('selector', 'expected'), [
+        ('InlineExtension', [u'bar', u'baz', u'eggs']),
+        ('InlineExtension[type=None]', [u'bar', u'eggs']),
+        ('InlineExtension[type="note"]', [u'baz']),
+        ('InlineExtension[type=note][primary=baz]', [u'baz']),
+        ('Paragraph > InlineExtension', [u'bar', u'eggs']),
+        ('Paragraph InlineExtension', [u'bar', u'baz', u'eggs']),
+        ('BlockQuote InlineExtension', [u'eggs']),
+        ('Document > Paragraph > InlineExtension', [u'bar']),
+        ('InlineExtension:first', [u'bar']),
+        ('Emphasis > *', [u'baz'])
+    ])
+    def test_select(self, document, use_index, selector, expected):
+        index = NodeIndex(document) if use_index else None
+        assert primaries(select(selector, document, index=index)) == expected
+
+    def test_attributes(self, document):
+        assert [
+            node.text for node in select('Header[level=2]', document)
+        ] == [u'spam']
+        assert [
+            node.text for node in select('Header:first', document)
+        ] == [u'foo']
+
+    def test_first_stops_early(self, document):
+        nodes = select('Header:first', document)
+        next(nodes)
+        with pytest.raises(StopIteration):
+            next(nodes)
+
+    def test_index_ignores_removed(self, document):
+        index = NodeIndex(document)
+        document.children[1].remove_from_parent()
+        assert primaries(select('InlineExtension', document, index=index)) == [
+            u'eggs'
+        ]
+
+    def test_index_from_nodes(self, document):
+        extensions = [
+            node for node in document.traverse()
+            if isinstance(node, ast.InlineExtension)
+        ]
+        index = NodeIndex(document, nodes={ast.InlineExtension: extensions})
+        assert index.covers(ast.InlineExtension)
+        assert not index.covers(ast.Header)
+        assert NodeIndex(document).covers(ast.Header)
+        assert primaries(
+            select('Paragraph > InlineExtension', document, index=index)
+        ) == [u'bar', u'eggs']
+
+    def test_compile_cached(self):
+        assert compile('Header') is compile('Header')
+
+    @pytest.mark.parametrize('selector', [
+        'Foo', 'Header:last', 'Header:first > Text', 'Header[level]',
+        'Header >', '> Header', 'Header ~ Text', 'ast.Header'
+    ])
+    def test_invalid(self, selector):
+        with pytest.raises(SelectorError):
+            compile(selector)
@@ -0,0 +1,115 @@
+# coding: utf-8
+"""
+    tests.test_server
+    ~~~~~~~~~~~~~~~~~
+
+    :copyright: 2013 by Daniel Neuhäuser
+    :license: BSD, see LICENSE.rst for details
+"""
+import os
+import stat
+import socket
+import threading
+import subprocess
+
+import pytest
+
+from kurrent import client
+
+
+pytestmark = pytest.mark.skipif(
+    'not hasattr(socket, "AF_UNIX")', reason='requires Unix domain sockets'
+)
+
+
+@pytest.fixture
+def server(request, temp_file_directory):
+    from kurrent.server import BuildServer
+    server = BuildServer(os.path.join(temp_file_directory, 'kurrent.sock'))
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    def stop():
+        server.shutdown()
+        server.server_close()
+        thread.join()
+    request.addfinalizer(stop)
+    return server
+
+
+class TestBuildServer(object):
+    def test_build(self, server, temp_file_directory):
+        with open(os.path.join(temp_file_directory, 'test.kr'), 'wb') as file:
+            file.write(b'# Test')
+        for _ in range(2):
+            response = client.send(
+                ['build', 'single', 'html5', 'test.kr'],
+                socket_path=server.socket_path,
+                cwd=temp_file_directory
+            )
+            assert response == {'returncode': 0, 'stdout': u'', 'stderr': u''}
+        assert os.path.exists(os.path.join(temp_file_directory, 'test.html'))
+        assert len(server.cache.entries) == 1
+
+    def test_error(self, server, temp_file_directory):
+        response = client.send(
+            ['build', 'single', 'html5', 'missing.kr'],
+            socket_path=server.socket_path,
+            cwd=temp_file_directory
+        )
+        assert response['returncode'] == 1
+        assert u"Error: building 'missing.kr' failed" in response['stderr']
+        assert os.getcwd() != temp_file_directory
+
+    def test_help(self, server, temp_file_directory):
+        response = client.send(
+            ['--help'],
+            socket_path=server.socket_path,
+            cwd=temp_file_directory
+        )
+        assert response['returncode'] == 0
+        assert u'Usage:' in response['stdout']
+
+    def test_usage_error(self, server, temp_file_directory):
+        response = client.send(
+            ['build'],
+            socket_path=server.socket_path,
+            cwd=temp_file_directory
+        )
+        assert response['returncode'] == 1
+        assert u'Usage:' in response['stderr']
+
+    def test_permissions(self, temp_file_directory):
+        from kurrent.server import BuildServer
+        umask = os.umask(0)
+        try:
+            server = BuildServer(
+                os.path.join(temp_file_directory, 'kurrent.sock')
+            )
+        finally:
+            os.umask(umask)
+        try:
+            assert stat.S_IMODE(os.stat(server.socket_path).st_mode) == 0o600
+        finally:
+            server.server_close()
+        assert os.umask(umask) == umask
+
+    def test_in_use(self, server):
+        from kurrent.server import BuildServer
+        with pytest.raises(socket.error):
+            BuildServer(server.socket_path)
+
+
+def test_client_without_server(temp_file_directory):
+    environ = dict(os.environ)
+    environ['KURRENT_SOCKET'] = os.path.join(temp_file_directory, 'missing')
+    process = subprocess.Popen(
+        ['kurrent-client', '--version'],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        env=environ
+    )
+    stdout, stderr = process.communicate()
+    assert process.returncode == 0
+    assert stdout.startswith(b'Kurrent ')
@@ -6,10 +6,14 @@
     :copyright: 2013 by Daniel Neuhäuser
     :license: BSD, see LICENSE.rst for details
 """
+import pytest
+
 from kurrent import ast
 from kurrent.transformations import (
-    TitleTransformation, LinkExtensionTransformation,
-    LinkInlineExtensionTransformation
+    Transformation, StopTransformation, TitleTransformation,
+    LinkExtensionTransformation, LinkInlineExtensionTransformation,
+    CORE_TRANSFORMATIONS, LINK_TRANSFORMATIONS, schedule,
+    apply_transformations, Profile
 )
 
 
@@ -67,3 +71,257 @@ class TestLinkInlineExtensionTransformation(object):
         assert isinstance(document.children[0], ast.Link)
         assert document.children[0].target == u'http://google.com'
         assert document.children[0].text == u'Google'
+
+
+class CountingTransformation(Transformation):
+    def select_node(self, node):
+        self.context.setdefault('visited', []).append(node)
+        return False
+
+
+class CustomApplyTransformation(Transformation):
+    def apply(self):
+        self.context['applied'] = True
+
+
+class TestSchedule(object):
+    def test_passes(self):
+        assert schedule(CORE_TRANSFORMATIONS + LINK_TRANSFORMATIONS) == [
+            [TitleTransformation, LinkExtensionTransformation],
+            [LinkInlineExtensionTransformation]
+        ]
+        assert schedule([
+            TitleTransformation, CustomApplyTransformation, TitleTransformation
+        ]) == [
+            [TitleTransformation],
+            [CustomApplyTransformation],
+            [TitleTransformation]
+        ]
+
+    def test_reorders_by_dependencies(self):
+        assert schedule([
+            LinkInlineExtensionTransformation, TitleTransformation,
+            LinkExtensionTransformation
+        ]) == [
+            [TitleTransformation, LinkExtensionTransformation],
+            [LinkInlineExtensionTransformation]
+        ]
+
+    def test_undeclared_keep_order(self):
+        assert schedule([
+            LinkExtensionTransformation, CountingTransformation,
+            LinkInlineExtensionTransformation, TitleTransformation
+        ]) == [
+            [LinkExtensionTransformation],
+            [CountingTransformation],
+            [LinkInlineExtensionTransformation, TitleTransformation]
+        ]
+        with pytest.raises(ValueError):
+            schedule([
+                LinkInlineExtensionTransformation, CountingTransformation,
+                LinkExtensionTransformation
+            ])
+
+    def test_undeclared_products(self):
+        class Undeclared(Transformation):
+            selector = 'Text'
+
+            def transform(self, node):
+                node.replace_in_parent(ast.InlineExtension(None, node.text))
+
+        class Consumer(Transformation):
+            consumes = (ast.InlineExtension,)
+            selector = 'InlineExtension'
+
+            def transform(self, node):
+                self.context.setdefault('consumed', []).append(node.primary)
+
+        assert schedule([Undeclared, Consumer]) == [[Undeclared], [Consumer]]
+        document = ast.Document('<test>', children=[
+            ast.Paragraph(children=[ast.Text(u'foo')])
+        ])
+        assert schedule([Undeclared, Consumer], document=document) == [
+            [Undeclared], [Consumer]
+        ]
+        context = {}
+        apply_transformations(document, context, [Undeclared, Consumer])
+        assert context['consumed'] == [u'foo']
+
+    def test_cycle(self):
+        class First(Transformation):
+            consumes = ('b',)
+            produces = ('a',)
+
+        class Second(Transformation):
+            consumes = ('a',)
+            produces = ('b',)
+
+        with pytest.raises(ValueError):
+            schedule([First, Second])
+
+    def test_skips_absent_node_classes(self):
+        document = ast.Document('<test>', children=[
+            ast.Paragraph(children=[ast.Text(u'foo')])
+        ])
+        assert schedule(
+            CORE_TRANSFORMATIONS + LINK_TRANSFORMATIONS + [
+                CountingTransformation
+            ],
+            document=document
+        ) == [[CountingTransformation]]
+
+    def test_keeps_produced_node_classes(self):
+        class LinkTransformation(Transformation):
+            consumes = (ast.Link,)
+
+        document = ast.Document('<test>', children=[
+            ast.InlineExtension(None, u'foo')
+        ])
+        assert schedule(
+            LINK_TRANSFORMATIONS + [LinkTransformation], document=document
+        ) == [[LinkInlineExtensionTransformation], [LinkTransformation]]
+
+
+class TestApplyTransformations(object):
+    def test_single_traversal(self):
+        document = ast.Document('<test>', children=[
+            ast.Paragraph(children=[ast.Text(u'foo')]),
+            ast.Header(u'bar', 1)
+        ])
+        context = {}
+        apply_transformations(document, context, [
+            CountingTransformation, TitleTransformation,
+            CustomApplyTransformation
+        ])
+        assert len(context['visited']) == 4
+        assert context['applied']
+        assert document.metadata['title'] == u'bar'
+
+    def test_stop_transformation(self):
+        class StoppingTransformation(Transformation):
+            def select_node(self, node):
+                return True
+
+            def transform(self, node):
+                raise StopTransformation()
+
+        document = ast.Document('<test>', children=[ast.Text(u'foo')])
+        context = {}
+        apply_transformations(document, context, [
+            StoppingTransformation, CountingTransformation
+        ])
+        assert len(context['visited']) == 2
+
+    def test_links(self):
+        document = ast.Document('<test>', children=[
+            ast.InlineExtension(None, u'google'),
+            ast.Extension(None, u'google', secondary=u'http://google.com'),
+            ast.Header(u'foo', 1)
+        ])
+        apply_transformations(
+            document, {}, CORE_TRANSFORMATIONS + LINK_TRANSFORMATIONS
+        )
+        assert document.metadata['title'] == u'foo'
+        assert len(document.children) == 2
+        assert isinstance(document.children[0], ast.Link)
+        assert document.children[0].target == u'http://google.com'
+
+
+class TestProfile(object):
+    def test_profile(self):
+        document = ast.Document('<test>', children=[
+            ast.InlineExtension(None, u'google'),
+            ast.Extension(None, u'google', secondary=u'http://google.com'),
+            ast.Header(u'foo', 1)
+        ])
+        profile = Profile()
+        apply_transformations(
+            document, {},
+            CORE_TRANSFORMATIONS + LINK_TRANSFORMATIONS + [
+                CustomApplyTransformation
+            ],
+            profile=profile
+        )
+        assert [stats.transformation_cls for stats in profile.stats] == [
+            TitleTransformation, LinkExtensionTransformation,
+            LinkInlineExtensionTransformation, CustomApplyTransformation
+        ]
+        title, extension, inline, custom = profile.stats
+        assert (title.candidates, title.selected, title.mutations) == (
+            4, 1, 1
+        )
+        assert (
+            extension.candidates, extension.selected, extension.mutations
+        ) == (4, 1, 1)
+        # candidates for the selector are taken from an index
+        assert (inline.candidates, inline.selected, inline.mutations) == (
+            1, 1, 1
+        )
+        assert (custom.candidates, custom.selected, custom.mutations) == (
+            0, 0, 0
+        )
+        for stats in profile.stats:
+            assert stats.applied == 1
+            assert stats.time >= 0
+
+        formatted = profile.format()
+        for stats in profile.stats:
+            assert stats.transformation_cls.__name__ in formatted
+
+
+class TestSelectorTransformation(object):
+    class StrongTextTransformation(Transformation):
+        consumes = (ast.Text,)
+        selector = 'Strong > Text'
+
+        def transform(self, node):
+            self.context.setdefault('transformed', []).append(node.text)
+
+    class FirstTextTransformation(StrongTextTransformation):
+        selector = 'Text:first'
+
+    def make_document(self):
+        return ast.Document('<test>', children=[
+            ast.Paragraph(children=[
+                ast.Text(u'foo'),
+                ast.Strong(children=[ast.Text(u'bar')]),
+                ast.Text(u'baz'),
+                ast.Strong(children=[ast.Text(u'spam')])
+            ])
+        ])
+
+    def test_apply(self):
+        context = {}
+        self.StrongTextTransformation(self.make_document(), context).apply()
+        assert context['transformed'] == [u'bar', u'spam']
+
+    def test_first(self):
+        context = {}
+        self.FirstTextTransformation(self.make_document(), context).apply()
+        assert context['transformed'] == [u'foo']
+
+    def test_fused(self):
+        context = {}
+        apply_transformations(self.make_document(), context, [
+            self.StrongTextTransformation, self.FirstTextTransformation
+        ])
+        assert context['transformed'] == [u'foo', u'bar', u'spam']
+
+    def test_index_skips_removed_nodes(self):
+        class RemoveStrongTransformation(Transformation):
+            consumes = (ast.Strong,)
+            produces = ('removed',)
+            selector = 'Strong'
+
+            def transform(self, node):
+                if node.children[0].text == u'bar':
+                    node.remove_from_parent()
+
+        class StrongTextTransformation(self.StrongTextTransformation):
+            consumes = (ast.Text, 'removed')
+
+        context = {}
+        apply_transformations(self.make_document(), context, [
+            RemoveStrongTransformation, StrongTextTransformation
+        ])
+        assert context['transformed'] == [u'spam']
@@ -6,8 +6,13 @@
     :copyright: 2013 by Daniel Neuhäuser
     :license: BSD, see LICENSE.rst for details
 """
+import os
+import sys
+import stat
+
 from kurrent.utils import (
-    PushableIterator, TransactionIterator, TransactionFailure
+    AsyncIterator, PushableIterator, TransactionIterator, TransactionFailure,
+    atomic_write
 )
 
 import pytest
@@ -26,6 +31,64 @@ class IteratorTest(object):
             next(i)
 
 
+class TestAtomicWrite(object):
+    def test_write(self, temp_file_directory):
+        path = os.path.join(temp_file_directory, 'foo')
+        atomic_write(path, b'foo')
+        atomic_write(path, b'bar')
+        with open(path, 'rb') as file:
+            assert file.read() == b'bar'
+        assert os.listdir(temp_file_directory) == ['foo']
+
+    @pytest.mark.skipif(os.name != 'posix', reason='requires POSIX modes')
+    def test_mode(self, temp_file_directory):
+        path = os.path.join(temp_file_directory, 'foo')
+        umask = os.umask(0o022)
+        try:
+            atomic_write(path, b'foo')
+        finally:
+            os.umask(umask)
+        assert stat.S_IMODE(os.stat(path).st_mode) == 0o644
+
+        os.chmod(path, 0o640)
+        atomic_write(path, b'bar')
+        assert stat.S_IMODE(os.stat(path).st_mode) == 0o640
+
+
+class TestAsyncIterator(object):
+    def test_protocol(self):
+        i = AsyncIterator(iter([1]))
+        assert i.__aiter__() is i
+        awaitable = i.__anext__().__await__()
+        assert iter(awaitable) is awaitable
+        assert next(awaitable) is None
+        with pytest.raises(StopIteration) as exc_info:
+            next(awaitable)
+        assert exc_info.value.args == (1, )
+
+        awaitable = i.__anext__().__await__()
+        assert next(awaitable) is None
+        with pytest.raises(Exception) as exc_info:
+            next(awaitable)
+        assert exc_info.type.__name__ == 'StopAsyncIteration'
+
+    @pytest.mark.skipif(
+        sys.version_info < (3, 5),
+        reason='asynchronous iteration requires Python 3.5+'
+    )
+    def test_asyncio(self):
+        import asyncio
+        i = AsyncIterator(iter([1, 2]))
+        loop = asyncio.new_event_loop()
+        try:
+            assert loop.run_until_complete(i.__anext__()) == 1
+            assert loop.run_until_complete(i.__anext__()) == 2
+            with pytest.raises(StopAsyncIteration):
+                loop.run_until_complete(i.__anext__())
+        finally:
+            loop.close()
+
+
 class TestPushableIterator(IteratorTest):
     iterator_cls = PushableIterator
 
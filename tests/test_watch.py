@@ -0,0 +1,69 @@
+# coding: utf-8
+"""
+    tests.test_watch
+    ~~~~~~~~~~~~~~~~
+
+    :copyright: 2013 by Daniel Neuhäuser
+    :license: BSD, see LICENSE.rst for details
+"""
+import os
+
+import pytest
+
+from kurrent.watch import PollingWatcher, InotifyWatcher, get_watcher
+
+
+def write_file(path, content):
+    with open(path, 'wb') as file:
+        file.write(content)
+
+
+def create_polling_watcher(paths):
+    return PollingWatcher(paths, interval=0.01)
+
+
+def create_inotify_watcher(paths):
+    try:
+        return InotifyWatcher(paths)
+    except OSError:
+        pytest.skip('inotify is not available')
+
+
+@pytest.fixture(params=[create_polling_watcher, create_inotify_watcher])
+def create_watcher(request):
+    return request.param
+
+
+class TestWatcher(object):
+    def test_directory(self, temp_file_directory, create_watcher):
+        path = os.path.join(temp_file_directory, 'foo.kr')
+        write_file(path, b'foo')
+        with create_watcher([temp_file_directory]) as watcher:
+            assert watcher.wait(timeout=0.05) == set()
+            write_file(path, b'changed')
+            assert watcher.wait(timeout=1) == set([path])
+            os.remove(path)
+            assert watcher.wait(timeout=1) == set([path])
+
+    def test_subdirectory(self, temp_file_directory, create_watcher):
+        directory = os.path.join(temp_file_directory, 'sub')
+        with create_watcher([temp_file_directory]) as watcher:
+            os.mkdir(directory)
+            watcher.wait(timeout=0.05)
+            path = os.path.join(directory, 'foo.kr')
+            write_file(path, b'foo')
+            assert watcher.wait(timeout=1) == set([path])
+
+    def test_file(self, temp_file_directory, create_watcher):
+        path = os.path.join(temp_file_directory, 'foo.kr')
+        write_file(path, b'foo')
+        with create_watcher([path]) as watcher:
+            write_file(os.path.join(temp_file_directory, 'bar.kr'), b'bar')
+            assert watcher.wait(timeout=0.05) == set()
+            write_file(path, b'changed')
+            assert watcher.wait(timeout=1) == set([path])
+
+
+def test_get_watcher(temp_file_directory):
+    with get_watcher([temp_file_directory]) as watcher:
+        assert isinstance(watcher, (InotifyWatcher, PollingWatcher))
@@ -8,13 +8,16 @@
 """
 import re
 import codecs
+import datetime
 import subprocess
 from io import StringIO
+from contextlib import contextmanager
 
 import pytest
 
-from kurrent import ast
-from kurrent.writers import KurrentWriter, HTML5Writer, ManWriter
+from kurrent import ast, writers
+from kurrent.parser import Parser
+from kurrent.writers import KurrentWriter, HTML5Writer, ManWriter, get_writer
 
 
 class WriterTest(object):
@@ -37,6 +40,297 @@ class WriterTest(object):
         assert match.group() == content
 
 
+class RecordingStream(object):
+    def __init__(self):
+        self.writes = []
+
+    def write(self, string):
+        self.writes.append(string)
+
+
+def test_get_writer():
+    assert get_writer('kurrent') is KurrentWriter
+    assert get_writer('html5') is HTML5Writer
+    assert get_writer('man') is ManWriter
+    with pytest.raises(KeyError):
+        get_writer('does-not-exist')
+    with pytest.raises(AttributeError):
+        writers.DoesNotExist
+
+
+class TestWriter(object):
+    def test_buffering(self):
+        stream = RecordingStream()
+        writer = HTML5Writer(stream, buffer_size=4)
+        writer.write(u'foo')
+        assert stream.writes == []
+        writer.write(u'bar')
+        assert stream.writes == [u'foobar']
+        writer.write(u'baz')
+        writer.flush()
+        assert stream.writes == [u'foobar', u'baz']
+
+    def test_write_node_flushes(self):
+        stream = RecordingStream()
+        HTML5Writer(stream).write_node(ast.Paragraph(children=[
+            ast.Text(u'foo')
+        ]))
+        assert stream.writes == [u'<p>\n  foo\n</p>']
+
+    def test_exit_flushes(self):
+        stream = StringIO()
+        stream.close = lambda: None
+        with HTML5Writer(stream) as writer:
+            writer.write(u'foo')
+        assert stream.getvalue() == u'foo'
+
+    def test_without_stream(self):
+        writer = HTML5Writer(buffer_size=1)
+        writer.write_node(ast.Paragraph(children=[ast.Text(u'foo')]))
+        writer.write(u'bar')
+        assert writer.getvalue() == u'<p>\n  foo\n</p>\nbar'
+        assert writer.getvalue() == u'<p>\n  foo\n</p>\nbar'
+
+    def test_indentation(self):
+        writer = HTML5Writer(StringIO())
+        writer.push_indent(u'  ')
+        writer.push_indent(u'> ')
+        assert writer.indentation == u'  > '
+        assert writer.pop_indent() == u'> '
+        assert writer.indentation == u'  '
+        with writer.indent(u'- '):
+            assert writer.indentation == u'  - '
+        assert writer.indentation == u'  '
+
+    def test_node_subclass(self):
+        class Note(ast.Paragraph):
+            pass
+        stream = StringIO()
+        HTML5Writer(stream).write_node(Note(children=[ast.Text(u'foo')]))
+        assert stream.getvalue() == u'<p>\n  foo\n</p>'
+
+    def test_unknown_parent_node(self):
+        class Container(ast.ParentNode):
+            pass
+        stream = StringIO()
+        KurrentWriter(stream).write_node(Container(children=[ast.Text(u'*')]))
+        assert stream.getvalue() == u'\\*'
+
+    def test_unknown_node(self):
+        class Unknown(ast.ChildNode):
+            pass
+        with pytest.raises(AttributeError):
+            HTML5Writer(StringIO()).write_node(Unknown())
+
+    def test_get_handler(self):
+        handler = HTML5Writer.get_handler(ast.Text(u'foo'))
+        assert handler == (None, None, HTML5Writer.write_Text, False)
+        assert HTML5Writer.get_handler(ast.Text(u'bar')) is handler
+        assert (
+            KurrentWriter.get_handler(ast.Text(u'foo'))[2] ==
+            KurrentWriter.write_Text
+        )
+
+        enter, leave, write, has_children = HTML5Writer.get_handler(
+            ast.BlockQuote()
+        )
+        assert enter == HTML5Writer.enter_BlockQuote
+        assert leave == HTML5Writer.leave_BlockQuote
+        assert write is None
+        assert has_children
+
+    def test_context_manager_write_method(self):
+        class Writer(HTML5Writer):
+            @contextmanager
+            def write_Emphasis(self, node):
+                self.write(u'<i>')
+                yield True
+                self.write(u'</i>')
+
+            @contextmanager
+            def write_Strong(self, node):
+                self.write(u'<b/>')
+                yield False
+
+        stream = StringIO()
+        Writer(stream).write_node(ast.Paragraph(children=[
+            ast.Emphasis(children=[ast.Text(u'foo')]),
+            ast.Strong(children=[ast.Text(u'bar')])
+        ]))
+        assert stream.getvalue() == u'<p>\n  <i>foo</i><b/>\n</p>'
+
+    def test_context_manager_exception(self):
+        exits = []
+
+        class Writer(HTML5Writer):
+            @contextmanager
+            def write_Emphasis(self, node):
+                with self.indent(u'  '):
+                    try:
+                        yield True
+                    except ValueError as error:
+                        exits.append(error)
+                        raise
+
+            @contextmanager
+            def write_Strong(self, node):
+                try:
+                    yield True
+                except ValueError:
+                    pass
+
+            def write_Text(self, node):
+                if node.text == u'error':
+                    raise ValueError(node.text)
+                super(Writer, self).write_Text(node)
+
+        writer = Writer(StringIO())
+        with pytest.raises(ValueError):
+            writer.write_node(ast.Emphasis(children=[ast.Text(u'error')]))
+        assert [error.args for error in exits] == [(u'error', )]
+        assert writer.indentation == u''
+
+        stream = StringIO()
+        Writer(stream).write_node(ast.Paragraph(children=[
+            ast.Strong(children=[
+                ast.Emphasis(children=[ast.Text(u'error')]),
+                ast.Text(u'skipped')
+            ]),
+            ast.Text(u'foo')
+        ]))
+        assert stream.getvalue() == u'<p>\n  foo\n</p>'
+        assert len(exits) == 2
+
+    def test_extend_through_super(self):
+        class HTML5(HTML5Writer):
+            @contextmanager
+            def write_BlockQuote(self, node):
+                self.write_line(u'<!-- quote -->')
+                with super(HTML5, self).write_BlockQuote(node) as rv:
+                    yield rv
+
+            @contextmanager
+            def write_Paragraph(self, node):
+                with super(HTML5, self).write_Paragraph(node) as rv:
+                    yield rv
+                self.write_line(u'<!-- end -->')
+
+        class Kurrent(KurrentWriter):
+            @contextmanager
+            def write_Emphasis(self, node):
+                with super(Kurrent, self).write_Emphasis(node) as rv:
+                    self.write(u'!')
+                    yield rv
+
+        quote = ast.BlockQuote(children=[
+            ast.Paragraph(children=[
+                ast.Emphasis(children=[ast.Text(u'foo')])
+            ])
+        ])
+        stream = StringIO()
+        HTML5(stream).write_node(quote)
+        assert stream.getvalue() == (
+            u'<!-- quote -->\n'
+            u'<blockquote>\n'
+            u'  <p>\n'
+            u'    <em>foo</em>\n'
+            u'  </p>\n'
+            u'  <!-- end -->\n'
+            u'</blockquote>'
+        )
+        stream = StringIO()
+        Kurrent(stream).write_node(quote)
+        assert stream.getvalue() == u'> *!foo*'
+
+    def test_write_children_overridden(self):
+        class Container(ast.ParentNode):
+            pass
+
+        class Writer(KurrentWriter):
+            def write_children(self, node):
+                self.write(u'(')
+                super(Writer, self).write_children(node)
+                self.write(u')')
+
+        stream = StringIO()
+        Writer(stream).write_node(Container(children=[
+            ast.Text(u'foo'),
+            ast.Emphasis(children=[ast.Text(u'bar')])
+        ]))
+        assert stream.getvalue() == u'(foo*(bar)*)'
+
+    def test_write_node_overridden(self):
+        class Writer(HTML5Writer):
+            def write_node(self, node):
+                if isinstance(node, ast.Text):
+                    node = ast.Text(node.text.upper())
+                super(Writer, self).write_node(node)
+
+        stream = StringIO()
+        Writer(stream).write_node(ast.BlockQuote(children=[
+            ast.Paragraph(children=[ast.Text(u'foo')])
+        ]))
+        assert stream.getvalue() == (
+            u'<blockquote>\n  <p>\n    FOO\n  </p>\n</blockquote>'
+        )
+
+    def test_enter_leave_methods(self):
+        class Writer(KurrentWriter):
+            def enter_Paragraph(self, node):
+                self.write(u'(')
+
+            def leave_Paragraph(self, node):
+                self.write(u')')
+
+        stream = StringIO()
+        Writer(stream).write_node(ast.Document('<test>', children=[
+            ast.Paragraph(children=[ast.Text(u'foo')]),
+            ast.Paragraph(children=[ast.Text(u'bar')])
+        ]))
+        assert stream.getvalue() == u'(foo)(bar)'
+
+    @pytest.mark.parametrize('writer_cls', [
+        KurrentWriter, HTML5Writer, ManWriter
+    ])
+    @pytest.mark.parametrize('keep_source', [False, True])
+    def test_iter_node(self, writer_cls, keep_source):
+        source = u'# Title\n\n' + u'\n'.join(
+            u'## Section %d\n\nsome *text* and **more**\n\n'
+            u'- a list\n- with items\n\n> quoted\n' % i
+            for i in range(20)
+        )
+        document = Parser.from_string(source, keep_source=keep_source).parse()
+        stream = StringIO()
+        writer_cls(stream).write_node(document)
+
+        chunks = list(writer_cls().iter_node(document, chunk_size=100))
+        assert len(chunks) > 1
+        assert u''.join(chunks) == stream.getvalue()
+        assert all(len(chunk) >= 100 for chunk in chunks[:-1])
+
+    def test_iter_node_restores_stream(self):
+        stream = StringIO()
+        writer = HTML5Writer(stream)
+        chunks = list(writer.iter_node(ast.Paragraph(children=[
+            ast.Text(u'foo')
+        ])))
+        assert chunks == [u'<p>\n  foo\n</p>']
+        assert stream.getvalue() == u''
+        writer.write_node(ast.Text(u'bar'))
+        assert stream.getvalue() == u'\nbar'
+
+    def test_aiter_node(self):
+        writer = HTML5Writer()
+        node = ast.Paragraph(children=[ast.Text(u'foo')])
+        aiterator = writer.aiter_node(node)
+        assert aiterator.__aiter__() is aiterator
+        awaitable = aiterator.__anext__().__await__()
+        assert next(awaitable) is None
+        with pytest.raises(StopIteration) as exc_info:
+            next(awaitable)
+        assert exc_info.value.args == (u'<p>\n  foo\n</p>', )
+
+
 class TestKurrentWriter(WriterTest):
     writer_cls = KurrentWriter
 
@@ -48,6 +342,7 @@ class TestKurrentWriter(WriterTest):
         self.check_node(ast.Text(u'foo'), u'foo')
         self.check_node(ast.Text(u'*'), u'\*')
         self.check_node(ast.Text(u'[foo]'), u'\[foo\]')
+        self.check_node(ast.Text(u'a]*[b**'), u'a\]\*\[b\*\*')
 
     def test_write_paragraph(self):
         document = ast.Document('<test>', children=[
@@ -58,6 +353,24 @@ class TestKurrentWriter(WriterTest):
                                   u'\n'
                                   u'World')
 
+    def test_write_source(self):
+        source = u'# Hello\n\nsome  *text*\nin lines\n\n    raw\n\n\nmore text\n'
+        document = Parser.from_string(source, keep_source=True).parse()
+        self.check_node(document, source.rstrip(u'\n'))
+
+        document.children[1].add_child(ast.Text(u'!'))
+        self.check_node(
+            document,
+            u'# Hello\n'
+            u'\n'
+            u'some  *text* in lines!\n'
+            u'\n'
+            u'    raw\n'
+            u'\n'
+            u'\n'
+            u'more text'
+        )
+
     def test_write_header(self):
         self.check_node(ast.Header(u'Hello World', 1),
                         u'# Hello World')
@@ -247,6 +560,49 @@ class TestHTML5Writer(WriterTest):
             u'</p>'
         )
 
+    def test_write_paragraph_inline(self):
+        self.check_node(
+            ast.Paragraph(children=[
+                ast.Text(u'a\0<'),
+                ast.Emphasis(children=[
+                    ast.Strong(children=[ast.Text(u'&')]),
+                    ast.Link(u'target', u'text')
+                ]),
+                ast.Text(u'>')
+            ]),
+            u'<p>\n'
+            u'  a\0&lt;<em><strong>&amp;</strong>'
+            u'<a href="target">text</a></em>&gt;\n'
+            u'</p>'
+        )
+
+        self.check_node(
+            ast.Paragraph(children=[
+                ast.Text(u'foo'),
+                ast.RawBlock([u'<bar>'])
+            ]),
+            u'<p>\n'
+            u'  foo<pre>\n'
+            u'<bar>\n'
+            u'  </pre>\n'
+            u'\n'
+            u'</p>'
+        )
+
+    def test_write_paragraph_overridden(self):
+        class UpperHTML5Writer(HTML5Writer):
+            def write_Text(self, node):
+                self.write(node.text.upper())
+
+        stream = StringIO()
+        UpperHTML5Writer(stream).write_node(ast.Paragraph(children=[
+            ast.Emphasis(children=[ast.Text(u'foo')])
+        ]))
+        assert stream.getvalue() == u'<p>\n  <em>FOO</em>\n</p>'
+        assert self.render_node(ast.Paragraph(children=[
+            ast.Emphasis(children=[ast.Text(u'foo')])
+        ])) == u'<p>\n  <em>foo</em>\n</p>'
+
     def test_write_header(self):
         self.check_node(
             ast.Header(u'foo', 1),
@@ -482,6 +838,26 @@ class TestManWriter(WriterTest):
             u'.TH "foo" "1" "\w+, \d{2} \w+ \d{4}" ""'
         )
 
+    @pytest.mark.parametrize('date', [
+        u'2013-05-07', datetime.date(2013, 5, 7),
+        datetime.datetime(2013, 5, 7, 23, 59)
+    ])
+    def test_document_date(self, date, monkeypatch):
+        monkeypatch.setenv('SOURCE_DATE_EPOCH', '0')
+        document = ast.Document('<test>', metadata={
+            'title': u'foo', 'locale': 'en_US', 'date': date
+        })
+        self.check_node(document, u'.TH "foo" "1" "Tuesday, May 7, 2013" ""')
+
+    def test_document_source_date_epoch(self, monkeypatch):
+        monkeypatch.setenv('SOURCE_DATE_EPOCH', '1368000000')
+        document = ast.Document('<test>', metadata={
+            'title': u'foo', 'locale': 'de_DE'
+        })
+        self.check_node(
+            document, u'.TH "foo" "1" "Mittwoch, 8. Mai 2013" ""'
+        )
+
     def test_header(self):
         header = ast.Header(u'foo', 1)
         self.check_node(header, u'.SH "foo"')